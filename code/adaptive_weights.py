@@ -0,0 +1,96 @@
+import json
+import os
+import random
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+ADAPTIVE_WEIGHTS_PATH = 'adaptive_weights.json'
+# Quality bounds: the learned factor never moves a static weight further than this
+MIN_FACTOR = 0.25
+MAX_FACTOR = 4.0
+# Older observations are halved past this many, so the weights keep adapting
+MAX_OBSERVATIONS = 5000
+
+
+def arm_key(generator: str, main_type: str, subtype: str, tier) -> str:
+    return f"{generator}|{main_type}|{subtype}|{tier}"
+
+
+class AdaptiveWeights:
+    """
+    Thompson sampling over (generator, main type, subtype, tier) arms. Each arm keeps
+    successes/failures of the puzzles its choices went into; factor() draws from the arm's
+    Beta posterior and compares it with the generator's overall success rate.
+    Sampling weights are static weight * factor, clamped to [MIN_FACTOR, MAX_FACTOR].
+    """
+
+    def __init__(self, arms: Dict[str, List[float]] = None, path: str = ADAPTIVE_WEIGHTS_PATH, rng=random):
+        self.arms: Dict[str, List[float]] = arms or {}
+        self.path = path
+        self.rng = rng
+        self._lock = threading.Lock()
+        self._totals: Dict[str, List[float]] = {}
+        for key, (successes, failures) in self.arms.items():
+            total = self._totals.setdefault(key.split('|', 1)[0], [0.0, 0.0])
+            total[0] += successes
+            total[1] += failures
+
+    def factor(self, generator: str, main_type: str, subtype: str, tier) -> float:
+        successes, failures = self.arms.get(arm_key(generator, main_type, subtype, tier), (0.0, 0.0))
+        total_successes, total_failures = self._totals.get(generator, (0.0, 0.0))
+        base = (total_successes + 1) / (total_successes + total_failures + 2)
+        sample = self.rng.betavariate(successes + 1, failures + 1)
+        return min(MAX_FACTOR, max(MIN_FACTOR, sample / base))
+
+    def record(self, generator: str, arms: Iterable[Tuple[str, str, object]], success: bool):
+        """
+        Adds one outcome to every (main type, subtype, tier) arm used by a puzzle or attempt.
+        """
+        with self._lock:
+            total = self._totals.setdefault(generator, [0.0, 0.0])
+            for main_type, subtype, tier in arms:
+                arm = self.arms.setdefault(arm_key(generator, main_type, subtype, tier), [0.0, 0.0])
+                arm[0 if success else 1] += 1
+                total[0 if success else 1] += 1
+                if arm[0] + arm[1] > MAX_OBSERVATIONS:
+                    total[0] -= arm[0] / 2
+                    total[1] -= arm[1] / 2
+                    arm[0] /= 2
+                    arm[1] /= 2
+
+    def success_rates(self) -> Dict[str, float]:
+        return {key: (s + 1) / (s + f + 2) for key, (s, f) in sorted(self.arms.items())}
+
+    def save(self, path: str = None):
+        with self._lock:
+            with open(path or self.path, 'w', encoding='utf-8') as f:
+                json.dump(self.arms, f, ensure_ascii=False, indent=1)
+
+    @classmethod
+    def load(cls, path: str = ADAPTIVE_WEIGHTS_PATH) -> 'AdaptiveWeights':
+        """
+        Learned statistics from path, or empty ones (all factors start around 1).
+        """
+        arms = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                arms = json.load(f)
+        return cls(arms, path)
+
+
+def enable(path: str = ADAPTIVE_WEIGHTS_PATH) -> AdaptiveWeights:
+    """
+    Loads the learned weights and makes the dataset generators sample with them.
+    """
+    import dataset_io
+
+    weights = AdaptiveWeights.load(path)
+    dataset_io.ADAPTIVE_WEIGHTS = weights
+    print(f"Adaptive subtype weights enabled ({len(weights.arms)} arms learned, '{path}')")
+    return weights
+
+
+def disable():
+    import dataset_io
+
+    dataset_io.ADAPTIVE_WEIGHTS = None
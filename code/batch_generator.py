@@ -0,0 +1,372 @@
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+CATEGORY_SIZE = 4
+MEANING, FORM = 0, 1
+MAIN_TYPES = ('meaning', 'form')
+# Categories up to this size are sampled exactly, bigger ones by drawing this many positions
+SAMPLE_WIDTH = 32
+# Lockstep rounds per step before a puzzle falls back to the next tier (or fails)
+ROUNDS = 6
+DEFAULT_BATCH_SIZE = 4096
+FG_MAX_ATTEMPTS = 50
+
+
+class BatchIndex:
+    """
+    The datasets as flat arrays. Category c has the words cat_words[cat_ptr[c]:cat_ptr[c + 1]];
+    the categories of main type t containing word w are word_cats[word_ptr[k]:word_ptr[k + 1]]
+    with k = 2 * w + t. Category names are interned, so name checks compare integers.
+    """
+
+    def __init__(self, data_by_category: Dict[str, Dict[str, Dict[str, Set[str]]]]):
+        import dataset_io
+
+        self.words: List[str] = []
+        word_ids: Dict[str, int] = {}
+        self.names: List[str] = []
+        name_ids: Dict[str, int] = {}
+        self.subtypes: List[str] = []
+        main, name_of, weights, sizes, members = [], [], [], [], []
+
+        for main_type_id, main_type in enumerate(MAIN_TYPES):
+            for subtype, categories in data_by_category.get(main_type, {}).items():
+                weight = dataset_io.FORM_SUBTYPE_WEIGHTS.get(subtype, dataset_io.DEFAULT_SUBTYPE_WEIGHT) \
+                    if main_type == 'form' else dataset_io.DEFAULT_SUBTYPE_WEIGHT
+                for name, words in categories.items():
+                    if len(words) < CATEGORY_SIZE or weight <= 0:
+                        continue
+                    for word in words:
+                        if word not in word_ids:
+                            word_ids[word] = len(self.words)
+                            self.words.append(word)
+                        members.append(word_ids[word])
+                    if name not in name_ids:
+                        name_ids[name] = len(self.names)
+                        self.names.append(name)
+                    main.append(main_type_id)
+                    name_of.append(name_ids[name])
+                    weights.append(weight)
+                    sizes.append(len(words))
+                    self.subtypes.append(subtype)
+
+        self.cat_main = np.asarray(main, dtype=np.int8)
+        self.cat_name = np.asarray(name_of, dtype=np.int32)
+        self.cat_ptr = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=self.cat_ptr[1:])
+        self.cat_words = np.asarray(members, dtype=np.int32)
+
+        # word -> categories, split by the categories' main type
+        cats = np.repeat(np.arange(len(sizes), dtype=np.int32), sizes)
+        keys = self.cat_words.astype(np.int64) * 2 + self.cat_main[cats]
+        order = np.argsort(keys, kind='stable')
+        self.word_cats = cats[order]
+        self.word_ptr = np.zeros(2 * len(self.words) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=2 * len(self.words)), out=self.word_ptr[1:])
+
+        # Weighted draws of a random category of a main type (FORM_SUBTYPE_WEIGHTS)
+        weights = np.asarray(weights, dtype=np.float64)
+        self.type_cats = [np.flatnonzero(self.cat_main == t) for t in range(len(MAIN_TYPES))]
+        self.type_cumulative = [np.cumsum(weights[cats]) for cats in self.type_cats]
+
+    def __len__(self):
+        return len(self.cat_main)
+
+    @property
+    def bitmap_bytes(self) -> int:
+        return (len(self.words) + 7) // 8
+
+
+class BatchGenerator:
+    """
+    Builds many independent puzzles in lockstep: every step of the dataset generators is
+    done for all unfinished puzzles at once with NumPy. Each puzzle has a packed bitmap of
+    its used words, and puzzles that fail a step retry it in the next round.
+    """
+
+    def __init__(self, index: BatchIndex, seed: Optional[int] = None):
+        self.index = index
+        self.rng = np.random.default_rng(seed)
+
+    def random_categories(self, main_types: np.ndarray) -> np.ndarray:
+        """
+        A random category of the given main type per row, weighted by subtype.
+        """
+        result = np.empty(len(main_types), dtype=np.int64)
+        for t, (cats, cumulative) in enumerate(zip(self.index.type_cats, self.index.type_cumulative)):
+            rows = np.flatnonzero(main_types == t)
+            if len(rows):
+                draws = self.rng.random(len(rows)) * cumulative[-1]
+                result[rows] = cats[np.minimum(np.searchsorted(cumulative, draws, side='right'), len(cats) - 1)]
+        return result
+
+    def categories_with_words(self, words: np.ndarray, main_types: np.ndarray) -> np.ndarray:
+        """
+        A random category of the given main type containing the word per row, -1 if there is none.
+        """
+        keys = words.astype(np.int64) * 2 + main_types
+        start = self.index.word_ptr[keys]
+        degree = self.index.word_ptr[keys + 1] - start
+        offsets = (self.rng.random(len(words)) * degree).astype(np.int64)
+        found = degree > 0
+        result = np.full(len(words), -1, dtype=np.int64)
+        result[found] = self.index.word_cats[start[found] + offsets[found]]
+        return result
+
+    def sample_words(self, cats: np.ndarray, used: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        k distinct words of each row's category that are not set in the row's used bitmap.
+        Categories of up to SAMPLE_WIDTH words are sampled exactly; from bigger ones
+        SAMPLE_WIDTH positions are drawn and k of the distinct available ones are kept.
+        Returns (words (rows, k), ok (rows,)).
+        """
+        index = self.index
+        rows = len(cats)
+        start = index.cat_ptr[cats]
+        size = index.cat_ptr[cats + 1] - start
+        columns = np.arange(SAMPLE_WIDTH)
+        positions = np.where(size[:, None] <= SAMPLE_WIDTH, columns,
+                             (self.rng.random((rows, SAMPLE_WIDTH)) * size[:, None]).astype(np.int64))
+        inside = positions < size[:, None]
+        words = index.cat_words[np.where(inside, start[:, None] + positions, 0)]
+
+        available = inside & ((used[np.arange(rows)[:, None], words >> 3] >> (words & 7).astype(np.uint8)) & 1 == 0)
+        # Drop repeated draws: sort each row by word, keep the first of equal neighbours
+        order = np.argsort(words, axis=1)
+        ordered = np.take_along_axis(words, order, axis=1)
+        repeated = np.zeros_like(available)
+        np.put_along_axis(repeated, order[:, 1:], ordered[:, 1:] == ordered[:, :-1], axis=1)
+        available &= ~repeated
+
+        keys = np.where(available, self.rng.random((rows, SAMPLE_WIDTH)), 2.0)
+        chosen = np.argpartition(keys, k - 1, axis=1)[:, :k]
+        ok = available.sum(axis=1) >= k
+        return np.take_along_axis(words, chosen, axis=1), ok
+
+    @staticmethod
+    def mark_used(used: np.ndarray, rows: np.ndarray, words: np.ndarray):
+        rows = np.broadcast_to(rows[:, None], words.shape)
+        np.bitwise_or.at(used, (rows, words >> 3), (1 << (words & 7)).astype(np.uint8))
+
+    def _place(self, state: Dict, rows: np.ndarray, cats: np.ndarray, step: int, k: int = CATEGORY_SIZE
+               ) -> np.ndarray:
+        """
+        Samples k new words for every row whose category is not yet used (by name) in its
+        puzzle; returns the rows that succeeded, with their category and words stored.
+        """
+        valid = cats >= 0
+        names = self.index.cat_name[np.maximum(cats, 0)]
+        valid &= ~(state["names"][rows] == names[:, None]).any(axis=1)
+        rows, cats = rows[valid], cats[valid]
+        words, ok = self.sample_words(cats, state["used"][rows], k)
+        rows, cats, words = rows[ok], cats[ok], words[ok]
+        state["cats"][rows, step] = cats
+        state["names"][rows, step] = self.index.cat_name[cats]
+        state["words"][rows, step, CATEGORY_SIZE - k:] = words
+        self.mark_used(state["used"], rows, words)
+        return rows
+
+    def _new_state(self, n: int, steps: int) -> Dict:
+        return {
+            "used": np.zeros((n, self.index.bitmap_bytes), dtype=np.uint8),
+            "cats": np.full((n, steps), -1, dtype=np.int64),
+            "names": np.full((n, steps), -1, dtype=np.int32),
+            "words": np.zeros((n, steps, CATEGORY_SIZE), dtype=np.int32),
+        }
+
+    def intentional_overlap(self, n: int) -> Dict[str, np.ndarray]:
+        """
+        n puzzles built like dataset_io.generate_intentional_overlap: a 'meaning' category, then
+        three categories alternating the main type, each through tier 1-2 (a category containing
+        an already used word, of the target or the other type) or tier 3-4 (a random category).
+        Returns arrays "cats" (n, 4), "words" (n, 4, 4), "tiers" (n, 3) and "ok" (n,).
+        """
+        state = self._new_state(n, CATEGORY_SIZE)
+        tiers = np.zeros((n, CATEGORY_SIZE - 1), dtype=np.int8)
+        alive = np.zeros(n, dtype=bool)
+        next_type = np.full(n, FORM, dtype=np.int8)
+
+        pending = np.arange(n)
+        for _ in range(ROUNDS):
+            placed = self._place(state, pending, self.random_categories(np.full(len(pending), MEANING)), 0)
+            alive[placed] = True
+            pending = np.setdiff1d(pending, placed, assume_unique=True)
+            if not len(pending):
+                break
+
+        for step in range(1, CATEGORY_SIZE):
+            pending = np.flatnonzero(alive)
+            for tier in range(1, 5):
+                # Tiers 1 and 3 use the target type, 2 and 4 the other one
+                other = tier in (2, 4)
+                for _ in range(ROUNDS):
+                    if not len(pending):
+                        break
+                    types = (next_type[pending] ^ other).astype(np.int8)
+                    if tier <= 2:
+                        picked = self.rng.integers(0, step * CATEGORY_SIZE, len(pending))
+                        words = state["words"][pending].reshape(len(pending), -1)[np.arange(len(pending)), picked]
+                        cats = self.categories_with_words(words, types)
+                    else:
+                        cats = self.random_categories(types)
+                    placed = self._place(state, pending, cats, step)
+                    tiers[placed, step - 1] = tier
+                    next_type[placed] = 1 - self.index.cat_main[state["cats"][placed, step]]
+                    pending = np.setdiff1d(pending, placed, assume_unique=True)
+            alive[pending] = False
+
+        return {"cats": state["cats"], "words": state["words"], "tiers": tiers, "ok": alive}
+
+    def false_group(self, n: int, max_attempts: int = FG_MAX_ATTEMPTS) -> Dict[str, np.ndarray]:
+        """
+        n puzzles built like dataset_fg.generate_false_group: an initial category from any main
+        type, then for each of its words a category of the other type containing it plus 3 new
+        words. A puzzle that fails a word starts over with a new initial category.
+        Returns arrays "initial" (n,), "initial_words" (n, 4), "cats" (n, 4), "words" (n, 4, 4),
+        "attempts" (n,) and "ok" (n,).
+        """
+        index = self.index
+        state = self._new_state(n, CATEGORY_SIZE + 1)  # step 0 is the initial category
+        attempts = np.zeros(n, dtype=np.int32)
+        done = np.zeros(n, dtype=bool)
+
+        pending = np.arange(n)
+        while len(pending):
+            pending = pending[attempts[pending] < max_attempts]
+            if not len(pending):
+                break
+            attempts[pending] += 1
+            state["used"][pending] = 0
+            state["names"][pending] = -1
+            rows = self._place(state, pending, self.rng.integers(0, len(index), len(pending)), 0)
+            for position in range(CATEGORY_SIZE):
+                words = state["words"][rows, 0, position]
+                types = (1 - index.cat_main[state["cats"][rows, 0]]).astype(np.int8)
+                placed = np.empty(0, dtype=np.int64)
+                waiting = rows
+                for _ in range(ROUNDS):
+                    if not len(waiting):
+                        break
+                    keep = np.isin(rows, waiting)
+                    cats = self.categories_with_words(words[keep], types[keep])
+                    placed_now = self._place(state, waiting, cats, position + 1, CATEGORY_SIZE - 1)
+                    placed = np.concatenate([placed, placed_now])
+                    waiting = np.setdiff1d(waiting, placed_now, assume_unique=True)
+                rows = np.sort(placed)
+                state["words"][rows, position + 1, 0] = state["words"][rows, 0, position]
+            done[rows] = True
+            pending = np.setdiff1d(pending, rows, assume_unique=True)
+
+        return {
+            "initial": state["cats"][:, 0], "initial_words": state["words"][:, 0],
+            "cats": state["cats"][:, 1:], "words": state["words"][:, 1:],
+            "attempts": attempts, "ok": done,
+        }
+
+    def to_intentional_overlap(self, batch: Dict[str, np.ndarray], check_conflicts: bool = False
+                               ) -> List[List[Tuple[str, List[str]]]]:
+        """
+        The successful puzzles in the output format of generate_intentional_overlap. The batch
+        skips the hypernym check; check_conflicts drops puzzles that fail it here.
+        """
+        import dataset_io
+
+        names, words = self.index.names, self.index.words
+        result = []
+        for row in np.flatnonzero(batch["ok"]):
+            puzzle = [(names[self.index.cat_name[c]], [words[w] for w in ws])
+                      for c, ws in zip(batch["cats"][row], batch["words"][row])]
+            if check_conflicts and any(
+                    dataset_io.hypernym_conflict(name, group, [used for used, _ in puzzle[:i]])
+                    for i, (name, group) in enumerate(puzzle)):
+                continue
+            result.append(puzzle)
+        return result
+
+    def to_false_group(self, batch: Dict[str, np.ndarray], check_conflicts: bool = False
+                       ) -> List[Tuple[Tuple[str, List[str]], List[Tuple[str, List[str]]]]]:
+        """
+        The successful puzzles in the output format of generate_false_group. The batch skips the
+        hypernym check; check_conflicts drops puzzles that fail it here. As in generate_false_group,
+        the shared first word of a related group is not checked.
+        """
+        import dataset_io
+
+        names, words = self.index.names, self.index.words
+        result = []
+        for row in np.flatnonzero(batch["ok"]):
+            initial = (names[self.index.cat_name[batch["initial"][row]]], [words[w] for w in batch["initial_words"][row]])
+            related = [(names[self.index.cat_name[c]], [words[w] for w in ws])
+                       for c, ws in zip(batch["cats"][row], batch["words"][row])]
+            if check_conflicts and any(
+                    dataset_io.hypernym_conflict(name, group[1:], [initial[0]] + [used for used, _ in related[:i]])
+                    for i, (name, group) in enumerate(related)):
+                continue
+            result.append((initial, related))
+        return result
+
+
+_INDEX = None
+
+
+def get_index() -> BatchIndex:
+    global _INDEX
+    if _INDEX is None:
+        import dataset_io
+
+        data_by_category, _ = dataset_io.get_datasets()
+        print("Building batch index...")
+        _INDEX = BatchIndex(data_by_category)
+    return _INDEX
+
+
+def benchmark(batch_size: int = DEFAULT_BATCH_SIZE, batches: int = 5, seed: int = 0) -> Dict[str, float]:
+    """
+    Candidate puzzles per minute of both batch generators (arrays only, no conversion).
+    """
+    generator = BatchGenerator(get_index(), seed)
+    result = {}
+    for name, generate in (("intentional_overlap", generator.intentional_overlap),
+                           ("false_group", generator.false_group)):
+        started = time.perf_counter()
+        successes = sum(int(generate(batch_size)["ok"].sum()) for _ in range(batches))
+        seconds = time.perf_counter() - started
+        result[name] = round(successes / seconds * 60)
+        print(f"{name}: {successes}/{batch_size * batches} puzzles in {seconds:.2f}s, "
+              f"{result[name]} puzzles per minute")
+    return result
+
+
+def intentional_overlap_pipeline(num_runs: int, output_filename: str):
+    generator = BatchGenerator(get_index())
+    puzzles = generator.to_intentional_overlap(generator.intentional_overlap(num_runs), check_conflicts=True)
+
+    with open(output_filename, 'w', encoding='utf-8') as f:
+        for i, puzzle in enumerate(puzzles):
+            f.write(f"--- Run {i + 1} ---\n")
+            for step, (category, words) in enumerate(puzzle):
+                f.write(f"{step + 1}. {category}: {', '.join(words)}\n")
+            f.write("\n-------------------------------------\n\n")
+
+    print(f"Batch generated full 4-category puzzles: {len(puzzles)}/{num_runs}. Results saved to '{output_filename}'.")
+
+
+def false_group_pipeline(num_runs: int, output_filename: str):
+    generator = BatchGenerator(get_index())
+    puzzles = generator.to_false_group(generator.false_group(num_runs), check_conflicts=True)
+
+    with open(output_filename, 'w', encoding='utf-8') as f:
+        for i, ((initial_name, initial_words), related) in enumerate(puzzles):
+            f.write(f"--- Run {i + 1} ---\n")
+            f.write(f"{initial_name}: {', '.join(initial_words)}\n")
+            for j, (name, words) in enumerate(related):
+                f.write(f"{j + 1}. {name}: {', '.join(words)}\n")
+            f.write("\n-------------------------------------\n\n")
+
+    print(f"Batch generated full false group puzzles: {len(puzzles)}/{num_runs}. Results saved to '{output_filename}'.")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,227 @@
+import json
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+CATEGORY_SIZE = 4
+BENCH_OUTPUT_PATH = 'bench_datasets.json'
+DEFAULT_SEEDS = [0, 1, 2]
+DEFAULT_PUZZLES_PER_SEED = 200
+# Default of generate_false_group; a puzzle that took this many attempts and failed is 'exhausted'
+FG_MAX_ATTEMPTS = 500
+
+
+def current_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Peak resident set size of this process in MB, or None where the resource module is missing (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def bench_load(repeat: int = 3) -> Dict:
+    """
+    Load time of all datasets (best of repeat cold loads) and their size.
+    """
+    import dataset_io
+
+    times = []
+    data_by_category = {}
+    for _ in range(repeat):
+        started = time.perf_counter()
+        data_by_category, _ = dataset_io.load_datasets_with_subtypes()
+        times.append(time.perf_counter() - started)
+    categories = sum(len(cats) for subtypes in data_by_category.values() for cats in subtypes.values())
+    return {"seconds": round(min(times), 4), "categories": categories}
+
+
+def bench_intentional_overlap(data_by_category, data_by_word, seeds: List[int], puzzles_per_seed: int) -> Dict:
+    import dataset_io
+
+    tiers = Counter()
+    successes, durations = 0, []
+    started = time.perf_counter()
+    for seed in seeds:
+        random.seed(seed)
+        for _ in range(puzzles_per_seed):
+            tier_log = []
+            puzzle_started = time.perf_counter()
+            game = dataset_io.generate_intentional_overlap(data_by_category, data_by_word, tier_log)
+            durations.append(time.perf_counter() - puzzle_started)
+            tiers.update(tier_log)
+            if len(game) == CATEGORY_SIZE:
+                successes += 1
+    return summarize(len(seeds) * puzzles_per_seed, successes, time.perf_counter() - started, durations, {
+        "fallback_tiers": {str(tier): tiers[tier] for tier in range(1, 5)}
+    })
+
+
+def bench_false_group(data_by_category, data_by_word, seeds: List[int], puzzles_per_seed: int) -> Dict:
+    import dataset_fg
+
+    attempts_success = Counter()
+    exhausted = 0
+    successes, durations = 0, []
+    started = time.perf_counter()
+    for seed in seeds:
+        random.seed(seed)
+        for _ in range(puzzles_per_seed):
+            attempt_log = []
+            puzzle_started = time.perf_counter()
+            game = dataset_fg.generate_false_group(data_by_category, data_by_word, FG_MAX_ATTEMPTS, attempt_log)
+            durations.append(time.perf_counter() - puzzle_started)
+            if game:
+                successes += 1
+                attempts_success[attempt_log[-1]] += 1
+            else:
+                exhausted += 1
+    attempts = sorted(attempts_success.elements())
+    return summarize(len(seeds) * puzzles_per_seed, successes, time.perf_counter() - started, durations, {
+        "attempts_per_success": {str(k): attempts_success[k] for k in sorted(attempts_success)},
+        "attempts_median": percentile(attempts, 0.5),
+        "attempts_p95": percentile(attempts, 0.95),
+        "exhausted": exhausted
+    })
+
+
+def summarize(total: int, successes: int, wall_time: float, durations: List[float], extra: Dict) -> Dict:
+    durations = sorted(durations)
+    result = {
+        "puzzles": total,
+        "successes": successes,
+        "success_rate": round(successes / total, 4) if total else 0.0,
+        "seconds": round(wall_time, 4),
+        "puzzles_per_second": round(total / wall_time, 2) if wall_time else 0.0,
+        "ms_median": round(percentile(durations, 0.5) * 1000, 3),
+        "ms_p95": round(percentile(durations, 0.95) * 1000, 3),
+    }
+    result.update(extra)
+    return result
+
+
+def profiled_batch(name: str, bench, *args) -> Dict:
+    """
+    Runs one generator benchmark with profiling on: prints the text summary, writes the
+    collapsed stacks to '<name>.folded' and adds the counters to the results.
+    """
+    import profiling
+
+    profiling.reset()
+    profiling.enable()
+    try:
+        result = bench(*args)
+    finally:
+        profiling.enable(False)
+    print(profiling.summary(name))
+    profiling.write_collapsed(f"{name}.folded")
+    counters, _ = profiling.snapshot()
+    result["profile_counters"] = counters
+    return result
+
+
+def run_benchmark(seeds: Optional[List[int]] = None, puzzles_per_seed: int = DEFAULT_PUZZLES_PER_SEED,
+                  output_path: Optional[str] = BENCH_OUTPUT_PATH, profile: bool = False,
+                  adaptive_path: Optional[str] = None) -> Dict:
+    """
+    Benchmarks dataset loading and both dataset generators for fixed seeds and writes the
+    results as JSON to output_path, so runs on different commits can be compared.
+    With profile, timings include the instrumentation overhead and a flame graph
+    profile is written per generator. With adaptive_path, the generators sample subtypes
+    with the weights learned there (they keep learning during the run but are not saved),
+    so the wasted attempts can be compared with a static run.
+    """
+    import dataset_io
+
+    seeds = seeds or DEFAULT_SEEDS
+    print("Benchmarking dataset loading...")
+    load = bench_load()
+    # Everything get_datasets() adds on top of the CSVs (form index, hypernym closure, ...)
+    started = time.perf_counter()
+    data_by_category, data_by_word = dataset_io.get_datasets()
+    load["prepared_seconds"] = round(time.perf_counter() - started, 4)
+
+    if adaptive_path:
+        import adaptive_weights
+
+        adaptive_weights.enable(adaptive_path)
+
+    print(f"Benchmarking generators: seeds {seeds}, {puzzles_per_seed} puzzles per seed...")
+    results = {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "commit": current_commit(),
+        "python": sys.version.split()[0],
+        "seeds": seeds,
+        "puzzles_per_seed": puzzles_per_seed,
+        "load": load,
+        "profiled": profile,
+        "adaptive": bool(adaptive_path),
+    }
+    for name, bench in (("intentional_overlap", bench_intentional_overlap), ("false_group", bench_false_group)):
+        args = (data_by_category, data_by_word, seeds, puzzles_per_seed)
+        results[name] = profiled_batch(name, bench, *args) if profile else bench(*args)
+    if adaptive_path:
+        adaptive_weights.disable()
+    results["peak_rss_mb"] = peak_rss_mb()
+    print_results(results)
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+        print(f"Results saved to '{output_path}'")
+    return results
+
+
+def print_results(results: Dict, baseline: Optional[Dict] = None):
+    def line(label, section, key):
+        value = results[section].get(key)
+        text = f"{label:<32} {value}"
+        if baseline and key in baseline.get(section, {}):
+            text += f"  (was {baseline[section][key]})"
+        print(text)
+
+    print(f"Subtype weights: {'adaptive' if results.get('adaptive') else 'static'}")
+    line("Load time, s", "load", "seconds")
+    line("Load with indexes, s", "load", "prepared_seconds")
+    for section in ("intentional_overlap", "false_group"):
+        print(f"--- {section}")
+        for key in ("success_rate", "puzzles_per_second", "ms_median", "ms_p95"):
+            line(key, section, key)
+    print(f"--- fallback tiers: {results['intentional_overlap']['fallback_tiers']}")
+    fg = results["false_group"]
+    print(f"--- false group attempts: median {fg['attempts_median']}, p95 {fg['attempts_p95']}, "
+          f"exhausted {fg['exhausted']}")
+    print(f"Peak RSS, MB: {results['peak_rss_mb']}")
+
+
+def compare(results_path: str, baseline_path: str):
+    with open(results_path, encoding='utf-8') as f:
+        results = json.load(f)
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"{results.get('commit')} vs {baseline.get('commit')}")
+    print_results(results, baseline)
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,224 @@
+import contextlib
+import importlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from bench_datasets import current_commit, percentile
+from fake_openai import FakeConfig, FakeOpenAIServer
+
+BENCH_OUTPUT_PATH = 'bench_llm.json'
+# name -> (module, pipeline function)
+PIPELINES = {
+    'io': ('llm_io', 'intentional_overlap_pipeline'),
+    'fg': ('llm_fg', 'false_group_pipeline'),
+    'ambiguous': ('llm+dataset', 'intentional_overlap_pipeline_ambiguous'),
+}
+DEFAULT_GAMES = 20
+VOCABULARY_SIZE = 5000
+
+
+def default_vocabulary(limit: int = VOCABULARY_SIZE) -> List[str]:
+    """
+    Dataset words the lexical validator accepts with an embedding, so the fake's answers
+    pass the pipelines' word checks.
+    """
+    import dataset_io
+    import form_index
+    from lexicon import check_word, get_lexicon
+
+    _, data_by_word = dataset_io.get_datasets()
+    lexicon = get_lexicon()
+    words = sorted(word for word in form_index.dataset_words(data_by_word)
+                   if check_word(word, lexicon, require_embedding=True) is None)
+    return words[:limit]
+
+
+def warm_up(names: List[str]):
+    """
+    Loads the shared caches before the workers start, so no thread pays for them or loads them twice.
+    """
+    import dataset_io
+    import resources
+    from lexicon import get_lexicon
+
+    get_lexicon()
+    dataset_io.get_datasets()
+    if resources.navec_available():
+        resources.get_navec()
+    if 'ambiguous' in names:
+        from seed_index import get_seed_index
+
+        get_seed_index()
+
+
+def pipeline_runner(name: str, word_bank: List[str], stream: bool):
+    """
+    Callable running the pipeline for num_games games into an output file.
+    """
+    module_name, function_name = PIPELINES[name]
+    pipeline = getattr(importlib.import_module(module_name), function_name)
+    if name == 'ambiguous':
+        from seed_index import get_seed_index
+
+        seed_index = get_seed_index()
+        return lambda num_games, path: pipeline(seed_index, num_games, path)
+    return lambda num_games, path: pipeline(word_bank, num_games, path, stream)
+
+
+def run_games(run, games: int, concurrency: int, work_dir: str) -> List[Dict]:
+    """
+    Runs games one-game pipeline calls on concurrency threads, each writing its own file.
+    A game is complete if the part of the file it wrote holds 4 categories.
+    """
+    from llm_editing import parse_initial
+
+    records: List[Dict] = []
+    lock = threading.Lock()
+    counts = [games // concurrency + (i < games % concurrency) for i in range(concurrency)]
+
+    def worker(number: int, count: int):
+        path = os.path.join(work_dir, f"worker_{number}.txt")
+        for _ in range(count):
+            offset = os.path.getsize(path) if os.path.exists(path) else 0
+            error = None
+            started = time.perf_counter()
+            try:
+                run(1, path)
+            except Exception as e:
+                error = type(e).__name__
+            seconds = time.perf_counter() - started
+            text = ""
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    f.seek(offset)
+                    text = f.read()
+            with lock:
+                records.append({"seconds": seconds, "complete": len(parse_initial(text)) == 1, "error": error})
+
+    threads = [threading.Thread(target=worker, args=(i, count)) for i, count in enumerate(counts) if count]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records
+
+
+def summarize(records: List[Dict], wall_time: float, stats: Dict[str, int]) -> Dict:
+    durations = sorted(record["seconds"] for record in records)
+    completed = sum(record["complete"] for record in records)
+    first_attempts = stats["requests"] - stats["retries"]
+    errors: Dict[str, int] = {}
+    for record in records:
+        if record["error"]:
+            errors[record["error"]] = errors.get(record["error"], 0) + 1
+    return {
+        "games": len(records),
+        "completed": completed,
+        "completed_ratio": round(completed / len(records), 4) if records else 0.0,
+        "seconds": round(wall_time, 3),
+        "games_per_minute": round(completed / wall_time * 60, 2) if wall_time else 0.0,
+        "s_median": round(percentile(durations, 0.5), 3),
+        "s_p95": round(percentile(durations, 0.95), 3),
+        "s_p99": round(percentile(durations, 0.99), 3),
+        "s_max": round(durations[-1], 3) if durations else 0.0,
+        "requests": stats["requests"],
+        "requests_per_completed_game": round(stats["requests"] / completed, 2) if completed else None,
+        # Requests the server received per request the pipelines made (the client retries 429s)
+        "retry_amplification": round(stats["requests"] / first_attempts, 3) if first_attempts else None,
+        "server": dict(stats),
+        "errors": errors,
+    }
+
+
+@contextlib.contextmanager
+def fake_client(url: str):
+    """
+    Points the shared client of resources.get_client at the fake for the duration.
+    """
+    import resources
+
+    previous = os.environ.get('OPENAI_BASE_URL')
+    os.environ['OPENAI_BASE_URL'] = url
+    resources.get_client.cache_clear()
+    try:
+        yield
+    finally:
+        if previous is None:
+            os.environ.pop('OPENAI_BASE_URL', None)
+        else:
+            os.environ['OPENAI_BASE_URL'] = previous
+        resources.get_client.cache_clear()
+
+
+def run_benchmark(config: Optional[FakeConfig] = None, names: Optional[List[str]] = None,
+                  games: int = DEFAULT_GAMES, concurrency: int = 1, stream: bool = False,
+                  output_path: Optional[str] = BENCH_OUTPUT_PATH, verbose: bool = False) -> Dict:
+    """
+    Drives every LLM pipeline end to end against a local fake of the API with the latency,
+    throttling and malformed-output rates of config, games games each on concurrency threads,
+    and writes the results as JSON to output_path, so runs on different commits can be compared.
+    """
+    config = config or FakeConfig()
+    names = names or list(PIPELINES)
+    warm_up(names)
+    vocabulary = default_vocabulary()
+    print(f"Fake API vocabulary: {len(vocabulary)} words")
+
+    results = {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "commit": current_commit(),
+        "python": sys.version.split()[0],
+        "games": games,
+        "concurrency": concurrency,
+        "stream": stream,
+        "fake": vars(config),
+    }
+    with FakeOpenAIServer(vocabulary, config) as server, fake_client(server.url):
+        for name in names:
+            print(f"Benchmarking '{name}': {games} games on {concurrency} threads...")
+            run = pipeline_runner(name, [word.lower() for word in vocabulary], stream)
+            server.reset_stats()
+            with tempfile.TemporaryDirectory() as work_dir:
+                started = time.perf_counter()
+                with open(os.devnull, 'w') as devnull, \
+                        (contextlib.nullcontext() if verbose else contextlib.redirect_stdout(devnull)):
+                    records = run_games(run, games, concurrency, work_dir)
+                results[name] = summarize(records, time.perf_counter() - started, server.stats)
+
+    print_results(results, names)
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+        print(f"Results saved to '{output_path}'")
+    return results
+
+
+def print_results(results: Dict, names: List[str], baseline: Optional[Dict] = None):
+    for name in names:
+        print(f"--- {name}")
+        for key in ("completed_ratio", "games_per_minute", "s_median", "s_p95", "s_p99",
+                    "retry_amplification", "requests_per_completed_game"):
+            text = f"{key:<32} {results[name].get(key)}"
+            if baseline and key in baseline.get(name, {}):
+                text += f"  (was {baseline[name][key]})"
+            print(text)
+        if results[name].get("errors"):
+            print(f"{'errors':<32} {results[name]['errors']}")
+
+
+def compare(results_path: str, baseline_path: str):
+    with open(results_path, encoding='utf-8') as f:
+        results = json.load(f)
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"{results.get('commit')} vs {baseline.get('commit')}")
+    print_results(results, [name for name in PIPELINES if name in results], baseline)
+
+
+if __name__ == "__main__":
+    run_benchmark()
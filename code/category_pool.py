@@ -0,0 +1,452 @@
+import itertools
+import math
+import os
+import random
+import sqlite3
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+CATEGORY_SIZE = 4
+POOL_PATH = 'category_pool.sqlite'
+# Candidate groups stored per dataset category
+GROUPS_PER_CATEGORY = 8
+# Groups below this cohesion (mean pairwise cosine of the words) or with OOV words are not served
+MIN_COHESION = 0.1
+MAX_LOOKUP_TRIES = 50
+
+SCHEMA = """
+CREATE TABLE categories (
+    id INTEGER PRIMARY KEY,
+    main_type TEXT NOT NULL,
+    subtype TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    node_bits BLOB NOT NULL,
+    ancestor_bits BLOB NOT NULL
+);
+CREATE TABLE category_words (
+    word TEXT NOT NULL,
+    category_id INTEGER NOT NULL
+);
+CREATE TABLE groups (
+    id INTEGER PRIMARY KEY,
+    category_id INTEGER NOT NULL,
+    main_type TEXT NOT NULL,
+    w1 TEXT NOT NULL, w2 TEXT NOT NULL, w3 TEXT NOT NULL, w4 TEXT NOT NULL,
+    cohesion REAL,
+    oov INTEGER NOT NULL,
+    min_frequency INTEGER NOT NULL,
+    word_bits BLOB NOT NULL
+);
+CREATE TABLE group_words (
+    word TEXT NOT NULL,
+    group_id INTEGER NOT NULL
+);
+CREATE TABLE word_bits (
+    word TEXT PRIMARY KEY,
+    ancestor_bits BLOB NOT NULL
+);
+"""
+
+INDEXES = """
+CREATE INDEX categories_name ON categories (name);
+CREATE INDEX category_words_word ON category_words (word);
+CREATE INDEX groups_category ON groups (category_id);
+CREATE INDEX group_words_word ON group_words (word);
+"""
+
+
+def to_blob(bits: int) -> bytes:
+    return bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+
+
+def from_blob(blob: bytes) -> int:
+    return int.from_bytes(blob, 'little')
+
+
+def sample_groups(words: List[str], count: int, rng: random.Random) -> List[Tuple[str, ...]]:
+    """
+    Up to count distinct 4-word groups: all of them for small categories, random ones otherwise.
+    """
+    words = sorted(words)
+    if math.comb(len(words), CATEGORY_SIZE) <= count:
+        return list(itertools.combinations(words, CATEGORY_SIZE))
+    groups = set()
+    for _ in range(count * 4):
+        groups.add(tuple(sorted(rng.sample(words, CATEGORY_SIZE))))
+        if len(groups) == count:
+            break
+    return list(groups)
+
+
+def word_frequencies(data_by_word: Dict[str, Dict[str, Dict[str, Set[str]]]]) -> Counter:
+    """
+    Number of dataset categories each word occurs in, used as a frequency proxy:
+    the bundled data has no corpus counts.
+    """
+    frequencies = Counter()
+    for subtypes in data_by_word.values():
+        for word_to_cats in subtypes.values():
+            for word, cats in word_to_cats.items():
+                frequencies[word] += len(cats)
+    return frequencies
+
+
+def score_groups(groups: List[Tuple[str, ...]], navec) -> List[Tuple[Optional[float], int]]:
+    """
+    (cohesion, number of OOV words) per group. Cohesion is the mean pairwise cosine of the
+    words present in navec, computed from one normalized matrix per category.
+    """
+    import numpy as np
+
+    if navec is None:
+        return [(None, 0) for _ in groups]
+    words = sorted({w for group in groups for w in group})
+    row = {}
+    vectors = []
+    for word in words:
+        key = word.lower()
+        if key in navec:
+            row[word] = len(vectors)
+            vectors.append(navec[key])
+    if vectors:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-8)
+        similarities = matrix @ matrix.T
+
+    scores = []
+    for group in groups:
+        present = [row[w] for w in group if w in row]
+        oov = len(group) - len(present)
+        if len(present) < 2:
+            scores.append((None, oov))
+            continue
+        block = similarities[np.ix_(present, present)]
+        n = len(present)
+        scores.append((float((block.sum() - n) / (n * (n - 1))), oov))
+    return scores
+
+
+def build_pool(path: str = POOL_PATH, navec=None, groups_per_category: int = GROUPS_PER_CATEGORY,
+               seed: int = 0) -> int:
+    """
+    Scores candidate groups of every dataset category once and writes them to an SQLite pool
+    at path, with word indexes for overlap lookups. Groups are stored sorted by main type,
+    so each type is a contiguous id range. Categories, groups and words also get the bitsets of
+    dataset_io.HYPERNYM_CLOSURE (see CategoryPool.conflicts()). Returns the number of groups.
+    """
+    import dataset_io
+
+    data_by_category, data_by_word = dataset_io.get_datasets()
+    closure = dataset_io.HYPERNYM_CLOSURE
+    frequencies = word_frequencies(data_by_word)
+    rng = random.Random(seed)
+
+    def node_bits(name: str) -> int:
+        node = closure.ids.get(name) if closure is not None else None
+        return 0 if node is None else 1 << node
+
+    def ancestor_bits(name: str) -> int:
+        node = closure.ids.get(name) if closure is not None else None
+        return 0 if node is None else closure.ancestors[node]
+
+    if os.path.exists(path):
+        os.remove(path)
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    category_id, group_id = 0, 0
+    for main_type in sorted(data_by_category):
+        for subtype, categories in sorted(data_by_category[main_type].items()):
+            for name, words in categories.items():
+                if len(words) < CATEGORY_SIZE:
+                    continue
+                category_id += 1
+                connection.execute("INSERT INTO categories VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   (category_id, main_type, subtype, name, len(words),
+                                    to_blob(node_bits(name)), to_blob(ancestor_bits(name))))
+                connection.executemany("INSERT INTO category_words VALUES (?, ?)",
+                                       [(word, category_id) for word in words])
+                groups = sample_groups(list(words), groups_per_category, rng)
+                rows, group_word_rows = [], []
+                for group, (cohesion, oov) in zip(groups, score_groups(groups, navec)):
+                    group_id += 1
+                    min_frequency = min(frequencies.get(w, 0) for w in group)
+                    word_bits = 0
+                    for word in group:
+                        word_bits |= ancestor_bits(word)
+                    rows.append((group_id, category_id, main_type) + group +
+                                (cohesion, oov, min_frequency, to_blob(word_bits)))
+                    group_word_rows.extend((word, group_id) for word in group)
+                connection.executemany("INSERT INTO groups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                connection.executemany("INSERT INTO group_words VALUES (?, ?)", group_word_rows)
+    connection.executemany("INSERT INTO word_bits VALUES (?, ?)", [
+        (word, to_blob(ancestor_bits(word)))
+        for (word,) in connection.execute("SELECT DISTINCT word FROM group_words").fetchall()
+        if ancestor_bits(word)
+    ])
+    connection.executescript(INDEXES)
+    connection.commit()
+    connection.close()
+    print(f"Category pool with {category_id} categories and {group_id} groups saved to '{path}'")
+    return group_id
+
+
+class CategoryPool:
+    """
+    Read side of the pool: random groups by main type and overlap lookups by word,
+    each a primary-key or index lookup. No embeddings are needed at serve time.
+    """
+
+    def __init__(self, path: str = POOL_PATH, min_cohesion: float = MIN_COHESION, allow_oov: bool = False):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.min_cohesion = min_cohesion
+        self.allow_oov = allow_oov
+        self.ranges: Dict[str, Tuple[int, int]] = {
+            main_type: (low, high)
+            for main_type, low, high in self.connection.execute(
+                "SELECT main_type, MIN(id), MAX(id) FROM groups GROUP BY main_type")
+        }
+        # Groups are also stored sorted by subtype within a main type, so each subtype is an id range too
+        self.subtype_ranges: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        for main_type, subtype, low, high in self.connection.execute(
+                "SELECT c.main_type, c.subtype, MIN(g.id), MAX(g.id) FROM groups g "
+                "JOIN categories c ON c.id = g.category_id GROUP BY c.main_type, c.subtype"):
+            self.subtype_ranges.setdefault(main_type, {})[subtype] = (low, high)
+        self._category_bits: Dict[str, Tuple[int, int]] = {}
+
+    def _acceptable(self, cohesion: Optional[float], oov: int) -> bool:
+        if oov and not self.allow_oov:
+            return False
+        return cohesion is None or cohesion >= self.min_cohesion
+
+    def used_bits(self, used_categories: Set[str]) -> Tuple[int, int]:
+        """
+        Node bits and ancestor bits of the used categories, each ORed over them.
+        """
+        nodes, ancestors = 0, 0
+        for name in used_categories:
+            bits = self._category_bits.get(name)
+            if bits is None:
+                bits = (0, 0)
+                for node_blob, ancestor_blob in self.connection.execute(
+                        "SELECT node_bits, ancestor_bits FROM categories WHERE name = ?", (name,)):
+                    bits = (bits[0] | from_blob(node_blob), bits[1] | from_blob(ancestor_blob))
+                self._category_bits[name] = bits
+            nodes |= bits[0]
+            ancestors |= bits[1]
+        return nodes, ancestors
+
+    @staticmethod
+    def conflicts(node_bits: int, ancestor_bits: int, word_bits: int, used: Tuple[int, int]) -> bool:
+        """
+        HypernymClosure.conflicts() on the stored bitsets: the category is under a used one or
+        a used one is under it, or one of the words is under a used one.
+        """
+        used_nodes, used_ancestors = used
+        return bool((ancestor_bits | word_bits) & used_nodes or node_bits & used_ancestors)
+
+    def _group(self, group_id: int) -> Optional[Tuple]:
+        return self.connection.execute(
+            "SELECT c.name, g.w1, g.w2, g.w3, g.w4, g.cohesion, g.oov, c.node_bits, c.ancestor_bits, g.word_bits "
+            "FROM groups g JOIN categories c ON c.id = g.category_id WHERE g.id = ?", (group_id,)
+        ).fetchone()
+
+    def subtype_weights(self, main_type: str, tier=None) -> Tuple[List[Tuple[int, int]], List[float]]:
+        """
+        Id ranges of the subtypes of main_type and their sampling weights: dataset_io.subtype_weight()
+        times the number of groups, so subtypes are drawn as often as dataset_io.pick_random_category
+        draws them (it weights every category by its subtype's weight).
+        """
+        import dataset_io
+
+        ranges, weights = [], []
+        for subtype, (low, high) in self.subtype_ranges.get(main_type, {}).items():
+            weight = dataset_io.subtype_weight(main_type, subtype, tier) * (high - low + 1)
+            if weight > 0:
+                ranges.append((low, high))
+                weights.append(weight)
+        return ranges, weights
+
+    def random_group(self, main_type: str, used_words: Set[str], used_categories: Set[str],
+                     rng=random, tier=None) -> Optional[Tuple[str, List[str]]]:
+        """
+        A random acceptable group of main_type: a subtype drawn by subtype_weights() at the given
+        tier, then a random id within the subtype's range.
+        """
+        ranges, weights = self.subtype_weights(main_type, tier)
+        if not ranges:
+            return None
+        used = self.used_bits(used_categories)
+        for _ in range(MAX_LOOKUP_TRIES):
+            low, high = rng.choices(ranges, weights=weights)[0]
+            row = self._group(rng.randint(low, high))
+            if row is None:
+                continue
+            name, words, (cohesion, oov, node_bits, ancestor_bits, word_bits) = row[0], list(row[1:5]), row[5:]
+            if name in used_categories or used_words.intersection(words) or not self._acceptable(cohesion, oov):
+                continue
+            if used[0] and self.conflicts(from_blob(node_bits), from_blob(ancestor_bits), from_blob(word_bits), used):
+                continue
+            return name, words
+        return None
+
+    def overlap_group(self, word: str, main_type: str, used_words: Set[str], used_categories: Set[str],
+                      rng=random) -> Optional[Tuple[str, List[str]]]:
+        """
+        A group of main_type whose category contains word but whose four words are all new,
+        like get_new_category_by_word.
+        """
+        rows = self.connection.execute(
+            "SELECT c.name, g.w1, g.w2, g.w3, g.w4, g.cohesion, g.oov, c.node_bits, c.ancestor_bits, g.word_bits "
+            "FROM category_words cw JOIN categories c ON c.id = cw.category_id "
+            "JOIN groups g ON g.category_id = c.id WHERE cw.word = ? AND c.main_type = ?", (word, main_type)
+        ).fetchall()
+        rng.shuffle(rows)
+        used = self.used_bits(used_categories)
+        for row in rows:
+            name, words, (cohesion, oov, node_bits, ancestor_bits, word_bits) = row[0], list(row[1:5]), row[5:]
+            if name in used_categories or used_words.intersection(words) or not self._acceptable(cohesion, oov):
+                continue
+            if used[0] and self.conflicts(from_blob(node_bits), from_blob(ancestor_bits), from_blob(word_bits), used):
+                continue
+            return name, words
+        return None
+
+    def groups_with_word(self, word: str, exclude_main_type: str, used_words: Set[str],
+                         used_categories: Set[str], rng=random) -> Optional[Tuple[str, List[str]]]:
+        """
+        A group of another main type that contains word itself, for false groups.
+        The shared word is meant to fit both categories, so only the other words are checked for conflicts.
+        """
+        rows = self.connection.execute(
+            "SELECT c.name, g.w1, g.w2, g.w3, g.w4, g.cohesion, g.oov, c.node_bits, c.ancestor_bits "
+            "FROM group_words gw JOIN groups g ON g.id = gw.group_id JOIN categories c ON c.id = g.category_id "
+            "WHERE gw.word = ? AND c.main_type != ?", (word, exclude_main_type)
+        ).fetchall()
+        rng.shuffle(rows)
+        used = self.used_bits(used_categories)
+        for row in rows:
+            name, words, (cohesion, oov, node_bits, ancestor_bits) = row[0], list(row[1:5]), row[5:]
+            others = [w for w in words if w != word]
+            if name in used_categories or used_words.intersection(others) or not self._acceptable(cohesion, oov):
+                continue
+            if used[0] and self.conflicts(from_blob(node_bits), from_blob(ancestor_bits),
+                                          self._word_bits(others), used):
+                continue
+            return name, [word] + others
+        return None
+
+    def _word_bits(self, words: List[str]) -> int:
+        bits = 0
+        for (blob,) in self.connection.execute(
+                f"SELECT ancestor_bits FROM word_bits WHERE word IN ({', '.join('?' * len(words))})", words):
+            bits |= from_blob(blob)
+        return bits
+
+
+def assemble_intentional_overlap(pool: CategoryPool, rng=random) -> List[Tuple[str, List[str]]]:
+    """
+    Same tiers as generate_intentional_overlap (overlap with the target type, overlap with
+    the other type, random target type, random other type), answered from the pool.
+    """
+    first = pool.random_group('meaning', set(), set(), rng, tier=0)
+    if not first:
+        return []
+    result = [first]
+    used_words, used_categories = set(first[1]), {first[0]}
+    target = 'form'
+    while len(result) < CATEGORY_SIZE:
+        other = 'meaning' if target == 'form' else 'form'
+        shuffled = list(used_words)
+        rng.shuffle(shuffled)
+        found, found_type = None, None
+        for main_type in (target, other):
+            for word in shuffled:
+                found = pool.overlap_group(word, main_type, used_words, used_categories, rng)
+                if found:
+                    found_type = main_type
+                    break
+            if found:
+                break
+        if not found:
+            for tier, main_type in ((3, target), (4, other)):
+                found = pool.random_group(main_type, used_words, used_categories, rng, tier)
+                if found:
+                    found_type = main_type
+                    break
+        if not found:
+            break
+        result.append(found)
+        used_words.update(found[1])
+        used_categories.add(found[0])
+        target = 'meaning' if found_type == 'form' else 'form'
+    return result
+
+
+def assemble_false_group(pool: CategoryPool, rng=random, max_attempts: int = 100
+                         ) -> Optional[Tuple[Tuple[str, List[str]], List[Tuple[str, List[str]]]]]:
+    """
+    Same shape as generate_false_group: an initial group and, for each of its words,
+    a group of another main type containing that word.
+    """
+    main_types = list(pool.ranges)
+    for _ in range(max_attempts):
+        initial_type = rng.choice(main_types)
+        initial = pool.random_group(initial_type, set(), set(), rng, tier=0)
+        if not initial:
+            continue
+        used_words, used_categories = set(initial[1]), {initial[0]}
+        related = []
+        for word in initial[1]:
+            found = pool.groups_with_word(word, initial_type, used_words, used_categories, rng)
+            if not found:
+                break
+            related.append(found)
+            used_words.update(found[1])
+            used_categories.add(found[0])
+        if len(related) == CATEGORY_SIZE:
+            return initial, related
+    return None
+
+
+def intentional_overlap_pipeline(num_runs: int, output_filename: str, path: str = POOL_PATH):
+    pool = CategoryPool(path)
+    with open(output_filename, 'w', encoding='utf-8') as f:
+        successful_runs = 0
+        for i in range(num_runs):
+            f.write(f"--- Run {i + 1} ---\n")
+            generated_data = assemble_intentional_overlap(pool)
+            if len(generated_data) == CATEGORY_SIZE:
+                successful_runs += 1
+            for step, (category, words) in enumerate(generated_data):
+                f.write(f"{step + 1}. {category}: {', '.join(words)}\n")
+            if not generated_data:
+                f.write("No connections were generated for this run (or an error occurred).\n")
+            f.write("\n-------------------------------------\n\n")
+    print(f"Successfully assembled full 4-category puzzles: {successful_runs}/{num_runs} times.")
+
+
+def false_group_pipeline(num_runs: int, output_filename: str, path: str = POOL_PATH):
+    pool = CategoryPool(path)
+    with open(output_filename, 'w', encoding='utf-8') as f:
+        successful_runs = 0
+        for i in range(num_runs):
+            f.write(f"--- Run {i + 1} ---\n")
+            generated_data = assemble_false_group(pool)
+            if generated_data:
+                successful_runs += 1
+                (initial_name, initial_words), related_categories = generated_data
+                f.write(f"{initial_name}: {', '.join(initial_words)}\n")
+                for j, (rel_name, rel_words) in enumerate(related_categories):
+                    f.write(f"{j + 1}. {rel_name}: {', '.join(rel_words)}\n")
+            else:
+                f.write("No connections were generated for this run (or an error occurred).\n")
+            f.write("\n-------------------------------------\n\n")
+    print(f"Successfully assembled full false group puzzles: {successful_runs}/{num_runs} times.")
+
+
+if __name__ == "__main__":
+    import resources
+
+    build_pool(POOL_PATH, resources.get_navec() if resources.navec_available() else None)
+    intentional_overlap_pipeline(5, "pool_io.txt")
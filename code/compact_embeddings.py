@@ -0,0 +1,185 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from lexicon import MinimalPerfectHash, hash_word
+
+# Most frequent navec words kept on top of the project vocabulary (navec's vocab is frequency-ordered)
+DEFAULT_HEAD = 20000
+SPECIAL_TOKENS = ['<pad>', '<unk>']
+
+
+def project_vocabulary(word_bank_path: Optional[str] = 'nyt_connections.csv') -> Set[str]:
+    """
+    Lower-case single words of the datasets and of the NYT word bank, as navec keys.
+    """
+    import dataset_io
+    import form_index
+
+    _, data_by_word = dataset_io.get_datasets()
+    words = {word.lower() for word in form_index.dataset_words(data_by_word)}
+    if word_bank_path and os.path.exists(word_bank_path):
+        from resources import load_word_bank
+
+        words.update(word for word in load_word_bank(word_bank_path) if ' ' not in word)
+    return words
+
+
+def _missing_key(hashed) -> int:
+    return hashed[0] << 32 | hashed[3]
+
+
+class CompactNavec:
+    """
+    Embeddings of a fixed vocabulary: a dense float16 matrix whose rows are addressed by a
+    minimal perfect hash of the word, with a 32-bit fingerprint per row to reject unknown words.
+    Words of the vocabulary that navec does not have are kept as 64-bit hashes, so they are
+    known misses. Any other word is looked up in the full model (fallback), loaded on first miss.
+    Supports the navec lookups the project uses: word in model, model[word], model.get(word).
+    words lists the vocabulary with embeddings (None for models saved before it was stored).
+    """
+
+    def __init__(self, mph: MinimalPerfectHash, fingerprints: np.ndarray, vectors: np.ndarray,
+                 missing: np.ndarray, fallback: Optional[Callable] = None, words: Optional[List[str]] = None):
+        self.mph = mph
+        self.fingerprints = fingerprints
+        self.vectors = vectors
+        self.missing = missing
+        self.words = words
+        self.fallback = fallback
+        self.fallback_lookups = 0
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @classmethod
+    def build(cls, navec, vocabulary: Iterable[str], head: int = DEFAULT_HEAD) -> 'CompactNavec':
+        words = list(SPECIAL_TOKENS)
+        words += [word for word in navec.vocab.words[:head] if word not in SPECIAL_TOKENS]
+        seen = set(words)
+        missing = []
+        for word in sorted(set(vocabulary) - seen):
+            if word in navec:
+                words.append(word)
+            else:
+                missing.append(_missing_key(hash_word(word)))
+
+        hashes = [hash_word(word) for word in words]
+        mph = MinimalPerfectHash.build(hashes)
+        fingerprints = np.zeros(len(words), dtype=np.uint32)
+        vectors = np.zeros((len(words), len(navec['<unk>'])), dtype=np.float16)
+        for word, hashed in zip(words, hashes):
+            slot = mph.slot(hashed)
+            fingerprints[slot] = hashed[3]
+            vectors[slot] = navec[word]
+        return cls(mph, fingerprints, vectors, np.unique(np.asarray(missing, dtype=np.uint64)), words=words)
+
+    def _slot(self, hashed) -> Optional[int]:
+        slot = self.mph.slot(hashed)
+        return slot if self.fingerprints[slot] == hashed[3] else None
+
+    def _known_missing(self, hashed) -> bool:
+        key = np.uint64(_missing_key(hashed))
+        position = np.searchsorted(self.missing, key)
+        return position < len(self.missing) and self.missing[position] == key
+
+    def _full_model(self, hashed):
+        if self.fallback is None or self._known_missing(hashed):
+            return None
+        self.fallback_lookups += 1
+        return self.fallback()
+
+    def __contains__(self, word: str) -> bool:
+        hashed = hash_word(word)
+        if self._slot(hashed) is not None:
+            return True
+        full = self._full_model(hashed)
+        return full is not None and word in full
+
+    def __getitem__(self, word: str) -> np.ndarray:
+        hashed = hash_word(word)
+        slot = self._slot(hashed)
+        if slot is not None:
+            return self.vectors[slot].astype(np.float32)
+        full = self._full_model(hashed)
+        if full is None:
+            raise KeyError(word)
+        return full[word]
+
+    def get(self, word: str, default=None):
+        try:
+            return self[word]
+        except KeyError:
+            return default
+
+    def save(self, path: str):
+        np.savez(path, num_keys=self.mph.num_keys, seeds=np.asarray(self.mph.seeds, dtype=np.int32),
+                 fingerprints=self.fingerprints, vectors=self.vectors, missing=self.missing,
+                 words=np.asarray(self.words if self.words is not None else [], dtype=str))
+
+    @classmethod
+    def load(cls, path: str, fallback: Optional[Callable] = None) -> 'CompactNavec':
+        from array import array
+
+        with np.load(path) as data:
+            mph = MinimalPerfectHash(int(data['num_keys']), array('i', data['seeds'].tolist()))
+            words = data['words'].tolist() if 'words' in data.files and len(data['words']) else None
+            return cls(mph, data['fingerprints'], data['vectors'], data['missing'], fallback, words)
+
+
+def build_compact(path: str, head: int = DEFAULT_HEAD, word_bank_path: Optional[str] = 'nyt_connections.csv'
+                  ) -> CompactNavec:
+    """
+    Extracts the project vocabulary plus the head most frequent words from the full model to path.
+    """
+    from resources import get_full_navec
+
+    vocabulary = project_vocabulary(word_bank_path)
+    print(f"Extracting {len(vocabulary)} project words and the top {head} navec words...")
+    compact = CompactNavec.build(get_full_navec(), vocabulary, head)
+    compact.save(path)
+    size_mb = os.path.getsize(path) / 2 ** 20
+    print(f"Compact model: {len(compact)} words, {len(compact.missing)} known misses, "
+          f"{size_mb:.1f} MB saved to '{path}'")
+    return compact
+
+
+# Loads a model in a fresh interpreter and prints load seconds and peak RSS in MB as JSON
+_LOAD_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import resources
+model = resources.get_full_navec() if sys.argv[1] == 'full' else resources.get_navec()
+model['<unk>']
+seconds = time.perf_counter() - started
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({"seconds": round(seconds, 3), "peak_rss_mb": round(rss, 1)}))
+"""
+
+
+def benchmark_load() -> Dict[str, Dict[str, float]]:
+    """
+    Load time and peak RSS of the full and the compact model, each in a fresh interpreter.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                                        os.environ.get('PYTHONPATH')])))
+    result = {}
+    for name in ('full', 'compact'):
+        output = subprocess.run([sys.executable, '-c', _LOAD_PROBE, name], env=env, check=True,
+                                capture_output=True, text=True).stdout
+        result[name] = json.loads(output.strip().splitlines()[-1])
+        print(f"{name}: loaded in {result[name]['seconds']}s, peak RSS {result[name]['peak_rss_mb']} MB")
+    return result
+
+
+if __name__ == "__main__":
+    from resources import COMPACT_NAVEC_PATH
+
+    started = time.perf_counter()
+    build_compact(COMPACT_NAVEC_PATH)
+    print(f"Done in {time.perf_counter() - started:.1f}s")
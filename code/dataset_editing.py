@@ -1,15 +1,17 @@
 import re
-from navec import Navec
-from sklearn.metrics.pairwise import cosine_similarity
 from itertools import combinations
+from resources import get_navec
 
-# upload from https://github.com/natasha/navec
-navec = Navec.load('navec_hudlit_v1_12B_500K_300d_100q.tar')
-unk = navec['<unk>']
+# navec token used for out-of-vocabulary words
+UNK_TOKEN = '<unk>'
 
 
 # Calculating average similarity
 def average_similarity(words):
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    navec = get_navec()
+    unk = navec[UNK_TOKEN]
     embeddings = [navec.get(word.lower(), unk).reshape(1, -1) for word in words]
     sims = [cosine_similarity(a, b)[0][0] for a, b in combinations(embeddings, 2)]
     return sum(sims) / len(sims)
@@ -72,8 +74,9 @@ def main(input_path, output_path):
         f.write("\n\n".join(processed))
 
 
-input_file = 'dataset_fg.txt'
-output_file = 'dataset_fg_ranked.txt'
+if __name__ == "__main__":
+    input_file = 'dataset_fg.txt'
+    output_file = 'dataset_fg_ranked.txt'
 
-main(input_file, output_file)
-print(f"Results saved to '{output_file}'")
+    main(input_file, output_file)
+    print(f"Results saved to '{output_file}'")
@@ -1,73 +1,21 @@
-import os
 import random
-import csv
-from collections import defaultdict
 from typing import List, Tuple, Dict, Set, Optional
+from dataset_io import get_datasets, sample_category_words, hypernym_conflict, record_outcome
+import dataset_io
+import profiling
 
-DATA_DIR = 'datasets'
 CATEGORY_SIZE = 4
 
 
-def load_datasets_with_subtypes() -> Tuple[
-    Dict[str, Dict[str, Dict[str, Set[str]]]],
-    Dict[str, Dict[str, Dict[str, Set[str]]]]
-]:
-    """
-    Loads datasets from the DATA_DIR, organizing them by main type, subtype,
-    category, and word.
-    """
-    data_by_category = defaultdict(lambda: defaultdict(lambda: defaultdict(set)))
-    data_by_word = defaultdict(lambda: defaultdict(lambda: defaultdict(set)))
-
-    if not os.path.exists(DATA_DIR):
-        print(f"Error: Data directory '{DATA_DIR}' not found.")
-        return {}, {}
-
-    for main_type in os.listdir(DATA_DIR):
-        main_type_path = os.path.join(DATA_DIR, main_type)
-        if not os.path.isdir(main_type_path):
-            continue
-
-        for subtype in os.listdir(main_type_path):
-            subtype_path = os.path.join(main_type_path, subtype)
-            if not os.path.isdir(subtype_path):
-                continue
-
-            for fname in os.listdir(subtype_path):
-                if fname.endswith('.csv'):
-                    file_path = os.path.join(subtype_path, fname)
-                    try:
-                        with open(file_path, encoding='utf-8') as f:
-                            reader = csv.reader(f, delimiter=';')
-                            for row in reader:
-                                if len(row) == 2:
-                                    cat, word = row[0].strip(), row[1].strip()
-                                    if not cat or not word:
-                                        continue
-                                    data_by_category[main_type][subtype][cat].add(word)
-                                    data_by_word[main_type][subtype][word].add(cat)
-                    except Exception as e:
-                        print(f"Error reading file {file_path}: {e}")
-
-    # Convert to regular dicts to prevent defaultdict behavior on missing keys later
-    final_data_by_category = {
-        mt: {st: dict(cats) for st, cats in sub_data.items()}
-        for mt, sub_data in data_by_category.items()
-    }
-    final_data_by_word = {
-        mt: {st: {w: cats for w, cats in word_data.items()} for st, word_data in sub_data.items()}
-        for mt, sub_data in data_by_word.items()
-    }
-    return final_data_by_category, final_data_by_word
-
-
+@profiling.profiled('pick_random_category')
 def pick_random_category(
         all_data_by_category: Dict[str, Dict[str, Dict[str, Set[str]]]],
         used_words: Set[str]
 ) -> Optional[Tuple[str, str, str, List[str]]]:  # main_type, subtype, category_name, sampled_words
     """
     Selects a random category with a subtype and 4 random words from it,
-    ensuring words are not in used_words.
+    ensuring words are not in used_words. Uniform over categories, unless adaptive weights
+    are enabled (dataset_io.ADAPTIVE_WEIGHTS), which then weight the subtypes.
     """
     eligible_categories = []
     for main_type, subtypes in all_data_by_category.items():
@@ -78,42 +26,90 @@ def pick_random_category(
                     # Store all words of the category to sample from later
                     eligible_categories.append((main_type, subtype, category_name, list(words_in_cat)))
 
+    if profiling.ENABLED:
+        profiling.count('pick_random_category.eligible_categories', len(eligible_categories))
     if not eligible_categories:
         return None
 
-    chosen_main_type, chosen_subtype, chosen_category_name, all_words_of_category = random.choice(eligible_categories)
+    if dataset_io.ADAPTIVE_WEIGHTS is None:
+        chosen = random.choice(eligible_categories)
+    else:
+        factors = {}
+        for main_type, subtype, _, _ in eligible_categories:
+            if (main_type, subtype) not in factors:
+                factors[main_type, subtype] = dataset_io.ADAPTIVE_WEIGHTS.factor('fg', main_type, subtype, 0)
+        chosen = random.choices(eligible_categories, weights=[factors[c[0], c[1]] for c in eligible_categories])[0]
+    chosen_main_type, chosen_subtype, chosen_category_name, all_words_of_category = chosen
 
     # Sample from the chosen category's words, excluding already used_words
     available_for_sampling = list(set(all_words_of_category) - used_words)
     if len(available_for_sampling) < CATEGORY_SIZE:  # Should ideally not happen due to earlier check
         return None
 
-    sampled_words = random.sample(available_for_sampling, CATEGORY_SIZE)
+    sampled_words = sample_category_words(
+        chosen_main_type, chosen_subtype, chosen_category_name, available_for_sampling, CATEGORY_SIZE
+    )
     return chosen_main_type, chosen_subtype, chosen_category_name, sampled_words
 
 
+def related_search_order(
+        word: str,
+        possible_main_types: List[str],
+        all_data_by_word: Dict[str, Dict[str, Dict[str, Set[str]]]],
+        tier: Optional[int]
+) -> Optional[Tuple[str, List[str]]]:
+    """
+    Target main type and the order to search its subtypes containing the word in.
+    Uniform (random main type, shuffled subtypes), unless adaptive weights are enabled: then the
+    main type is drawn by the summed factors of its subtypes containing the word at this tier,
+    and the subtypes are shuffled by their factors, so productive ones are tried first.
+    """
+    if dataset_io.ADAPTIVE_WEIGHTS is None:
+        target_main_type = random.choice(possible_main_types)
+        subtypes = [subtype for subtype, word_to_cats in all_data_by_word.get(target_main_type, {}).items()
+                    if word in word_to_cats]
+        random.shuffle(subtypes)
+        return target_main_type, subtypes
+
+    factors: Dict[str, Dict[str, float]] = {}
+    for main_type in possible_main_types:
+        for subtype, word_to_cats in all_data_by_word.get(main_type, {}).items():
+            if word in word_to_cats:
+                factors.setdefault(main_type, {})[subtype] = dataset_io.ADAPTIVE_WEIGHTS.factor(
+                    'fg', main_type, subtype, tier)
+    if not factors:
+        return None
+    main_types = list(factors)
+    target_main_type = random.choices(main_types, weights=[sum(factors[mt].values()) for mt in main_types])[0]
+    # Weighted shuffle: the key u ** (1 / weight) orders like repeated weighted draws without replacement
+    keys = {subtype: random.random() ** (1 / factor) for subtype, factor in factors[target_main_type].items()}
+    return target_main_type, sorted(keys, key=keys.get, reverse=True)
+
+
+@profiling.profiled('get_related_category_containing_word')
 def get_related_category_containing_word(
         word_to_include: str,
         current_main_type_of_word: str,
         all_data_by_word: Dict[str, Dict[str, Dict[str, Set[str]]]],
         all_data_by_category: Dict[str, Dict[str, Dict[str, Set[str]]]],
-        used_words: Set[str]
+        used_words: Set[str],
+        tier: Optional[int] = None
 ) -> Optional[Tuple[str, str, str, List[str]]]:  # main_type, subtype, category_name, words_for_category
     """
     Finds a random category in a different main data type that CONTAINS the word_to_include.
     Returns this category with 4 words (word_to_include + 3 other new words not in used_words).
+    The target main type and its subtypes are picked by related_search_order() for the given tier.
     """
     possible_main_types = [mt for mt in all_data_by_word if mt != current_main_type_of_word]
     if not possible_main_types:
         return None
 
-    target_main_type = random.choice(possible_main_types)
+    search_order = related_search_order(word_to_include, possible_main_types, all_data_by_word, tier)
+    if search_order is None:
+        return None
+    target_main_type, subtypes_to_search = search_order
 
     if target_main_type in all_data_by_word:
-        # Shuffle subtypes to introduce more randomness in selection
-        subtypes_to_search = list(all_data_by_word[target_main_type].keys())
-        random.shuffle(subtypes_to_search)
-
         for subtype in subtypes_to_search:
             if word_to_include in all_data_by_word[target_main_type][subtype]:
                 candidate_categories = list(all_data_by_word[target_main_type][subtype][word_to_include])
@@ -134,15 +130,19 @@ def get_related_category_containing_word(
                         available_other_words = list(all_words_in_found_category - {word_to_include} - used_words)
 
                         if len(available_other_words) >= CATEGORY_SIZE - 1:
-                            other_new_words = random.sample(available_other_words, CATEGORY_SIZE - 1)
+                            other_new_words = sample_category_words(
+                                target_main_type, subtype, category_name, available_other_words, CATEGORY_SIZE - 1
+                            )
                             return target_main_type, subtype, category_name, [word_to_include] + other_new_words
     return None
 
 
+@profiling.profiled('generate_false_group')
 def generate_false_group(
         data_by_category: Dict[str, Dict[str, Dict[str, Set[str]]]],
         data_by_word: Dict[str, Dict[str, Dict[str, Set[str]]]],
-        max_attempts_initial_category: int = 500
+        max_attempts_initial_category: int = 500,
+        attempt_log: Optional[List[int]] = None
 ) -> Optional[Tuple[Tuple[str, List[str]], List[Tuple[str, List[str]]]]]:
     """
     Generates a "false group" puzzle.
@@ -151,10 +151,15 @@ def generate_false_group(
     that specific word plus 3 other new words.
     Returns: ((initial_cat_name, [initial_words]), [(related_cat_name_i, [related_words_i])])
     Returns None if a full puzzle cannot be generated.
+    If attempt_log is given, the number of initial categories tried is appended to it.
+    With adaptive weights, the initial pick (tier 0) and the related pick for each initial
+    word (tiers 1-4) are credited with the outcome of the attempt.
     """
     attempts_for_new_initial = 0
     while attempts_for_new_initial < max_attempts_initial_category:
         attempts_for_new_initial += 1
+        if profiling.ENABLED:
+            profiling.count('generate_false_group.attempts')
 
         # These sets are for the current attempt to build one full puzzle
         current_puzzle_used_words = set()
@@ -165,7 +170,7 @@ def generate_false_group(
         if not initial_category_data:
             continue  # try picking another initial category
 
-        initial_main_type, _initial_subtype, initial_category_name, initial_words = initial_category_data
+        initial_main_type, initial_subtype, initial_category_name, initial_words = initial_category_data
 
         initial_category_tuple = (initial_category_name, initial_words)
         current_puzzle_used_words.update(initial_words)
@@ -173,22 +178,29 @@ def generate_false_group(
 
         related_categories_list = []
         possible_to_generate_all_related = True
+        chosen_arms = [(initial_main_type, initial_subtype, 0)]
 
         # Step 2: For each word in the initial category, find a related category
-        for word_from_initial in initial_words:
+        for tier, word_from_initial in enumerate(initial_words, 1):
             related_category_data = get_related_category_containing_word(
                 word_from_initial,
                 initial_main_type,  # Main type of the category the word_from_initial belongs to
                 data_by_word,
                 data_by_category,
-                current_puzzle_used_words  # Words already used in this puzzle attempt
+                current_puzzle_used_words,  # Words already used in this puzzle attempt
+                tier
             )
 
             if related_category_data:
-                _related_main_type, _related_subtype, related_category_name, related_words = related_category_data
-
-                if related_category_name in current_puzzle_used_category_names:
-                    possible_to_generate_all_related = False  # Category name collision
+                related_main_type, related_subtype, related_category_name, related_words = related_category_data
+                chosen_arms.append((related_main_type, related_subtype, tier))
+
+                # The shared word is meant to fit both categories, so only the new words are checked
+                if related_category_name in current_puzzle_used_category_names or hypernym_conflict(
+                        related_category_name, related_words[1:], current_puzzle_used_category_names):
+                    possible_to_generate_all_related = False  # Category name collision or hypernym overlap
+                    if profiling.ENABLED:
+                        profiling.count('generate_false_group.name_collisions')
                     break
 
                 related_categories_list.append((related_category_name, related_words))
@@ -196,16 +208,27 @@ def generate_false_group(
                 current_puzzle_used_words.update(related_words)  # Add words from this new category
             else:
                 possible_to_generate_all_related = False  # Couldn't find a related category for this word
+                if profiling.ENABLED:
+                    profiling.count('generate_false_group.no_related_category')
                 break
 
-        if possible_to_generate_all_related and len(related_categories_list) == CATEGORY_SIZE:
+        succeeded = possible_to_generate_all_related and len(related_categories_list) == CATEGORY_SIZE
+        record_outcome('fg', chosen_arms, succeeded)
+        if succeeded:
+            if attempt_log is not None:
+                attempt_log.append(attempts_for_new_initial)
             return initial_category_tuple, related_categories_list  # Successfully generated a full puzzle
 
+    if attempt_log is not None:
+        attempt_log.append(attempts_for_new_initial)
+    if profiling.ENABLED:
+        profiling.count('generate_false_group.exhausted')
     return None  # Failed to generate a puzzle after many attempts
 
 
 def false_group_pipeline(num_runs: int, output_filename: str):
-    if not DATA_BY_CATEGORY_GLOBAL_SUBTYPES or not DATA_BY_WORD_GLOBAL_SUBTYPES:
+    data_by_category, data_by_word = get_datasets()
+    if not data_by_category or not data_by_word:
         print("Cannot run generations: datasets are not loaded or are empty.")
         return
 
@@ -216,10 +239,7 @@ def false_group_pipeline(num_runs: int, output_filename: str):
         successful_runs = 0
         for i in range(num_runs):
             f.write(f"--- Run {i + 1} ---\n")
-            generated_data = generate_false_group(
-                DATA_BY_CATEGORY_GLOBAL_SUBTYPES,
-                DATA_BY_WORD_GLOBAL_SUBTYPES
-            )
+            generated_data = generate_false_group(data_by_category, data_by_word)
 
             if generated_data:
                 successful_runs += 1
@@ -236,16 +256,12 @@ def false_group_pipeline(num_runs: int, output_filename: str):
     print(f"Successfully generated full false group puzzles: {successful_runs}/{num_runs} times.")
 
 
-# Global data loading
-DATA_BY_CATEGORY_GLOBAL_SUBTYPES, DATA_BY_WORD_GLOBAL_SUBTYPES = {}, {}
-
 if __name__ == "__main__":
-    print("Initializing and loading datasets...")
-    DATA_BY_CATEGORY_GLOBAL_SUBTYPES, DATA_BY_WORD_GLOBAL_SUBTYPES = load_datasets_with_subtypes()
+    DATA_BY_CATEGORY_GLOBAL_SUBTYPES, DATA_BY_WORD_GLOBAL_SUBTYPES = get_datasets()
 
     if DATA_BY_CATEGORY_GLOBAL_SUBTYPES and DATA_BY_WORD_GLOBAL_SUBTYPES:
         NUMBER_OF_RUNS = 5
         OUTPUT_FILE = "dataset_fg.txt"
         false_group_pipeline(NUMBER_OF_RUNS, OUTPUT_FILE)
     else:
-        print("Datasets could not be loaded. Exiting.")
\ No newline at end of file
+        print("Datasets could not be loaded. Exiting.")
@@ -1,29 +1,166 @@
 import os
 import random
 import csv
+from array import array
 from collections import defaultdict
 from typing import List, Tuple, Dict, Set, Optional
+import profiling
 
 DATA_DIR = 'datasets'
 CATEGORY_SIZE = 4
 
 FORM_SUBTYPE_WEIGHTS = {
     'collocations': 4,
-    'anagrams': 1
+    'anagrams': 1,
+    # virtual subtypes computed by form_index.py
+    'anagram_classes': 2,
+    'vowel_patterns': 1,
+    'prefixes': 1,
+    'suffixes': 1,
+    'numerals': 2
 }
 DEFAULT_SUBTYPE_WEIGHT = 1
 
+# Add the computed form categories (form_index.py) to the datasets loaded by get_datasets()
+USE_FORM_INDEX = True
+# Build them over the navec vocabulary too (up to MAX_WORD_RANK), not only over the dataset words
+FORM_INDEX_NAVEC_WORDS = False
+# Reject categories that are hypernyms/hyponyms of a used one (hypernym_closure.py)
+USE_HYPERNYM_CLOSURE = True
+# Drop dataset words rarer than this frequency rank, and words navec doesn't know (word_stats.py);
+# categories left with fewer than CATEGORY_SIZE words are dropped with them
+MAX_WORD_RANK: Optional[int] = None
+EXCLUDE_OOV_WORDS = False
 
-def load_datasets_with_subtypes() -> Tuple[
+# Rows of weighted datasets (category;word;weight) below this strength are not loaded
+ASSOCIATION_WEIGHT_CUTOFF = 0.2
+# First cells of the CSV header rows
+HEADER_FIRST_CELLS = {'word1', 'hypernym'}
+
+
+class EdgeWeights:
+    """
+    Strengths of the category -> word edges of one weighted subtype. Edges of a category are
+    stored contiguously: words in a list and weights in a float array aligned with it.
+    """
+
+    def __init__(self):
+        self.words: List[str] = []
+        self.weights = array('f')
+        self.spans: Dict[str, Tuple[int, int]] = {}  # category -> (start, end)
+
+    def __len__(self):
+        return len(self.words)
+
+    @classmethod
+    def build(cls, edges: Dict[str, List[Tuple[str, float]]]) -> 'EdgeWeights':
+        result = cls()
+        for category, category_edges in edges.items():
+            start = len(result.words)
+            for word, weight in category_edges:
+                result.words.append(word)
+                result.weights.append(weight)
+            result.spans[category] = (start, len(result.words))
+        return result
+
+    def sample(self, category: str, available_words, k: int) -> Optional[List[str]]:
+        """
+        k of the available words of a category, drawn without replacement with probability
+        proportional to edge strength (Efraimidis-Spirakis keys). Edges of zero strength are
+        never drawn. None for unknown categories.
+        """
+        span = self.spans.get(category)
+        if span is None:
+            return None
+        available = available_words if isinstance(available_words, (set, frozenset)) else set(available_words)
+        keyed = []
+        for i in range(*span):
+            word = self.words[i]
+            if word in available and self.weights[i] > 0:
+                keyed.append((random.random() ** (1.0 / self.weights[i]), word))
+        if len(keyed) < k:
+            return None
+        keyed.sort(reverse=True)
+        return [word for _, word in keyed[:k]]
+
+
+# (main type, subtype) -> EdgeWeights of the datasets loaded by get_datasets()
+EDGE_WEIGHTS: Dict[Tuple[str, str], EdgeWeights] = {}
+# HypernymClosure of the datasets loaded by get_datasets(), if USE_HYPERNYM_CLOSURE
+HYPERNYM_CLOSURE = None
+# WordStats of the datasets, computed when get_datasets() prunes words
+WORD_STATS = None
+# AdaptiveWeights learned from earlier puzzles (adaptive_weights.py), None for static weights
+ADAPTIVE_WEIGHTS = None
+
+
+def subtype_weight(main_type: str, subtype: str, tier=None, generator: str = 'io') -> float:
+    """
+    Sampling weight of a subtype: FORM_SUBTYPE_WEIGHTS for 'form' (DEFAULT_SUBTYPE_WEIGHT otherwise),
+    scaled by the learned factor of the subtype at this tier when ADAPTIVE_WEIGHTS is set.
+    """
+    weight = DEFAULT_SUBTYPE_WEIGHT
+    if main_type == 'form':
+        weight = FORM_SUBTYPE_WEIGHTS.get(subtype, DEFAULT_SUBTYPE_WEIGHT)
+    if ADAPTIVE_WEIGHTS is not None and weight > 0:
+        weight *= ADAPTIVE_WEIGHTS.factor(generator, main_type, subtype, tier)
+    return weight
+
+
+def record_outcome(generator: str, arms: List[Tuple[str, str, object]], success: bool):
+    """
+    Tells ADAPTIVE_WEIGHTS whether the (main type, subtype, tier) choices ended in a full puzzle.
+    """
+    if ADAPTIVE_WEIGHTS is not None and arms:
+        ADAPTIVE_WEIGHTS.record(generator, arms, success)
+
+
+def sample_category_words(main_type: str, subtype: str, category: str, available_words, k: int) -> List[str]:
+    """
+    k random words of a category: weighted by edge strength for weighted subtypes, uniform otherwise.
+    """
+    weights = EDGE_WEIGHTS.get((main_type, subtype))
+    if weights is not None:
+        sampled = weights.sample(category, available_words, k)
+        if sampled is not None:
+            return sampled
+    if not isinstance(available_words, list):
+        available_words = list(available_words)
+    return random.sample(available_words, k)
+
+
+def hypernym_conflict(category: str, words: List[str], used_categories) -> bool:
+    """
+    True if the category is a hypernym or hyponym of a used category, or one of its words
+    falls under one, which would give a word two valid places in the puzzle.
+    """
+    if HYPERNYM_CLOSURE is None or not used_categories:
+        return False
+    conflict = HYPERNYM_CLOSURE.conflicts(category, words, used_categories)
+    if conflict and profiling.ENABLED:
+        profiling.count('hypernym_conflicts')
+    return conflict
+
+
+def load_datasets_with_subtypes(
+        edge_weights: Optional[Dict[Tuple[str, str], EdgeWeights]] = None,
+        weight_cutoff: float = ASSOCIATION_WEIGHT_CUTOFF
+) -> Tuple[
     Dict[str, Dict[str, Dict[str, Set[str]]]],
     Dict[str, Dict[str, Dict[str, Set[str]]]]
 ]:
     """
     Loads datasets from the DATA_DIR, organizing them by main type, subtype,
-    category, and word.
+    category, and word. Rows with a third column are weighted edges: rows below
+    weight_cutoff are skipped and, if edge_weights is given, the strengths of the
+    rest are stored there per (main type, subtype). weight_cutoff must be positive,
+    since EdgeWeights.sample() cannot draw zero-strength edges.
     """
+    if weight_cutoff <= 0:
+        raise ValueError(f"weight_cutoff must be positive, got {weight_cutoff}")
     data_by_category = defaultdict(lambda: defaultdict(lambda: defaultdict(set)))
     data_by_word = defaultdict(lambda: defaultdict(lambda: defaultdict(set)))
+    weighted_edges = defaultdict(lambda: defaultdict(list))
 
     if not os.path.exists(DATA_DIR):
         print(f"Error: Data directory '{DATA_DIR}' not found.")
@@ -45,16 +182,34 @@ def load_datasets_with_subtypes() -> Tuple[
                     try:
                         with open(file_path, encoding='utf-8') as f:
                             reader = csv.reader(f, delimiter=';')
-                            for row in reader:
+                            for line_number, row in enumerate(reader):
+                                if line_number == 0 and row and row[0].strip() in HEADER_FIRST_CELLS:
+                                    continue
                                 if len(row) == 2:
-                                    cat, word = row[0].strip(), row[1].strip()
-                                    if not cat or not word:
+                                    weight = None
+                                elif len(row) == 3:
+                                    try:
+                                        weight = float(row[2])
+                                    except ValueError:
                                         continue
-                                    data_by_category[main_type][subtype][cat].add(word)
-                                    data_by_word[main_type][subtype][word].add(cat)
+                                    if weight < weight_cutoff:
+                                        continue
+                                else:
+                                    continue
+                                cat, word = row[0].strip(), row[1].strip()
+                                if not cat or not word:
+                                    continue
+                                if weight is not None and word not in data_by_category[main_type][subtype][cat]:
+                                    weighted_edges[(main_type, subtype)][cat].append((word, weight))
+                                data_by_category[main_type][subtype][cat].add(word)
+                                data_by_word[main_type][subtype][word].add(cat)
                     except Exception as e:
                         print(f"Error reading file {file_path}: {e}")
 
+    if edge_weights is not None:
+        for key, edges in weighted_edges.items():
+            edge_weights[key] = EdgeWeights.build(edges)
+
     # Convert to regular dicts to prevent defaultdict behavior on missing keys later
     final_data_by_category = {
         mt: {st: dict(cats) for st, cats in sub_data.items()}
@@ -67,15 +222,18 @@ def load_datasets_with_subtypes() -> Tuple[
     return final_data_by_category, final_data_by_word
 
 
+@profiling.profiled('pick_random_category')
 def pick_random_category(
         main_type_to_pick: str,
         all_data_by_category: Dict[str, Dict[str, Dict[str, Set[str]]]],
         used_words: Set[str],
-        used_categories: Set[str]
+        used_categories: Set[str],
+        tier: Optional[int] = None
 ) -> Optional[Tuple[str, str, str, List[str]]]:  # main_type, subtype, category_name, words
     """
     Selects a random category of the specified main_type.
-    For 'form', considers subtype weights. Returns None if no suitable category is found.
+    Subtypes are weighted by subtype_weight() at the given tier. Returns None if no suitable category is found,
+    including when every candidate conflicts with the used categories.
     """
     if main_type_to_pick not in all_data_by_category:
         return None
@@ -84,10 +242,7 @@ def pick_random_category(
     eligible_categories_with_weights = []  # Stores (subtype, cat_name, available_words, weight)
 
     for subtype_name, categories_in_subtype in subtypes_data.items():
-        weight = DEFAULT_SUBTYPE_WEIGHT
-        if main_type_to_pick == 'form':
-            weight = FORM_SUBTYPE_WEIGHTS.get(subtype_name, DEFAULT_SUBTYPE_WEIGHT)
-
+        weight = subtype_weight(main_type_to_pick, subtype_name, tier)
         if weight <= 0:
             continue
 
@@ -101,28 +256,45 @@ def pick_random_category(
                     (subtype_name, cat_name, available_words, weight)
                 )
 
-    if not eligible_categories_with_weights:
-        return None
-
-    subtypes_chosen_list = [item[0] for item in eligible_categories_with_weights]
-    cat_names_chosen_list = [item[1] for item in eligible_categories_with_weights]
-    available_words_lists = [item[2] for item in eligible_categories_with_weights]
-    weights_list = [item[3] for item in eligible_categories_with_weights]
-
-    try:
-        chosen_index = random.choices(range(len(eligible_categories_with_weights)), weights=weights_list, k=1)[0]
-    except ValueError:  # Fallback if all weights are 0 or list is empty (though checked)
-        if not eligible_categories_with_weights: return None  # Should not happen due to check above
-        chosen_index = random.choice(range(len(eligible_categories_with_weights)))  # Uniform choice
-
-    chosen_subtype = subtypes_chosen_list[chosen_index]
-    chosen_category_name = cat_names_chosen_list[chosen_index]
-    words_for_sampling = available_words_lists[chosen_index]
+    if profiling.ENABLED:
+        profiling.count('pick_random_category.eligible_categories', len(eligible_categories_with_weights))
+
+    # Candidates conflicting with the used categories (see hypernym_conflict) are dropped as they
+    # are drawn: a category related to a used one goes at once, and the words under a used category
+    # are taken out of the rest, so the sampled words never conflict
+    used_in_closure = []
+    if HYPERNYM_CLOSURE is not None and used_categories:
+        used_in_closure = [c for c in used_categories if c in HYPERNYM_CLOSURE]
+    used_mask = HYPERNYM_CLOSURE.mask(used_in_closure) if used_in_closure else 0
+
+    while eligible_categories_with_weights:
+        weights_list = [item[3] for item in eligible_categories_with_weights]
+        try:
+            chosen_index = random.choices(range(len(eligible_categories_with_weights)), weights=weights_list, k=1)[0]
+        except ValueError:  # Fallback if all weights are 0
+            chosen_index = random.choice(range(len(eligible_categories_with_weights)))  # Uniform choice
+        chosen_subtype, chosen_category_name, words_for_sampling, _ = eligible_categories_with_weights[chosen_index]
+
+        if used_in_closure:
+            if any(HYPERNYM_CLOSURE.related(chosen_category_name, other) for other in used_in_closure):
+                words_for_sampling = []
+            else:
+                words_for_sampling = [w for w in words_for_sampling if not HYPERNYM_CLOSURE.under_any(w, used_mask)]
+        if len(words_for_sampling) < CATEGORY_SIZE:
+            if profiling.ENABLED:
+                profiling.count('hypernym_conflicts')
+            eligible_categories_with_weights[chosen_index] = eligible_categories_with_weights[-1]
+            eligible_categories_with_weights.pop()
+            continue
 
-    sampled_words = random.sample(words_for_sampling, CATEGORY_SIZE)
-    return main_type_to_pick, chosen_subtype, chosen_category_name, sampled_words
+        sampled_words = sample_category_words(
+            main_type_to_pick, chosen_subtype, chosen_category_name, words_for_sampling, CATEGORY_SIZE
+        )
+        return main_type_to_pick, chosen_subtype, chosen_category_name, sampled_words
+    return None
 
 
+@profiling.profiled('get_new_category_by_word')
 def get_new_category_by_word(
         word_to_connect: str,
         all_data_by_word: Dict[str, Dict[str, Dict[str, Set[str]]]],
@@ -130,10 +302,11 @@ def get_new_category_by_word(
         target_main_type: str,
         used_categories: Set[str],
         used_words: Set[str],
+        tier: Optional[int] = None
 ) -> Optional[Tuple[str, str, str, List[str]]]:
     """
     Finds a new category of target_main_type containing word_to_connect.
-    For 'form', subtype selection is weighted. Returns 4 words not in used_words.
+    Subtype selection is weighted by subtype_weight(). Returns 4 words not in used_words.
     """
     if target_main_type not in all_data_by_word:
         return None
@@ -143,9 +316,7 @@ def get_new_category_by_word(
 
     for subtype_name, word_to_cats in subtypes_word_data.items():
         if word_to_connect in word_to_cats:
-            weight = DEFAULT_SUBTYPE_WEIGHT
-            if target_main_type == 'form':
-                weight = FORM_SUBTYPE_WEIGHTS.get(subtype_name, DEFAULT_SUBTYPE_WEIGHT)
+            weight = subtype_weight(target_main_type, subtype_name, tier)
             if weight > 0:
                 eligible_subtypes_with_weights.append((subtype_name, weight))
 
@@ -175,6 +346,9 @@ def get_new_category_by_word(
 
                 category_all_words = all_data_by_category[target_main_type][chosen_subtype][cat_name]
                 available_new_words = list(category_all_words - used_words)
+                if profiling.ENABLED:
+                    profiling.count('get_new_category_by_word.set_differences')
+                    profiling.count('get_new_category_by_word.set_difference_words', len(category_all_words))
 
                 # new category should contain word_to_connect
                 potential_words_for_category = set(available_new_words)
@@ -182,25 +356,40 @@ def get_new_category_by_word(
                     potential_words_for_category.add(word_to_connect)
 
                 if len(available_new_words) >= CATEGORY_SIZE:
-                    sampled_words = random.sample(available_new_words, CATEGORY_SIZE)
+                    sampled_words = sample_category_words(
+                        target_main_type, chosen_subtype, cat_name, available_new_words, CATEGORY_SIZE
+                    )
+                    if hypernym_conflict(cat_name, sampled_words, used_categories):
+                        continue
                     return target_main_type, chosen_subtype, cat_name, sampled_words
 
+    if profiling.ENABLED:
+        profiling.count('get_new_category_by_word.misses')
     return None
 
 
+@profiling.profiled('generate_intentional_overlap')
 def generate_intentional_overlap(
         data_by_category: Dict[str, Dict[str, Dict[str, Set[str]]]],
-        data_by_word: Dict[str, Dict[str, Dict[str, Set[str]]]]
+        data_by_word: Dict[str, Dict[str, Dict[str, Set[str]]]],
+        tier_log: Optional[List[int]] = None
 ) -> List[Tuple[str, List[str]]]:
+    """
+    Builds a puzzle of up to 4 categories, each overlapping the previous ones where possible.
+    If tier_log is given, the search tier that produced each category after the first
+    (1-4, see the attempts below) is appended to it.
+    With ADAPTIVE_WEIGHTS, the subtypes chosen at each tier are credited with the outcome.
+    """
     used_words = set()
     used_categories = set()
     result_categories_details = []
 
     # First category is always 'meaning'
     current_main_type = 'meaning'
-    first_cat_data = pick_random_category(current_main_type, data_by_category, used_words, used_categories)
+    first_cat_data = pick_random_category(current_main_type, data_by_category, used_words, used_categories, tier=0)
     if not first_cat_data:
         return []
+    chosen_arms = [(first_cat_data[0], first_cat_data[1], 0)]
 
     result_categories_details.append(first_cat_data)
     used_words.update(first_cat_data[3])
@@ -213,24 +402,27 @@ def generate_intentional_overlap(
         found_category_for_this_step = False
         category_data_for_this_step = None
         actual_main_type_chosen_this_step = None
+        tier = None
 
         # Define search order: 1. Overlap with target_type, 2. Overlap with other_type,
         # 3. Random with target_type, 4. Random with other_type.
         primary_search_type = next_target_main_type
         secondary_search_type = 'meaning' if primary_search_type == 'form' else 'form'
 
-        shuffled_used_words = list(used_words)
-        random.shuffle(shuffled_used_words)
+        with profiling.section('shuffle_used_words'):
+            shuffled_used_words = list(used_words)
+            random.shuffle(shuffled_used_words)
 
         # Attempt 1: Find overlap with the primary_search_type
         for word_conn in shuffled_used_words:
             category_data_for_this_step = get_new_category_by_word(
                 word_conn, data_by_word, data_by_category,
-                primary_search_type, used_categories, used_words
+                primary_search_type, used_categories, used_words, tier=1
             )
             if category_data_for_this_step:
                 actual_main_type_chosen_this_step = primary_search_type
                 found_category_for_this_step = True
+                tier = 1
                 break
 
         # Attempt 2: If no overlap with primary, try overlap with secondary_search_type
@@ -238,33 +430,41 @@ def generate_intentional_overlap(
             for word_conn in shuffled_used_words:
                 category_data_for_this_step = get_new_category_by_word(
                     word_conn, data_by_word, data_by_category,
-                    secondary_search_type, used_categories, used_words
+                    secondary_search_type, used_categories, used_words, tier=2
                 )
                 if category_data_for_this_step:
                     actual_main_type_chosen_this_step = secondary_search_type
                     found_category_for_this_step = True
+                    tier = 2
                     break
 
         # Attempt 3: If still no overlap, pick a random category of primary_search_type
         if not found_category_for_this_step:
             category_data_for_this_step = pick_random_category(
-                primary_search_type, data_by_category, used_words, used_categories
+                primary_search_type, data_by_category, used_words, used_categories, tier=3
             )
             if category_data_for_this_step:
                 actual_main_type_chosen_this_step = primary_search_type
                 found_category_for_this_step = True
+                tier = 3
 
         # Attempt 4: If even that fails, pick a random category of secondary_search_type
         if not found_category_for_this_step:
             category_data_for_this_step = pick_random_category(
-                secondary_search_type, data_by_category, used_words, used_categories
+                secondary_search_type, data_by_category, used_words, used_categories, tier=4
             )
             if category_data_for_this_step:
                 actual_main_type_chosen_this_step = secondary_search_type
                 found_category_for_this_step = True
+                tier = 4
 
         if found_category_for_this_step and category_data_for_this_step:
+            if tier_log is not None:
+                tier_log.append(tier)
+            if profiling.ENABLED:
+                profiling.count(f'generate_intentional_overlap.tier_{tier}')
             result_categories_details.append(category_data_for_this_step)
+            chosen_arms.append((category_data_for_this_step[0], category_data_for_this_step[1], tier))
             used_words.update(category_data_for_this_step[3])
             used_categories.add(category_data_for_this_step[2])
             # Next target type alternates based on the type actually chosen for this step
@@ -273,15 +473,65 @@ def generate_intentional_overlap(
             # Failed to find any category for this step, generation might be incomplete
             break
 
+    # A puzzle counts as a success only if every step overlapped (no random fallback, tiers 3-4)
+    record_outcome('io', chosen_arms, len(result_categories_details) == 4 and
+                   all(arm_tier in (0, 1, 2) for _, _, arm_tier in chosen_arms))
     return [(details[2], details[3]) for details in result_categories_details]
 
 
-print("Initializing and loading datasets...")
-DATA_BY_CATEGORY_GLOBAL_SUBTYPES, DATA_BY_WORD_GLOBAL_SUBTYPES = load_datasets_with_subtypes()
+_DATASETS = None
+
+
+def get_datasets() -> Tuple[
+    Dict[str, Dict[str, Dict[str, Set[str]]]],
+    Dict[str, Dict[str, Dict[str, Set[str]]]]
+]:
+    """
+    Datasets loaded on first use and shared by everything in the process.
+    With MAX_WORD_RANK or EXCLUDE_OOV_WORDS, rare and out-of-vocabulary words are pruned first;
+    with USE_FORM_INDEX, the computed form categories over the dataset words (and with
+    FORM_INDEX_NAVEC_WORDS, over the navec vocabulary) are added;
+    with USE_HYPERNYM_CLOSURE, the hypernym closure used by hypernym_conflict is built.
+    """
+    global _DATASETS, HYPERNYM_CLOSURE, WORD_STATS
+    if _DATASETS is None:
+        print("Initializing and loading datasets...")
+        data_by_category, data_by_word = load_datasets_with_subtypes(EDGE_WEIGHTS)
+        if (MAX_WORD_RANK is not None or EXCLUDE_OOV_WORDS) and data_by_word:
+            import word_stats
+
+            WORD_STATS = word_stats.get_word_stats(data_by_word, DATA_DIR)
+            data_by_category, data_by_word = word_stats.prune_datasets(
+                data_by_category, WORD_STATS.keep(MAX_WORD_RANK, EXCLUDE_OOV_WORDS))
+            print(f"Pruned datasets: {sum(len(c) for s in data_by_category.values() for c in s.values())} "
+                  f"categories left")
+        if USE_FORM_INDEX and data_by_word:
+            import form_index
+
+            words = form_index.dataset_words(data_by_word)
+            if FORM_INDEX_NAVEC_WORDS:
+                import resources
+
+                if os.path.exists(resources.NAVEC_PATH):
+                    words |= set(form_index.navec_words(resources.get_full_navec(), MAX_WORD_RANK))
+                elif resources.navec_available():
+                    words |= set(form_index.navec_words(resources.get_navec(), MAX_WORD_RANK))
+                else:
+                    print("FORM_INDEX_NAVEC_WORDS is set, but there is no navec model; "
+                          "form categories are built over the dataset words only")
+            index = form_index.build_form_index(words)
+            form_index.add_form_subtypes(data_by_category, data_by_word, index)
+        if USE_HYPERNYM_CLOSURE:
+            import hypernym_closure
+
+            HYPERNYM_CLOSURE = hypernym_closure.build_from_datasets(data_by_category)
+        _DATASETS = data_by_category, data_by_word
+    return _DATASETS
 
 
 def intentional_overlap_pipeline(num_runs: int, output_filename: str):
-    if not DATA_BY_CATEGORY_GLOBAL_SUBTYPES or not DATA_BY_WORD_GLOBAL_SUBTYPES:
+    data_by_category, data_by_word = get_datasets()
+    if not data_by_category or not data_by_word:
         print("Cannot run generations: datasets are not loaded or are empty.")
         return
 
@@ -292,10 +542,7 @@ def intentional_overlap_pipeline(num_runs: int, output_filename: str):
         successful_runs = 0
         for i in range(num_runs):
             f.write(f"--- Run {i + 1} ---\n")
-            generated_data = generate_intentional_overlap(
-                DATA_BY_CATEGORY_GLOBAL_SUBTYPES,
-                DATA_BY_WORD_GLOBAL_SUBTYPES
-            )
+            generated_data = generate_intentional_overlap(data_by_category, data_by_word)
 
             if generated_data:
                 if len(generated_data) == 4:  # Assuming 4 categories per puzzle
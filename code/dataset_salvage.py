@@ -0,0 +1,56 @@
+import random
+from typing import Dict, List, Optional, Tuple
+
+# Extra LLM requests per game for failed steps the datasets could not fill either
+LLM_RETRY_BUDGET = 2
+CATEGORY_SIZE = 4
+MAIN_TYPES = ['meaning', 'form']
+SEPARATOR = "\n-------------------------------------\n"
+
+
+def salvage_step(game: Dict[str, List[str]]) -> Optional[Tuple[str, str, List[str]]]:
+    """
+    Fills a failed LLM step from the bundled datasets: a category that contains one of the
+    game's words and 4 words not used yet, found like dataset_io.get_new_category_by_word.
+    Returns (overlapping word, category, words), or None if no dataset category fits.
+    """
+    import dataset_io
+
+    data_by_category, data_by_word = dataset_io.get_datasets()
+    used_words = {word.upper() for words in game.values() for word in words}
+    used_categories = {category.upper() for category in game}
+    candidates = list(used_words)
+    random.shuffle(candidates)
+    main_types = random.sample(MAIN_TYPES, len(MAIN_TYPES))
+
+    for main_type in main_types:
+        for word in candidates:
+            found = dataset_io.get_new_category_by_word(
+                word, data_by_word, data_by_category, main_type, used_categories, used_words
+            )
+            if found:
+                _, _, category, words = found
+                return word, category, words
+    return None
+
+
+def close_incomplete_run(written: int, path: str, steps: int = CATEGORY_SIZE):
+    """
+    Writes the run separator for a run that wrote some but not all of its steps lines (the last
+    one writes it), so the next run in the file is not glued to it.
+    """
+    if 0 < written < steps:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(SEPARATOR)
+
+
+def summarize_steps(step_logs: List[List[str]]) -> str:
+    """
+    One line about how the steps of a batch of games were filled: 'llm', 'llm_retry' (by an LLM
+    request after the datasets failed), 'dataset' (salvaged) or 'lost'.
+    """
+    steps = [source for log in step_logs for source in log]
+    complete = sum(1 for log in step_logs if len(log) == 4 and 'lost' not in log)
+    return (f"Complete games: {complete}/{len(step_logs)}; steps from LLM: {steps.count('llm')}, "
+            f"salvaged from datasets: {steps.count('dataset')}, LLM retries: {steps.count('llm_retry')}, "
+            f"lost: {steps.count('lost')}")
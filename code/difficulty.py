@@ -0,0 +1,210 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+CATEGORY_SIZE = 4
+DEFAULT_CANDIDATES = 32
+# Distance added per unit a candidate misses a bound of the target by
+BOUND_PENALTY = 10.0
+# navec token used for out-of-vocabulary words
+UNK_TOKEN = '<unk>'
+
+
+@dataclass
+class DifficultyTarget:
+    """
+    Wanted difficulty profile of a puzzle: cohesion (mean pairwise navec cosine) of its groups
+    from easiest to hardest, and how confusable groups may be with each other (the highest
+    mean cosine between the words of two different groups). easiest_min and hardest_max are
+    hard bounds; candidates breaking them are only picked if nothing else is close.
+    """
+    cohesion: Tuple[float, float, float, float] = (0.45, 0.35, 0.25, 0.15)
+    confusability: float = 0.2
+    easiest_min: Optional[float] = None
+    hardest_max: Optional[float] = None
+
+
+def puzzle_groups(puzzle: List[Dict]) -> List[List[str]]:
+    """
+    The groups a player sorts the words into; the initial category of a false group is left out.
+    """
+    return [c["words"] for c in puzzle if not c.get("initial")]
+
+
+def score_puzzles(puzzles: List[List[Dict]], navec) -> Dict[str, 'np.ndarray']:
+    """
+    Scores all candidates in one vectorized pass. Every word is looked up once, candidates are
+    stacked into an (N, 16, dim) tensor and all pairwise cosines come from one batched matmul.
+    Returns arrays over candidates: "group_cohesion" (N, 4) in puzzle order, "cohesion" (N, 4)
+    sorted from easiest to hardest, "confusability" (N,), "oov" (N,) words missing from navec and
+    "word_affinity" (N, 16, 4), the mean cosine of every word with the other words of each group.
+    """
+    import numpy as np
+
+    words = sorted({w for puzzle in puzzles for group in puzzle_groups(puzzle) for w in group})
+    row = {word: i + 1 for i, word in enumerate(words)}  # row 0 stays a zero vector for padding
+    vectors = np.zeros((len(words) + 1, navec[UNK_TOKEN].shape[0]), dtype=np.float32)
+    for word, i in row.items():
+        key = word.lower()
+        if key in navec:
+            vectors[i] = navec[key]
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-8)
+
+    size = CATEGORY_SIZE * CATEGORY_SIZE
+    index = np.zeros((len(puzzles), size), dtype=np.int64)
+    for n, puzzle in enumerate(puzzles):
+        for g, group in enumerate(puzzle_groups(puzzle)[:CATEGORY_SIZE]):
+            for w, word in enumerate(group[:CATEGORY_SIZE]):
+                index[n, g * CATEGORY_SIZE + w] = row[word]
+
+    embedded = vectors[index]  # (N, 16, dim)
+    present = np.linalg.norm(embedded, axis=2) > 0  # (N, 16)
+    similarities = embedded @ embedded.transpose(0, 2, 1)  # (N, 16, 16)
+    pairs = (present[:, :, None] & present[:, None, :]) & ~np.eye(size, dtype=bool)
+
+    # Sum and count the pairs of every (group, group) block
+    shape = (len(puzzles), CATEGORY_SIZE, CATEGORY_SIZE, CATEGORY_SIZE, CATEGORY_SIZE)
+    masked = np.where(pairs, similarities, 0.0)
+    block_sums = masked.reshape(shape).sum(axis=(2, 4))
+    block_counts = pairs.reshape(shape).sum(axis=(2, 4))
+    block_means = block_sums / np.maximum(block_counts, 1)  # (N, 4, 4)
+    word_shape = (len(puzzles), size, CATEGORY_SIZE, CATEGORY_SIZE)
+    word_sums = masked.reshape(word_shape).sum(axis=3)
+    word_affinity = word_sums / np.maximum(pairs.reshape(word_shape).sum(axis=3), 1)  # (N, 16, 4)
+
+    groups = np.arange(CATEGORY_SIZE)
+    group_cohesion = block_means[:, groups, groups]
+    cross = np.where(np.eye(CATEGORY_SIZE, dtype=bool), -np.inf, block_means)
+    return {
+        "group_cohesion": group_cohesion,
+        "cohesion": -np.sort(-group_cohesion, axis=1),
+        "confusability": cross.max(axis=(1, 2)),
+        "oov": (~present).sum(axis=1) - (index == 0).sum(axis=1),
+        "word_affinity": word_affinity,
+    }
+
+
+def distances(scores: Dict[str, 'np.ndarray'], target: DifficultyTarget) -> 'np.ndarray':
+    """
+    Distance of every candidate from the target profile: squared error of the cohesion
+    profile and of the confusability, plus BOUND_PENALTY per unit a bound is missed by.
+    """
+    import numpy as np
+
+    cohesion = scores["cohesion"]
+    result = ((cohesion - np.asarray(target.cohesion)) ** 2).sum(axis=1)
+    result += (scores["confusability"] - target.confusability) ** 2
+    if target.easiest_min is not None:
+        result += BOUND_PENALTY * np.maximum(target.easiest_min - cohesion[:, 0], 0)
+    if target.hardest_max is not None:
+        result += BOUND_PENALTY * np.maximum(cohesion[:, -1] - target.hardest_max, 0)
+    return result
+
+
+_GENERATORS = None
+
+
+def _generate(puzzle_type: str, count: int) -> List[List[Dict]]:
+    global _GENERATORS
+    if _GENERATORS is None:
+        import puzzle_server
+
+        _GENERATORS = puzzle_server.make_dataset_generators()
+    generate = _GENERATORS[puzzle_type]
+    return [generate() for _ in range(count)]
+
+
+def generate_candidates(puzzle_type: str, n: int, executor: Optional[ProcessPoolExecutor] = None,
+                        workers: int = 1) -> List[List[Dict]]:
+    """
+    n candidates of the type ('io' or 'fg'), split over the executor's workers processes if given.
+    Invalid ones are dropped, so fewer than n may come back.
+    """
+    import puzzle_server
+
+    if executor is None:
+        chunks = [_generate(puzzle_type, n)]
+    else:
+        sizes = [n // workers + (i < n % workers) for i in range(workers)]
+        chunks = executor.map(_generate, [puzzle_type] * workers, [size for size in sizes if size])
+    return [p for chunk in chunks for p in chunk if puzzle_server.validate_puzzle(puzzle_type, p)]
+
+
+def best_of_n(candidates: List[List[Dict]], target: DifficultyTarget, navec
+              ) -> Optional[Tuple[List[Dict], Dict]]:
+    """
+    The candidate closest to the target, with its groups ordered from easy to difficult
+    like dataset_editing.process_runs, and its scores.
+    """
+    if not candidates:
+        return None
+    scores = score_puzzles(candidates, navec)
+    distance = distances(scores, target)
+    best = int(distance.argmin())
+
+    puzzle = candidates[best]
+    groups = [c for c in puzzle if not c.get("initial")]
+    group_cohesion = scores["group_cohesion"][best]
+    order = sorted(range(len(groups)), key=lambda i: -group_cohesion[i])
+    ranked = [groups[i] for i in order] + [c for c in puzzle if c.get("initial")]
+    return ranked, {
+        "distance": round(float(distance[best]), 4),
+        "cohesion": [round(float(x), 4) for x in scores["cohesion"][best]],
+        "confusability": round(float(scores["confusability"][best]), 4),
+        "oov": int(scores["oov"][best]),
+    }
+
+
+def difficulty_pipeline(puzzle_type: str, num_runs: int, output_filename: str,
+                        target: Optional[DifficultyTarget] = None, candidates: int = DEFAULT_CANDIDATES,
+                        workers: int = 1):
+    """
+    Writes num_runs puzzles, each the best of `candidates` generated ones, ranked 1-4 in the
+    format of dataset_editing.process_runs.
+    """
+    import dataset_io
+    from resources import get_navec
+
+    target = target or DifficultyTarget()
+    navec = get_navec()
+    dataset_io.get_datasets()  # loaded before forking, so the workers share it
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+
+    print(f"\n--- Starting {num_runs} '{puzzle_type}' runs, best of {candidates} candidates each ---")
+    generation_seconds = scoring_seconds = 0.0
+    outputs = []
+    try:
+        for i in range(num_runs):
+            started = time.perf_counter()
+            generated = generate_candidates(puzzle_type, candidates, executor, workers)
+            scored = time.perf_counter()
+            result = best_of_n(generated, target, navec)
+            generation_seconds += scored - started
+            scoring_seconds += time.perf_counter() - scored
+            if result is None:
+                print(f"Run {i + 1}: no valid candidates")
+                continue
+            puzzle, scores = result
+            print(f"Run {i + 1}: {len(generated)} candidates, distance {scores['distance']}, "
+                  f"cohesion {scores['cohesion']}, confusability {scores['confusability']}")
+            lines = [f"--- Run {i + 1} ---"]
+            groups = [c for c in puzzle if not c.get("initial")]
+            lines += [f"{rank}. {c['name'].upper()}: {', '.join(c['words'])}" for rank, c in enumerate(groups, 1)]
+            lines += [f"({c['name'].upper()}: {', '.join(c['words'])})" for c in puzzle if c.get("initial")]
+            outputs.append("\n".join(lines))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    with open(output_filename, 'w', encoding='utf-8') as f:
+        f.write("\n\n".join(outputs) + "\n")
+    print(f"\nGeneration {generation_seconds:.2f}s, scoring {scoring_seconds:.2f}s. "
+          f"Results saved to '{output_filename}'.")
+
+
+if __name__ == "__main__":
+    difficulty_pipeline('io', 5, 'dataset_io_targeted.txt')
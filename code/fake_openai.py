@@ -0,0 +1,217 @@
+import json
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal')
+# Characters per streamed chunk
+STREAM_CHUNK_SIZE = 24
+# Placeholders of the 'Формат ответа' blocks in prompts/ the fake fills with vocabulary words
+PLACEHOLDER_RE = re.compile(r"СЛОВО\d*|НАЗВАНИЕ|КАТЕГОРИЯ\d*")
+FILLER = "Сначала порассуждаю о словах и возможных значениях."
+
+
+@dataclass
+class FakeConfig:
+    """
+    Behaviour of the fake API. Latency is per request: 'fixed' is always latency_median seconds,
+    'uniform' is within latency_median * (1 ± latency_spread) and 'lognormal' has the median
+    latency_median and the log-scale deviation latency_spread. throttle_rate of the requests
+    get a 429 with a retry-after-ms header, malformed_rate get an answer without the format block.
+    """
+    latency: str = 'lognormal'
+    latency_median: float = 0.2
+    latency_spread: float = 0.5
+    throttle_rate: float = 0.0
+    malformed_rate: float = 0.0
+    retry_after_ms: int = 50
+    seed: Optional[int] = None
+
+
+def answer_format(prompt: str) -> List[str]:
+    """
+    Lines of the answer format a prompt asks for: the lines after its last 'Формат' heading.
+    """
+    lines = prompt.strip().split("\n")
+    start = max((i for i, line in enumerate(lines) if line.strip().startswith("Формат")), default=None)
+    if start is None:
+        return []
+    return [line.strip() for line in lines[start + 1:] if line.strip()]
+
+
+def fake_answer(prompt: str, vocabulary: List[str], rng: random.Random, malformed: bool = False) -> str:
+    """
+    A completion in the format the prompt asks for, with every placeholder replaced by a
+    different vocabulary word. A malformed one only has the reasoning.
+    """
+    if malformed:
+        return FILLER
+    words = iter(rng.sample(vocabulary, min(len(vocabulary), 64)))
+    lines = [PLACEHOLDER_RE.sub(lambda _: next(words, "СЛОВО"), line) for line in answer_format(prompt)]
+    return "\n".join([FILLER] + lines)
+
+
+class FakeOpenAIServer:
+    """
+    OpenAI-compatible chat completions endpoint on localhost, so the real client (and its
+    retries) runs against it: start it and point OPENAI_BASE_URL at url. Supports n and
+    stream. Counts every request it receives in stats; x-stainless-retry-count tells the
+    client's own retries apart from new requests.
+    """
+
+    def __init__(self, vocabulary: List[str], config: Optional[FakeConfig] = None, host: str = '127.0.0.1',
+                 port: int = 0):
+        if config is None:
+            config = FakeConfig()
+        if config.latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution '{config.latency}'")
+        if not vocabulary:
+            raise ValueError("The fake needs a vocabulary to answer with")
+        self.vocabulary = list(vocabulary)
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.stats: Dict[str, int] = {}
+        self.reset_stats()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {"requests": 0, "retries": 0, "throttled": 0, "malformed": 0, "ok": 0}
+
+    def count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    def start(self) -> 'FakeOpenAIServer':
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def draw(self) -> Dict:
+        """
+        Latency and outcome of one request, drawn under the lock from the seeded generator.
+        """
+        config = self.config
+        with self.lock:
+            if config.latency == 'fixed':
+                latency = config.latency_median
+            elif config.latency == 'uniform':
+                latency = self.rng.uniform(config.latency_median * (1 - config.latency_spread),
+                                           config.latency_median * (1 + config.latency_spread))
+            else:
+                latency = config.latency_median * math.exp(self.rng.gauss(0, config.latency_spread))
+            return {
+                "latency": max(latency, 0.0),
+                "throttled": self.rng.random() < config.throttle_rate,
+                "malformed": self.rng.random() < config.malformed_rate,
+                "seed": self.rng.getrandbits(32),
+            }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; without this a keep-alive request waits
+            # for the delayed ACK (~40 ms)
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+                if not self.path.endswith('/chat/completions'):
+                    self._send_json(404, {"error": {"message": f"Unknown path {self.path}",
+                                                    "type": "invalid_request_error"}})
+                    return
+                server.count("requests")
+                if self.headers.get('x-stainless-retry-count', '0') != '0':
+                    server.count("retries")
+                outcome = server.draw()
+                if outcome["throttled"]:
+                    server.count("throttled")
+                    self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests",
+                                                    "code": "rate_limit_exceeded"}},
+                                    {"retry-after-ms": str(server.config.retry_after_ms)})
+                    return
+
+                rng = random.Random(outcome["seed"])
+                prompt = body.get("messages", [{}])[-1].get("content", "")
+                answers = [fake_answer(prompt, server.vocabulary, rng, outcome["malformed"])
+                           for _ in range(body.get("n") or 1)]
+                server.count("malformed" if outcome["malformed"] else "ok")
+                if body.get("stream"):
+                    self._stream(body, answers[0], outcome["latency"])
+                else:
+                    time.sleep(outcome["latency"])
+                    self._send_json(200, completion(body, prompt, answers))
+
+            def _send_json(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, body: Dict, answer: str, latency: float):
+                # Half of the latency before the first token, the rest spread over the chunks
+                pieces = [answer[i:i + STREAM_CHUNK_SIZE] for i in range(0, len(answer), STREAM_CHUNK_SIZE)]
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+                time.sleep(latency / 2)
+                for piece in pieces:
+                    chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": body.get("model", "fake"),
+                             "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                    time.sleep(latency / 2 / len(pieces))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def completion(body: Dict, prompt: str, answers: List[str]) -> Dict:
+    prompt_tokens = len(prompt.split())
+    completion_tokens = sum(len(answer.split()) for answer in answers)
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{"index": i, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}
+                    for i, answer in enumerate(answers)],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
@@ -0,0 +1,144 @@
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+CATEGORY_SIZE = 4
+# Classes bigger than this are too generic to be a puzzle category
+MAX_CLASS_SIZE = 300
+PREFIX_LENGTH = 4
+SUFFIX_LENGTH = 4
+MIN_VOWELS = 3
+# Words of a class sharing this many first letters are taken for one root; only one of them is kept
+STEM_LENGTH = PREFIX_LENGTH + 1
+
+NUMERALS = [
+    'ОДИН', 'ДВА', 'ТРИ', 'ЧЕТЫРЕ', 'ПЯТЬ', 'ШЕСТЬ', 'СЕМЬ', 'ВОСЕМЬ', 'ДЕВЯТЬ', 'ДЕСЯТЬ',
+    'СОРОК', 'СТО', 'ТЫСЯЧА', 'НОЛЬ'
+]
+
+WORD_RE = re.compile(r'^[А-ЯЁ]+$')
+# Longest alternatives first, so a longer numeral wins at the same position
+NUMERAL_RE = re.compile('|'.join(sorted(NUMERALS, key=len, reverse=True)))
+_CONSONANTS_TABLE = str.maketrans('', '', 'БВГДЖЗЙКЛМНПРСТФХЦЧШЩЪЬ')
+
+# Virtual 'form' subtypes: subtype -> category name template
+FORM_SUBTYPES = {
+    'anagram_classes': "АНАГРАММЫ ИЗ БУКВ {}",
+    'vowel_patterns': "ГЛАСНЫЕ ПО ПОРЯДКУ {}",
+    'prefixes': "НАЧИНАЮТСЯ НА {}-",
+    'suffixes': "ЗАКАНЧИВАЮТСЯ НА -{}",
+    'numerals': "СОДЕРЖАТ ЧИСЛО {}",
+}
+
+
+def form_classes(words: Iterable[str]) -> Dict[str, Dict[str, List[str]]]:
+    """
+    One pass over a word list: hash indexes keyed by sorted letters, vowel skeleton, prefix,
+    suffix and embedded numeral. Returns subtype -> {category name: every word matching the rule}.
+    """
+    anagrams = defaultdict(list)
+    vowels = defaultdict(list)
+    prefixes = defaultdict(list)
+    suffixes = defaultdict(list)
+    numerals = defaultdict(list)
+
+    for word in set(words):
+        if len(word) < 3 or not WORD_RE.match(word):
+            continue
+        anagrams[''.join(sorted(word))].append(word)
+        skeleton = word.translate(_CONSONANTS_TABLE)
+        if len(skeleton) >= MIN_VOWELS:
+            vowels[skeleton].append(word)
+        if len(word) >= PREFIX_LENGTH + 2:
+            prefixes[word[:PREFIX_LENGTH]].append(word)
+        if len(word) >= SUFFIX_LENGTH + 2:
+            suffixes[word[-SUFFIX_LENGTH:]].append(word)
+        match = NUMERAL_RE.search(word)
+        if match and match.group() != word:
+            numerals[match.group()].append(word)
+
+    return {
+        'anagram_classes': _named(anagrams, 'anagram_classes', lambda key: ', '.join(key)),
+        'vowel_patterns': _named(vowels, 'vowel_patterns', lambda key: '-'.join(key)),
+        'prefixes': _named(prefixes, 'prefixes', str),
+        'suffixes': _named(suffixes, 'suffixes', str),
+        'numerals': _named(numerals, 'numerals', str),
+    }
+
+
+def build_form_index(words: Iterable[str]) -> Dict[str, Dict[str, Set[str]]]:
+    """
+    The form_classes() of a word list as puzzle categories: subtype -> {category name: words},
+    keeping only classes of CATEGORY_SIZE..MAX_CLASS_SIZE words of distinct roots (see distinct_stems()).
+    """
+    index = {}
+    for subtype, classes in form_classes(words).items():
+        categories = {}
+        for name, members in classes.items():
+            if len(members) > MAX_CLASS_SIZE:
+                continue
+            members = distinct_stems(members)
+            if len(members) >= CATEGORY_SIZE:
+                categories[name] = members
+        index[subtype] = categories
+    return index
+
+
+def distinct_stems(members: Iterable[str]) -> Set[str]:
+    """
+    The shortest word of every group of members sharing the first STEM_LENGTH letters, so a class
+    does not offer однокоренные words like МУЗЫКА, МУЗЫКАНТ, МУЗЫКАЛЬНОСТЬ.
+    """
+    by_stem = {}
+    for word in sorted(members, key=lambda w: (len(w), w)):
+        by_stem.setdefault(word[:STEM_LENGTH], word)
+    return set(by_stem.values())
+
+
+def _named(classes: Dict[str, List[str]], subtype: str, format_key) -> Dict[str, List[str]]:
+    template = FORM_SUBTYPES[subtype]
+    return {template.format(format_key(key)): members for key, members in classes.items()}
+
+
+def dataset_words(data_by_word: Dict[str, Dict[str, Dict[str, Set[str]]]]) -> Set[str]:
+    """
+    Every single-word entry of the loaded datasets.
+    """
+    return {
+        word
+        for subtypes in data_by_word.values()
+        for word_to_cats in subtypes.values()
+        for word in word_to_cats
+        if ' ' not in word
+    }
+
+
+def navec_words(navec, max_rank: Optional[int] = None) -> List[str]:
+    """
+    Upper-case vocabulary of a full or compact navec model, only the max_rank + 1 most
+    frequent words if given (navec's vocabulary is frequency-ordered).
+    """
+    words = navec.vocab.words if hasattr(navec, 'vocab') else (navec.words or [])
+    if max_rank is not None:
+        words = words[:max_rank + 1]
+    return [word.upper() for word in words]
+
+
+def add_form_subtypes(
+        data_by_category: Dict[str, Dict[str, Dict[str, Set[str]]]],
+        data_by_word: Dict[str, Dict[str, Dict[str, Set[str]]]],
+        index: Dict[str, Dict[str, Set[str]]]
+):
+    """
+    Merges the index into the datasets as 'form' subtypes, so the generators pick and
+    overlap these categories exactly like the CSV ones.
+    """
+    form_by_category = data_by_category.setdefault('form', {})
+    form_by_word = data_by_word.setdefault('form', {})
+    for subtype, categories in index.items():
+        form_by_category[subtype] = categories
+        word_to_cats = defaultdict(set)
+        for category, words in categories.items():
+            for word in words:
+                word_to_cats[word].add(category)
+        form_by_word[subtype] = dict(word_to_cats)
@@ -0,0 +1,133 @@
+from typing import Dict, List, Set, Tuple
+from lexicon import check_word, get_lexicon, normalize_word
+
+CATEGORY_SIZE = 4
+# Groups whose mean pairwise navec cosine is below this are sent to the editor
+MIN_COHESION = 0.1
+# A word whose mean cosine with another group beats its own group's by this much is a likely swap
+SWAP_MARGIN = 0.05
+
+
+def structure_problems(game: Dict[str, List[str]]) -> List[str]:
+    problems = []
+    if len(game) != CATEGORY_SIZE:
+        problems.append(f"categories: {len(game)}")
+    for category, words in game.items():
+        if len(words) != CATEGORY_SIZE:
+            problems.append(f"group size: {category} has {len(words)} words")
+    seen = set()
+    for words in game.values():
+        for word in words:
+            normalized = normalize_word(word)
+            if normalized in seen:
+                problems.append(f"duplicate: {word}")
+            seen.add(normalized)
+    return problems
+
+
+def lexicon_problems(game: Dict[str, List[str]], lexicon) -> List[str]:
+    """
+    Words the lexicon rejects; words without an embedding only if it was built with navec.
+    """
+    problems = []
+    for words in game.values():
+        for word in words:
+            reason = check_word(word, lexicon, require_embedding=lexicon.has_embeddings)
+            if reason:
+                problems.append(f"{reason}: {word}")
+    return problems
+
+
+def dataset_problems(game: Dict[str, List[str]], word_categories: Dict[str, Set[str]], closure=None) -> List[str]:
+    """
+    Words the datasets also file under another category of the game, and categories the
+    hypernym closure relates to another category of the game.
+    """
+    problems = []
+    categories = [category.upper() for category in game]
+    for category, words in zip(categories, game.values()):
+        others = [other for other in categories if other != category]
+        for word in words:
+            for other in word_categories.get(word.upper(), ()):
+                if other in others:
+                    problems.append(f"swap: {word} also fits {other} (datasets)")
+        if closure is not None and closure.conflicts(category, [w.upper() for w in words], others):
+            problems.append(f"hypernym: {category} overlaps another category")
+    return problems
+
+
+def embedding_problems(games: List[Dict[str, List[str]]], navec) -> List[List[str]]:
+    """
+    Low-cohesion groups and words closer to another group than to their own, for all games in
+    one pass of difficulty.score_puzzles. Only games with 4 groups of 4 distinct words are scored.
+    """
+    import difficulty
+
+    problems: List[List[str]] = [[] for _ in games]
+    scored = [i for i, game in enumerate(games) if not structure_problems(game)]
+    if not scored:
+        return problems
+    puzzles = [[{"name": name, "words": words} for name, words in games[i].items()] for i in scored]
+    scores = difficulty.score_puzzles(puzzles, navec)
+
+    for n, i in enumerate(scored):
+        names = list(games[i])
+        for g, name in enumerate(names):
+            cohesion = float(scores["group_cohesion"][n, g])
+            if cohesion < MIN_COHESION:
+                problems[i].append(f"low cohesion: {name} ({cohesion:.2f})")
+            for w, word in enumerate(games[i][name]):
+                affinity = scores["word_affinity"][n, g * CATEGORY_SIZE + w]
+                h = int(affinity.argmax())
+                if h != g and affinity[h] - affinity[g] > SWAP_MARGIN:
+                    problems[i].append(f"swap: {word} is closer to {names[h]} "
+                                       f"({affinity[h]:.2f} > {affinity[g]:.2f})")
+    return problems
+
+
+def _word_categories(data_by_word: Dict[str, Dict[str, Dict[str, Set[str]]]]) -> Dict[str, Set[str]]:
+    result: Dict[str, Set[str]] = {}
+    for subtypes in data_by_word.values():
+        for word_to_cats in subtypes.values():
+            for word, categories in word_to_cats.items():
+                result.setdefault(word, set()).update(categories)
+    return result
+
+
+def verify_games(games: List[Dict[str, List[str]]], navec=None, use_datasets: bool = True) -> List[List[str]]:
+    """
+    Problems found in every game ({category: words}), an empty list for a game that needs no
+    editing: structure and duplicates, lexicon and embedding checks of every word, words the
+    datasets file under another category of the game and, with navec, low cohesion and words
+    closer to another group.
+    """
+    lexicon = get_lexicon()
+    word_categories: Dict[str, Set[str]] = {}
+    closure = None
+    if use_datasets:
+        import dataset_io
+
+        _, data_by_word = dataset_io.get_datasets()
+        word_categories = _word_categories(data_by_word)
+        closure = dataset_io.HYPERNYM_CLOSURE
+
+    problems = [structure_problems(game) + lexicon_problems(game, lexicon)
+                + dataset_problems(game, word_categories, closure) for game in games]
+    if navec is not None:
+        for game_problems, found in zip(problems, embedding_problems(games, navec)):
+            game_problems.extend(found)
+    return problems
+
+
+def route_games(games: List[Dict[str, List[str]]], navec=None, use_datasets: bool = True
+                ) -> Tuple[List[int], List[List[str]]]:
+    """
+    Indexes of the games to send to the editor and the problems of every game, printing the reasons.
+    """
+    problems = verify_games(games, navec, use_datasets)
+    to_edit = [i for i, found in enumerate(problems) if found]
+    for i in to_edit:
+        print(f"Game {i + 1}: {'; '.join(problems[i])}")
+    print(f"{len(to_edit)} of {len(games)} games need editing")
+    return to_edit, problems
+
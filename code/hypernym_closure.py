@@ -0,0 +1,154 @@
+from array import array
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class HypernymClosure:
+    """
+    Transitive closure of the hypernym graph. Every node (category or word) gets an id, ids
+    are ordered by depth, and the ancestors of a node are stored as a bitset (a Python int)
+    over those ids. Shallow nodes have small ids, so the bitsets of most nodes stay short.
+    'Is X under Y' is one shift, and the lowest common hypernym is the highest bit of the
+    intersection of two bitsets.
+    """
+
+    def __init__(self, names: List[str], depths: array, ancestors: List[int]):
+        self.names = names
+        self.depths = depths
+        self.ancestors = ancestors
+        self.ids: Dict[str, int] = {name: i for i, name in enumerate(names)}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.ids
+
+    @classmethod
+    def build(cls, hyponyms: Dict[str, Iterable[str]]) -> 'HypernymClosure':
+        """
+        hyponyms: hypernym -> words (or narrower categories) directly under it.
+        Edges closing a cycle are ignored.
+        """
+        parents: Dict[str, Set[str]] = defaultdict(set)
+        children: Dict[str, Set[str]] = defaultdict(set)
+        nodes = set()
+        for hypernym, words in hyponyms.items():
+            nodes.add(hypernym)
+            for word in words:
+                if word == hypernym:
+                    continue
+                nodes.add(word)
+                parents[word].add(hypernym)
+                children[hypernym].add(word)
+
+        # Kahn's order: parents before children; nodes left on cycles go last
+        order = []
+        waiting = {node: len(parents[node]) for node in nodes}
+        queue = deque(sorted(node for node, count in waiting.items() if count == 0))
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for child in children[node]:
+                waiting[child] -= 1
+                if waiting[child] == 0:
+                    queue.append(child)
+        placed = set(order)
+        order.extend(sorted(nodes - placed))
+
+        position = {node: i for i, node in enumerate(order)}
+        depth = {}
+        for node in order:
+            earlier = [p for p in parents[node] if position[p] < position[node]]
+            depth[node] = 1 + max(depth[p] for p in earlier) if earlier else 0
+
+        names = sorted(order, key=lambda node: (depth[node], node))
+        ids = {name: i for i, name in enumerate(names)}
+        ancestor_bits = {}
+        for node in order:
+            bits = 0
+            for parent in parents[node]:
+                if position[parent] < position[node]:
+                    bits |= ancestor_bits[parent] | (1 << ids[parent])
+            ancestor_bits[node] = bits
+        return cls(names, array('H', [min(depth[name], 0xFFFF) for name in names]),
+                   [ancestor_bits[name] for name in names])
+
+    def depth(self, name: str) -> Optional[int]:
+        node = self.ids.get(name)
+        return None if node is None else self.depths[node]
+
+    def is_under(self, name: str, hypernym: str) -> bool:
+        """
+        True if hypernym is a (transitive) hypernym of name.
+        """
+        node, ancestor = self.ids.get(name), self.ids.get(hypernym)
+        if node is None or ancestor is None:
+            return False
+        return bool(self.ancestors[node] >> ancestor & 1)
+
+    def related(self, first: str, second: str) -> bool:
+        """
+        Same node, or one is under the other.
+        """
+        return first == second or self.is_under(first, second) or self.is_under(second, first)
+
+    def lowest_common_hypernym(self, first: str, second: str) -> Optional[str]:
+        """
+        The deepest node both names are under (a name counts as its own hypernym).
+        """
+        a, b = self.ids.get(first), self.ids.get(second)
+        if a is None or b is None:
+            return None
+        common = (self.ancestors[a] | 1 << a) & (self.ancestors[b] | 1 << b)
+        if not common:
+            return None
+        return self.names[common.bit_length() - 1]
+
+    def ancestors_of(self, name: str) -> List[str]:
+        node = self.ids.get(name)
+        if node is None:
+            return []
+        bits = self.ancestors[node]
+        result = []
+        while bits:
+            low = bits & -bits
+            result.append(self.names[low.bit_length() - 1])
+            bits ^= low
+        return result
+
+    def mask(self, names: Iterable[str]) -> int:
+        """
+        Bitset of the given names, for checking many nodes against the same set.
+        """
+        bits = 0
+        for name in names:
+            node = self.ids.get(name)
+            if node is not None:
+                bits |= 1 << node
+        return bits
+
+    def under_any(self, name: str, mask: int) -> bool:
+        node = self.ids.get(name)
+        return node is not None and bool(self.ancestors[node] & mask)
+
+    def conflicts(self, category: str, words: Iterable[str], used_categories: Iterable[str]) -> bool:
+        """
+        True if the category is related to a used category, or one of its words is under one,
+        i.e. the pair would make the puzzle ambiguous.
+        """
+        used = [c for c in used_categories if c in self.ids]
+        if not used:
+            return False
+        if any(self.related(category, other) for other in used):
+            return True
+        mask = self.mask(used)
+        return any(self.under_any(word, mask) for word in words)
+
+
+def build_from_datasets(data_by_category: Dict[str, Dict[str, Dict[str, Set[str]]]]) -> HypernymClosure:
+    """
+    Closure over the 'meaning/hypernyms' datasets (RuWordNet and Wiktionary), where every
+    category is the hypernym of its words.
+    """
+    return HypernymClosure.build(data_by_category.get('meaning', {}).get('hypernyms', {}))
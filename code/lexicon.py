@@ -0,0 +1,335 @@
+import hashlib
+import os
+import pickle
+import re
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Callable
+
+CATEGORY_SIZE = 4
+LEXICON_PATH = 'lexicon.pkl'
+
+# Where a word comes from (bit flags stored per word)
+SOURCE_DATASET = 1
+SOURCE_NAVEC = 2
+
+# Average number of keys per bucket of the perfect hash
+MPH_BUCKET_SIZE = 2
+MPH_MAX_SEED = 1 << 16
+
+WORD_RE = re.compile(r'^[А-Я]+(?:-[А-Я]+)*$')
+
+
+def normalize_word(word: str) -> str:
+    return word.strip().upper().replace('Ё', 'Е')
+
+
+def hash_word(word: str) -> Tuple[int, int, int, int]:
+    """
+    Four independent 32-bit hashes of a word: bucket, slot base, slot step and fingerprint.
+    """
+    digest = hashlib.blake2b(word.encode('utf-8'), digest_size=16).digest()
+    return (
+        int.from_bytes(digest[0:4], 'little'),
+        int.from_bytes(digest[4:8], 'little'),
+        int.from_bytes(digest[8:12], 'little'),
+        int.from_bytes(digest[12:16], 'little'),
+    )
+
+
+def _displace(hashed: Tuple[int, int, int, int], seed: int, n: int) -> int:
+    # Cheap 32-bit mix of the key hashes and the seed, so that every seed gives an independent slot
+    x = (hashed[1] + seed * 0x9E3779B1) & 0xFFFFFFFF
+    x ^= x >> 15
+    x = (x * (hashed[2] | 1)) & 0xFFFFFFFF
+    x ^= x >> 13
+    return x % n
+
+
+class MinimalPerfectHash:
+    """
+    Hash-and-displace minimal perfect hash: maps n known keys to distinct slots 0..n-1
+    using one small seed per bucket of MPH_BUCKET_SIZE keys on average.
+    Unknown keys map to an arbitrary slot, so membership needs a fingerprint check.
+    """
+
+    def __init__(self, num_keys: int, seeds: array):
+        self.num_keys = num_keys
+        self.seeds = seeds
+
+    @classmethod
+    def build(cls, hashes: Sequence[Tuple[int, int, int, int]]) -> 'MinimalPerfectHash':
+        n = len(hashes)
+        num_buckets = max(1, n // MPH_BUCKET_SIZE)
+        buckets: List[List[int]] = [[] for _ in range(num_buckets)]
+        for key_index, (h0, _, _, _) in enumerate(hashes):
+            buckets[h0 % num_buckets].append(key_index)
+
+        seeds = array('i', [0]) * num_buckets
+        taken = bytearray(n)
+        free_slots = None
+        # Large buckets first, while there are still many free slots
+        for bucket_index in sorted(range(num_buckets), key=lambda b: -len(buckets[b])):
+            bucket = buckets[bucket_index]
+            if not bucket:
+                continue
+            if len(bucket) == 1:
+                # Singletons go straight into a free slot, stored as a negative seed
+                if free_slots is None:
+                    free_slots = (slot for slot in range(n) if not taken[slot])
+                slot = next(free_slots)
+                taken[slot] = 1
+                seeds[bucket_index] = -slot - 1
+                continue
+
+            for seed in range(1, MPH_MAX_SEED):
+                slots = {_displace(hashes[k], seed, n) for k in bucket}
+                if len(slots) == len(bucket) and not any(taken[slot] for slot in slots):
+                    for slot in slots:
+                        taken[slot] = 1
+                    seeds[bucket_index] = seed
+                    break
+            else:
+                raise RuntimeError("Could not build a perfect hash: no seed found for a bucket")
+        return cls(n, seeds)
+
+    def slot(self, hashed: Tuple[int, int, int, int]) -> int:
+        seed = self.seeds[hashed[0] % len(self.seeds)]
+        if seed < 0:
+            return -seed - 1
+        return _displace(hashed, seed, self.num_keys)
+
+
+class Lexicon:
+    """
+    Compact word set: a minimal perfect hash plus a 32-bit fingerprint and source flags per word.
+    Words are normalized (upper case, Ё -> Е) on build and lookup.
+    """
+
+    def __init__(self, mph: MinimalPerfectHash, fingerprints: array, sources: bytearray):
+        self.mph = mph
+        self.fingerprints = fingerprints
+        self.sources = sources
+        self._has_embeddings: Optional[bool] = None
+
+    def __len__(self):
+        return self.mph.num_keys
+
+    @classmethod
+    def build(cls, words_with_sources: Dict[str, int]) -> 'Lexicon':
+        words = list(words_with_sources)
+        hashes = [hash_word(word) for word in words]
+        mph = MinimalPerfectHash.build(hashes)
+        fingerprints = array('I', [0]) * len(words)
+        sources = bytearray(len(words))
+        for word, hashed in zip(words, hashes):
+            slot = mph.slot(hashed)
+            fingerprints[slot] = hashed[3]
+            sources[slot] = words_with_sources[word]
+        return cls(mph, fingerprints, sources)
+
+    def index(self, word: str) -> Optional[int]:
+        """
+        Slot of the word in 0..len-1, or None if the word is not in the lexicon.
+        """
+        if not self.mph.num_keys:
+            return None
+        hashed = hash_word(normalize_word(word))
+        slot = self.mph.slot(hashed)
+        if self.fingerprints[slot] != hashed[3]:
+            return None
+        return slot
+
+    def word_sources(self, word: str) -> int:
+        slot = self.index(word)
+        return 0 if slot is None else self.sources[slot]
+
+    def __contains__(self, word: str) -> bool:
+        return self.index(word) is not None
+
+    @property
+    def has_embeddings(self) -> bool:
+        """
+        False if the lexicon was built without navec, so no word would pass require_embedding.
+        """
+        if self._has_embeddings is None:
+            self._has_embeddings = any(source & SOURCE_NAVEC for source in self.sources)
+        return self._has_embeddings
+
+    def save(self, path: str = LEXICON_PATH, fingerprint: Optional[List[Tuple[str, int, int]]] = None):
+        with open(path, 'wb') as f:
+            pickle.dump((fingerprint, self.mph.num_keys, self.mph.seeds, self.fingerprints, self.sources), f)
+
+    @classmethod
+    def load(cls, path: str = LEXICON_PATH, fingerprint: Optional[List[Tuple[str, int, int]]] = None
+             ) -> Optional['Lexicon']:
+        """
+        Saved lexicon, or None if there is none or it was built from other datasets or navec files.
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            saved = pickle.load(f)
+        if len(saved) != 5 or saved[0] != fingerprint:
+            return None
+        _, num_keys, seeds, fingerprints, sources = saved
+        return cls(MinimalPerfectHash(num_keys, seeds), fingerprints, sources)
+
+
+def sources_fingerprint(data_dir: str = 'datasets') -> List[Tuple[str, int, int]]:
+    """
+    (path, size, mtime) of the dataset CSVs and of the navec models the lexicon is built from.
+    """
+    import resources
+    from word_stats import datasets_fingerprint
+
+    fingerprint = datasets_fingerprint(data_dir)
+    for path in (resources.NAVEC_PATH, resources.COMPACT_NAVEC_PATH):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            fingerprint.append((path, stat.st_size, int(stat.st_mtime)))
+    return fingerprint
+
+
+def navec_vocabulary(navec, candidates: Iterable[str]) -> Iterable[str]:
+    """
+    Words with an embedding: the vocabulary of a full navec model or of a compact one,
+    else (a compact model saved without its word list) the candidates the model has.
+    """
+    if hasattr(navec, 'vocab'):
+        return navec.vocab.words
+    if getattr(navec, 'words', None) is not None:
+        return navec.words
+    return [word for word in candidates if word.lower() in navec]
+
+
+def collect_vocabulary(
+        data_by_word: Optional[Dict[str, Dict[str, Dict[str, Set[str]]]]] = None,
+        navec_words: Optional[Iterable[str]] = None
+) -> Dict[str, int]:
+    """
+    Union of the single-word entries of the datasets and of the navec vocabulary,
+    with source flags per normalized word.
+    """
+    vocabulary: Dict[str, int] = {}
+    if data_by_word:
+        for subtypes in data_by_word.values():
+            for word_to_cats in subtypes.values():
+                for word in word_to_cats:
+                    word = normalize_word(word)
+                    if WORD_RE.match(word):
+                        vocabulary[word] = vocabulary.get(word, 0) | SOURCE_DATASET
+    if navec_words is not None:
+        for word in navec_words:
+            word = normalize_word(word)
+            if WORD_RE.match(word):
+                vocabulary[word] = vocabulary.get(word, 0) | SOURCE_NAVEC
+    return vocabulary
+
+
+_LEXICON = None
+
+
+def get_lexicon(navec=None, path: str = LEXICON_PATH) -> Lexicon:
+    """
+    Loads the lexicon from path, or builds it from the datasets and the navec vocabulary
+    and saves it there, also when a dataset file or the navec model changed since it was
+    built. The result is cached for the process.
+    """
+    global _LEXICON
+    if _LEXICON is not None:
+        return _LEXICON
+    fingerprint = sources_fingerprint()
+    _LEXICON = Lexicon.load(path, fingerprint)
+    if _LEXICON is not None:
+        return _LEXICON
+
+    import dataset_io
+    import resources
+
+    print("Building lexicon...")
+    if navec is None and os.path.exists(resources.NAVEC_PATH):
+        navec = resources.get_full_navec()  # the whole vocabulary, not the compact model
+    elif navec is None and resources.navec_available():
+        navec = resources.get_navec()
+    _, data_by_word = dataset_io.get_datasets()
+    vocabulary = collect_vocabulary(data_by_word)
+    if navec is not None:
+        vocabulary = collect_vocabulary(data_by_word, navec_vocabulary(navec, vocabulary))
+    _LEXICON = Lexicon.build(vocabulary)
+    _LEXICON.save(path, fingerprint)
+    print(f"Lexicon with {len(_LEXICON)} words saved to '{path}'")
+    return _LEXICON
+
+
+def check_word(word: str, lexicon: Lexicon, require_embedding: bool = False) -> Optional[str]:
+    """
+    Returns the reason a candidate word is rejected, or None if it is valid.
+    require_embedding needs a lexicon built with navec; without one it raises ValueError
+    instead of rejecting every word.
+    """
+    if require_embedding and not lexicon.has_embeddings:
+        raise ValueError("The lexicon was built without navec, so no word can pass require_embedding; "
+                         f"get the navec model and delete '{LEXICON_PATH}' to rebuild it")
+    stripped = word.strip()
+    if not stripped:
+        return 'empty'
+    if '(' in stripped or ')' in stripped:
+        return 'parenthetical'
+    if len(stripped.split()) > 1:
+        return 'multi-word'
+    normalized = normalize_word(stripped)
+    if not WORD_RE.match(normalized):
+        return 'malformed'
+    sources = lexicon.word_sources(normalized)
+    if not sources:
+        return 'oov'
+    if require_embedding and not sources & SOURCE_NAVEC:
+        return 'no-embedding'
+    return None
+
+
+def filter_candidates(
+        words: Iterable[str],
+        lexicon: Lexicon,
+        require_embedding: bool = False
+) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """
+    Splits candidates into valid words (stripped, upper case, without duplicates)
+    and rejected (word, reason) pairs.
+    """
+    valid, rejected = [], []
+    seen = set()
+    for word in words:
+        reason = check_word(word, lexicon, require_embedding)
+        if reason is None and normalize_word(word) in seen:
+            reason = 'duplicate'
+        if reason is not None:
+            rejected.append((word, reason))
+            continue
+        seen.add(normalize_word(word))
+        valid.append(word.strip().upper())
+    return valid, rejected
+
+
+def select_valid_words(
+        words: Iterable[str],
+        need: int,
+        lexicon: Lexicon,
+        rerequest: Optional[Callable[[List[str], List[Tuple[str, str]], int], List[str]]] = None,
+        require_embedding: bool = False
+) -> List[str]:
+    """
+    Validates LLM candidates. If fewer than need words survive and rerequest is given,
+    rerequest(valid, rejected, missing) is asked once for replacements, which are validated too.
+    """
+    valid, rejected = filter_candidates(words, lexicon, require_embedding)
+    if rejected:
+        print(f"Rejected candidates: {', '.join(f'{w} ({reason})' for w, reason in rejected)}")
+    if len(valid) >= need or rerequest is None:
+        return valid
+
+    extra = rerequest(valid, rejected, need - len(valid))
+    extra_valid, extra_rejected = filter_candidates(list(valid) + list(extra), lexicon, require_embedding)
+    if extra_rejected:
+        print(f"Rejected replacements: {', '.join(f'{w} ({reason})' for w, reason in extra_rejected)}")
+    return extra_valid
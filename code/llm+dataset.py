@@ -1,76 +1,17 @@
-from openai import OpenAI
-import random
-from navec import Navec
-from sklearn.metrics.pairwise import cosine_similarity
 from itertools import combinations
-import csv
-from collections import defaultdict
+from prompt_templates import load_template
+from resources import get_client, get_navec
+from lexicon import get_lexicon, select_valid_words
 import re
+from seed_index import get_seed_index
+from dataset_salvage import LLM_RETRY_BUDGET, salvage_step, close_incomplete_run, summarize_steps
 
 
-MY_KEY = "API_KEY"
-client = OpenAI(api_key=MY_KEY)
-
-# upload from https://github.com/natasha/navec
-navec = Navec.load('navec_hudlit_v1_12B_500K_300d_100q.tar')
-unk = navec['<unk>']
-
-
-INSTRUCTION = """
-Представь, что три эксперта создают головоломку Connections на русском языке.
-Каждый эксперт записывает своё размышление и делится им с остальными. Затем все эксперты переходят к следующему шагу и так далее.
-Если кто-то из экспертов осознаёт, что его ответ не удовлетворяет заданным требованиям, он от него отказывается. Таким образом эксперты приходят к единому мнению.
-
-Задача экспертов - создать четыре группы по четыре слова с чётко выраженной категоризацией. 
-Категории должны быть разнообразными, уникальными и хорошо определёнными.
-
-1. Категории в одной игре должны принадлежать к разным типам из списка:
-   a) Значение слова - конкретные, чётко определённые группы предметов или ПОНЯТИЙ ОДНОГО РОДА; они могут быть основаны на базовой семантике или на "энциклопедических" знаниях
-    - ПОРОДЫ СОБАК: МОПС, ХАСКИ, ПУДЕЛЬ, ТАКСА
-    - СИНОНИМЫ СЛОВА «ДОМ»: ХАТА, ЖИЛИЩЕ, ЛАЧУГА, ГНЕЗДО
-    - ВЕЩИ КРАСНОГО ЦВЕТА: КЛУБНИКА, МАРС, КРОВЬ, ЧИЛИ
-    - ФИЛЬМЫ ТАРКОВСКОГО: СТАЛКЕР, ЗЕРКАЛО, НОСТАЛЬГИЯ, ЖЕРТВОПРИНОШЕНИЕ
-    Также слова могут быть связаны более абстрактной ассоциацией, но слова не должны быть слишком разнородными.
-   b) Форма слова - слова, встречающиеся в устойчивых сочетаниях с одним общим словом, или имеющие общие структурные особенности
-    - ФРАНЦУЗСКИЙ ___: ПОЦЕЛУЙ, БУЛЬДОГ, МАНИКЮР, ЖИМ
-    - ЧЁРНЫЙ ___: ПЯТНИЦА, РЫНОК, СПИСОК, ИКРА
-    - АНАГРАММЫ: СЕКТА, СЕТКА, ТЕСАК, АСКЕТ
-    - СЛОВА С ОДИНАКОВЫМИ ГЛАСНЫМИ: ПОМОР, КАТАМАРАН, БУРУНДУК, ПЕРЕПЕЛ
-   c) Сочетание значения и формы слова
-    - СЛОВА, НАЧИНАЮЩИЕСЯ НА ЧИСЛИТЕЛЬНОЕ: ОДИНОЧКА, ДВАРФ, ТРИТОН, СЕМЬЯ
-
-2. Словами в категориях должны быть СУЩЕСТВИТЕЛЬНЫЕ РУССКОГО ЯЗЫКА, состоящие из ОДНОГО СЛОВА
-
-3. Каждая категория не должна быть слишком общей и должна иметь КОНКРЕТНОЕ название (не "ЖИВОТНЫЕ", а "ДОМАШНИЕ ЖИВОТНЫЕ" или "ХИЩНЫЕ ЖИВОТНЫЕ")
-
-4. Категории должны быть НЕЗАВИСИМЫМИ друг от друга - игрок должен иметь возможность решить головоломку единственным верным образом.
-Не должно быть ситуации, когда два слова, относящиеся к разным категориям, можно поменять между собой, и связь останется верной.
-
-ИЗБЕГАЙ:
-- Повторяющихся слов внутри категорий и между категориями (ВСЕ 16 СЛОВ ДОЛЖНЫ БЫТЬ УНИКАЛЬНЫ)
-- Слишком общих категорий (например, "ЕДА", "ЦВЕТА", "ЖИВОТНЫЕ")
-- Негомогенных слов, относящихся к одной категории (например, "ОБЕЗЬЯНА", "БОНОБО" и "МЛЕКОПИТАЮЩЕЕ" в категории "ЖИВОТНЫЕ")
-- Категорий с нечёткими границами
-- Объяснений в скобках
-
-ПРИМЕРЫ ПЛОХИХ КАТЕГОРИЙ:
-- МУЗЫКАЛЬНЫЙ ФЕСТИВАЛЬ: СЦЕНА, ПУБЛИКА, БИЛЕТ, АРТИСТ
-Это плохая категория, потому что относящиеся к ней слова слишком разнородные.
-- ПРОФЕССИИ: ОХРАННИК, ПОВАР, ВОДИТЕЛЬ, ВРАЧ
-Это плохая категория, потому что она слишком общая.
-- СЛОВА, ЗАКАНЧИВАЮЩИЕСЯ НА "Ы": ОГНИ, МОСТЫ, ВЕРШИНЫ, САДЫ
-Это плохая категория, потому что не все относящиеся к ней слова ей соответствуют ("ОГНИ" не заканчивается на Ы)
-- ЭЛЕМЕНТЫ ГРАФА: ВЕРШИНА, РЁБРО, ГАММИЛЬТОНИАН, КОМПОНЕНТА
-Это плохая группа, потому что она содержит несуществующие в русском языке слова: РЁБРО (правильно "РЕБРО") и ГАММИЛЬТОНИАН
-- ГЕРОИ РУССКИХ НАРОДНЫХ СКАЗОК: СОЛОВЕЙРАЗБОЙНИК, ИВАНЦАРЕВИЧ, БАБАЯГА, ВАСИЛИСАПРЕКРАСНАЯ
-Это плохая категория, потому что она тоже содержит несуществующие слова. Слова "ИВАНЦАРЕВИЧ" не существует, имя героя пишется раздельно в два слова
-
-ПРИ СОЗДАНИИ КАТЕГОРИИ НУЖНО ПРОВЕРИТЬ, ЧТО ОНА:
-1. Имеет чёткое, однозначное название
-2. Содержит 4 слова, каждое из которых точно соответствует категории
-3. Название и слова записаны в верхнем регистре
-4. Дополнительно: категория отличается по типу от предыдущих категорий 
-"""
+# navec token used for out-of-vocabulary words
+UNK_TOKEN = '<unk>'
+
+
+INSTRUCTION_TEMPLATE = 'instruction.txt'
 
 
 def append_to_txt(run_number, step, category, words, path):
@@ -83,6 +24,10 @@ def append_to_txt(run_number, step, category, words, path):
 
 
 def average_similarity(words):
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    navec = get_navec()
+    unk = navec[UNK_TOKEN]
     embeddings = [navec.get(word.lower(), unk).reshape(1, -1) for word in words]
     sims = [cosine_similarity(a, b)[0][0] for a, b in combinations(embeddings, 2)]
     return sum(sims) / len(sims)
@@ -91,6 +36,8 @@ def average_similarity(words):
 def pick_closest(words, num):
     best_group = None
     best_score = -1
+    if len(set(words)) < num:
+        raise ValueError(f"Only {len(set(words))} valid words, {num} needed: {words}")
     for combo in combinations(words, num):
         score = average_similarity(combo)
         if score > best_score:
@@ -99,6 +46,39 @@ def pick_closest(words, num):
     return list(best_group)
 
 
+def gen_more_words(category, valid_words, rejected_words, count):
+    """
+    Targeted re-request for a category with too few valid candidates:
+    only replacements are asked for, not the whole category.
+    """
+    rejected = ', '.join(word for word, _ in rejected_words)
+    user_prompt = load_template('more_words.txt').render(
+        category=category, valid_words=valid_words, rejected=rejected, num_words=2 * count
+    )
+    response = get_client().chat.completions.create(
+        model="gpt-4.1",
+        messages=[
+            {"role": "system", "content": load_template(INSTRUCTION_TEMPLATE).text},
+            {"role": "user", "content": user_prompt}
+        ]
+    )
+    text = response.choices[0].message.content
+    words_line = next((line for line in text.splitlines() if "Слова:" in line), "")
+    return [w.strip() for w in words_line.split("Слова:")[-1].split(",") if w.strip()]
+
+
+def validate_words(category, words, need):
+    """
+    Drops multi-word, malformed and out-of-vocabulary candidates before selection.
+    Words without an embedding are rejected too, since they would get the placeholder vector in ranking.
+    """
+    return select_valid_words(
+        words, need, get_lexicon(),
+        rerequest=lambda valid, rejected, missing: gen_more_words(category, valid, rejected, missing),
+        require_embedding=True
+    )
+
+
 def gen_initial_groups_from_ambiguous(ambiguous_list):
     word_options = []
     for word, senses in ambiguous_list:
@@ -106,36 +86,12 @@ def gen_initial_groups_from_ambiguous(ambiguous_list):
         word_options.append(f"{word.upper()} ({senses_text})")
 
     words_block = ", ".join(word_options)
-    user_prompt = f"""
-Ты создаёшь две категории для головоломки Connections на русском языке.
-
-Для вдохновения используй одно из следующих многозначных слов, которое кажется наиболее перспективным (возможные значения указаны в скобках):
-{words_block}
-
-Придумай две РАЗНЫЕ категории, в которую могло входить бы выбранное слово, но НЕ ВКЛЮЧАЙ в них само это слово:
-1. Категорию, в которую входит это слово — используй одно из его значений.
-2. Вторую категорию — вдохновлённую другим значением.
-
-Обе категории должны соответствовать правилам игры Connections:
-- По 8 слов в каждой категории.
-- Категории не должны пересекаться между собой.
-- Только существительные, по одному слову, в верхнем регистре.
-
-До того, как вынести финальный вердикт рассуждения почему та или иная категория лучше.
-Твой финальный ответ должен СТРОГО соответствовать формату ниже (без дополнительных строк, разделителей и выделений)!
-
-Формат:
-Многозначное слово: СЛОВО
-Категория 1: НАЗВАНИЕ
-Слова 1: СЛОВО1, СЛОВО2, СЛОВО3, СЛОВО4, СЛОВО5, СЛОВО6, СЛОВО7, СЛОВО8
-Категория 2: НАЗВАНИЕ
-Слова 2: СЛОВО1, СЛОВО2, СЛОВО3, СЛОВО4, СЛОВО5, СЛОВО6, СЛОВО7, СЛОВО8
-"""
-    response = client.chat.completions.create(
+    user_prompt = load_template('io+dataset_initial.txt').render(words_block=words_block)
+    response = get_client().chat.completions.create(
         model="gpt-4.1",
         temperature=0.9,
         messages=[
-            {"role": "system", "content": INSTRUCTION},
+            {"role": "system", "content": load_template(INSTRUCTION_TEMPLATE).text},
             {"role": "user", "content": user_prompt}
         ]
     )
@@ -150,40 +106,15 @@ def gen_overlap_group(picked_words, game):
                 words_with_categories.append(f"{word} (категория: {category})")
 
     used_words = [word for words_list in game.values() for word in words_list]
-    used_categories = [word for words_list in game.keys() for word in words_list]
-
-    user_prompt2 = f"""
-Я создаю головоломку Connections с намеренным пересечением слов внутри категорий.
-
-Вот список слов, которые я уже использовал в предыдущих категориях (в скобках указана категория, в которой слово было использовано): 
-{', '.join(words_with_categories)}
-
-Для каждого из этих слов предложи одну или несколько альтернативных категорий. В приоритете использовать полисемичность и омонимию используемых слов. 
-Новые категории должны относится использовать ДРУГОЕ значение или особенность формы слова, отличное от категории, в которой оно уже было использовано.
-Желательно также использовать разные ТИПЫ категорий (значение слова, форма слова, сочетание формы и значения).
- 
-Теперь выбери ОДНУ из этих альтернативных категорий, связь между которой и относящимся к ней словом кажется наиболее перспективной.
-Хорошо, если новое значение слова в категории отличается от значения, уже описанного в других категориях. В приоритете использовать многозначность слов
-Создай категорию с таким названием и аналогично сгенерируй 8 слов, которые подходят под эту категорию
-
-ВАЖНО:
-1. Все слова в новой категории должны быть ОДНОГО УРОВНЯ КЛАССИФИКАЦИИ между собой и с исходным словом из предыдущей категории
-2. НЕ используй слова из предыдущих категорий: {', '.join(used_words)}
-3. Новая категория должна быть уникальной и не повторять уже использованные: {', '.join(used_categories)} — важно, чтобы два слова из разных категорий нельзя было беспрепятственно поменять между ними
-4. Помни, что категории должны быть четко различимыми, чтобы каждая головоломка имела только одно возможное корректное решение
-
-До того, как вынести финальный вердикт рассуждения почему та или иная группа лучше.
-Твой финальный ответ должен СТРОГО соответствовать формату ниже (без дополнительных строк, разделителей и выделений)!
-
-Формат ответа:
-Выбранное слово: СЛОВО
-Категория: НАЗВАНИЕ
-Слова: СЛОВО1, СЛОВО2, СЛОВО3, СЛОВО4, СЛОВО5, СЛОВО6, СЛОВО7, СЛОВО8
-    """
-    response = client.chat.completions.create(
+    used_categories = list(game.keys())
+
+    user_prompt2 = load_template('io.txt').render(
+        words_with_categories=words_with_categories, used_words=used_words, used_categories=used_categories
+    )
+    response = get_client().chat.completions.create(
         model="gpt-4.1",
         messages=[
-            {"role": "system", "content": INSTRUCTION},
+            {"role": "system", "content": load_template(INSTRUCTION_TEMPLATE).text},
             {"role": "user", "content": user_prompt2}
         ]
     )
@@ -224,74 +155,99 @@ def parse_overlap_response(text):
     return chosen_word.strip(), category.strip(), words
 
 
-def intentional_overlap_pipeline_ambiguous(ambiguous_data, num_games: int, output_filename: str):
+def overlap_steps(game, picked_words, used_words, run_number, output_filename, step_log):
+    """
+    Steps 3-4. A step the LLM fails is filled from the datasets, and only if they have no
+    fitting category it is asked again, within LLM_RETRY_BUDGET requests per game.
+    """
+    retries_left = LLM_RETRY_BUDGET
+    for step in range(3, 5):
+        source = 'llm'
+        while True:
+            try:
+                overlap_raw = gen_overlap_group(picked_words, game)
+                picked_word, new_category, new_words = parse_overlap_response(overlap_raw)
+
+                new_words = [word for word in new_words if word not in used_words]
+                new_words = [word for word in validate_words(new_category, new_words, 4)
+                             if word not in used_words]
+                new_core_group = pick_closest(new_words, 4)
+                step_log.append(source)
+            except Exception as e:
+                print(f"Error on step {step}: {e}")
+                salvaged = salvage_step(game) if source == 'llm' else None
+                if salvaged is None:
+                    if retries_left == 0:
+                        step_log.append('lost')
+                        break
+                    retries_left -= 1
+                    source = 'llm_retry'
+                    print(f"Retrying step {step} with the LLM ({retries_left} retries left)")
+                    continue
+                picked_word, new_category, new_core_group = salvaged
+                print(f"(step {step} filled from datasets)")
+                step_log.append('dataset')
+
+            picked_words.append(picked_word)
+            used_words.update(new_core_group)
+
+            print(f"Category {step}: {new_category} — {new_core_group}")
+            append_to_txt(run_number, step, new_category, new_core_group, output_filename)
+            game[new_category] = new_core_group
+            break
+
+
+def intentional_overlap_pipeline_ambiguous(seed_index, num_games: int, output_filename: str):
+    step_logs = []
     for cycle in range(num_games):
         print(f"\nGame generation {cycle + 1}...")
         picked_words = []
         game = {}
         used_words = set()
+        step_log = []
+        step_logs.append(step_log)
 
         run_number = cycle + 1
         try:
-            ambiguous_list = random.sample(list(ambiguous_data.items()), 5)
+            ambiguous_list = seed_index.sample(5)
             response_text = gen_initial_groups_from_ambiguous(ambiguous_list)
             # ambiguous_word, senses = random.choice(list(ambiguous_data.items()))
             # response_text = gen_initial_groups_from_ambiguous(ambiguous_word, senses)
             ambiguous_word, category1, words1, category2, words2 = parse_double_initial_response(response_text)
 
-            words1 = [word for word in words1 if word != ambiguous_word]
+            words1 = [word for word in validate_words(category1, words1, 3) if word != ambiguous_word]
             core_group1 = pick_closest(words1, 3)
             core_group1.append(ambiguous_word)
             used_words.update(core_group1)
 
-            words2 = [word for word in words2 if word not in used_words]
+            words2 = [word for word in validate_words(category2, words2, 4) if word not in used_words]
             core_group2 = pick_closest(words2, 4)
+            used_words.update(core_group2)
 
             print(f"Category 1: {category1} — {core_group1}")
-            append_to_txt(run_number, 1, category1, core_group1)
+            append_to_txt(run_number, 1, category1, core_group1, output_filename)
             game[category1] = core_group1
 
             print(f"Category 2: {category2} — {core_group2}")
-            append_to_txt(run_number, 2, category2, core_group2)
+            append_to_txt(run_number, 2, category2, core_group2, output_filename)
             game[category2] = core_group2
-
-            for step in range(3, 5):
-                try:
-                    overlap_raw = gen_overlap_group(picked_words, game)
-                    picked_word, new_category, new_words = parse_overlap_response(overlap_raw)
-
-                    picked_words.append(picked_word)
-
-                    new_words = [word for word in new_words if word not in used_words]
-                    new_core_group = pick_closest(new_words, 4)
-                    used_words.update(new_core_group)
-
-                    print(f"Category {step}: {new_category} — {new_core_group}")
-                    append_to_txt(run_number, step, new_category, new_core_group)
-                    game[new_category] = new_core_group
-                except Exception as e:
-                    print(f"Error on step {step}: {e}")
-                    continue
+            step_log.extend(['llm', 'llm'])
 
         except Exception as e:
             print(f"Error with initial categories generation: {e}")
+            step_log.append('lost')
+            close_incomplete_run(len(game), output_filename)
             continue
 
-    print(f"\nResults saved to '{output_filename}'")
-
+        overlap_steps(game, picked_words, used_words, run_number, output_filename, step_log)
+        close_incomplete_run(len(game), output_filename)
 
-result = defaultdict(list)
-with open("ambiguous.csv", encoding="utf-8") as f:
-    reader = csv.DictReader(f, delimiter=";")
-    for row in reader:
-        word = row["word"].strip()
-        hypernym = row["hypernym"].strip()
-        result[word].append(hypernym)
-ambiguous = dict(result)
+    print(summarize_steps(step_logs))
+    print(f"\nResults saved to '{output_filename}'")
 
 
 if __name__ == "__main__":
     NUMBER_OF_RUNS = 5
     OUTPUT_FILE = "llm_io_ds.txt"
 
-    intentional_overlap_pipeline_ambiguous(ambiguous, NUMBER_OF_RUNS, OUTPUT_FILE)
+    intentional_overlap_pipeline_ambiguous(get_seed_index(), NUMBER_OF_RUNS, OUTPUT_FILE)
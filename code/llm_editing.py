@@ -1,20 +1,15 @@
-from openai import OpenAI
+import json
+import os
 import re
-from sklearn.metrics.pairwise import cosine_similarity
+import time
 from itertools import combinations
-from navec import Navec
+from prompt_templates import load_template
+from resources import get_client, get_navec, navec_available
 
-MY_KEY = "API_KEY"
-client = OpenAI(api_key=MY_KEY)
+# navec token used for out-of-vocabulary words
+UNK_TOKEN = '<unk>'
 
-# upload from https://github.com/natasha/navec
-navec = Navec.load('navec_hudlit_v1_12B_500K_300d_100q.tar')
-unk = navec['<unk>']
-
-INSTRUCTION = """
-Ты — редактор категорий для игры Connections на русском языке. Твоя цель — исправить названия и содержание категорий, если в них содержатся ошибки.
-Словами в категориях должны быть СУЩЕСТВИТЕЛЬНЫЕ РУССКОГО ЯЗЫКА, состоящие из ОДНОГО СЛОВА
-"""
+INSTRUCTION_TEMPLATE = 'editing_instruction.txt'
 
 
 def parse_initial(text):
@@ -64,74 +59,258 @@ def save_dicts_to_file(dicts, filename):
             f.write("\n")
 
 
-def edit_game(categories):
+def build_edit_prompt(categories):
     formatted = "\n".join([f"{i+1}. {cat}: {', '.join(words)}" for i, (cat, words) in enumerate(categories.items())])
-    user_prompt = f"""
-Вот четыре категории и относящиеся к ним слова:
-{formatted}
-
-Проверь, что все слова - СУЩЕСТВУЮЩИЕ слова русского языка, состоят из одного слова, не содержат грамматических ошибок и в полной мере относятся к категории. Если для какого-то слова это не так, исправь это слово. 
-Также, если это необходимо, исправь название категории — оно должно быть кратким, при этом чётко и полно описывая все слова в категории. 
-В ответе выдай все четыре категории, заменив старые названия категорий и соответствующих ей слова на новые, если это необходимо. 
-
-Не добавляй никаких пояснений и рассуждений.
-Ответ должен содержать ровно четыре строки, начинающиеся с цифр от 1 до 4.
-
-Формат ответа:
-1. КАТЕГОРИЯ1: СЛОВО1, СЛОВО2, СЛОВО3, СЛОВО4
-2. КАТЕГОРИЯ2: СЛОВО1, СЛОВО2, СЛОВО3, СЛОВО4
-3. КАТЕГОРИЯ3: СЛОВО1, СЛОВО2, СЛОВО3, СЛОВО4
-4. КАТЕГОРИЯ4: СЛОВО1, СЛОВО2, СЛОВО3, СЛОВО4
-"""
-    response = client.chat.completions.create(
+    user_prompt = load_template('editing.txt').render(formatted=formatted)
+    return user_prompt
+
+
+def edit_game(categories):
+    response = get_client().chat.completions.create(
         model="gpt-4.1",
         messages=[
-            {"role": "system", "content": INSTRUCTION},
-            {"role": "user", "content": user_prompt}
+            {"role": "system", "content": load_template(INSTRUCTION_TEMPLATE).text},
+            {"role": "user", "content": build_edit_prompt(categories)}
         ]
     )
     return response.choices[0].message.content
 
 
 def average_similarity(words):
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    navec = get_navec()
+    unk = navec[UNK_TOKEN]
     embeddings = [navec.get(word.lower(), unk).reshape(1, -1) for word in words]
     sims = [cosine_similarity(a, b)[0][0] for a, b in combinations(embeddings, 2)]
     return sum(sims) / len(sims)
 
 
+def rank_game(run, verbose=True):
+    """
+    Orders the categories of one game from easy to difficult and formats them as ranked lines.
+    """
+    scores = {}
+    for cat, words in run.items():
+        sim = average_similarity(words)
+        scores[cat] = sim
+        if verbose:
+            print(f"{cat}: Average similarity = {sim:.4f}")
+
+    sorted_cats = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    ranked = [(j + 1, name, run[name]) for j, (name, _) in enumerate(sorted_cats)]
+    formatted = [f"{rank}. {name.upper()}: {', '.join(words)}" for rank, name, words in ranked]
+    return "\n".join(formatted)
+
+
 def process_runs(runs):
     outputs = []
     for i, run in enumerate(runs, 1):
         print(f"\n--- Run {i} ---")
-        scores = {}
-        for cat, words in run.items():
-            sim = average_similarity(words)
-            scores[cat] = sim
-            print(f"{cat}: Average similarity = {sim:.4f}")
-
-        sorted_cats = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        ranked = [(j + 1, name, run[name]) for j, (name, _) in enumerate(sorted_cats)]
-        formatted = [f"{rank}. {name.upper()}: {', '.join(words)}" for rank, name, words in ranked]
-        outputs.append("\n".join(formatted))
+        outputs.append(rank_game(run))
     return outputs
 
 
-INPUT_FILE = "llm_io.txt"
-OUTPUT_FILE = "llm_io_edited&ranked.txt"
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_POLL_INTERVAL = 60
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def build_batch_requests(games):
+    """
+    One batch request per game; custom_id keeps the position of the game in the input file.
+    """
+    requests = []
+    for i, game in enumerate(games):
+        requests.append({
+            "custom_id": f"game-{i}",
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {
+                "model": "gpt-4.1",
+                "messages": [
+                    {"role": "system", "content": load_template(INSTRUCTION_TEMPLATE).text},
+                    {"role": "user", "content": build_edit_prompt(game)}
+                ]
+            }
+        })
+    return requests
+
+
+def write_batch_file(requests, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+
+
+class LocalBatchClient:
+    """
+    Local stand-in for the batch endpoint: runs the requests of a batch file through
+    chat completions one by one and writes the output file in the batch output format.
+    Without a client every game is returned unchanged, which is handy for dry runs.
+    """
+
+    def __init__(self, chat_client=None, work_dir="."):
+        self.chat_client = chat_client
+        self.work_dir = work_dir
+
+    def submit(self, batch_path):
+        # The output file path doubles as the batch id
+        output_path = os.path.join(self.work_dir, os.path.basename(batch_path).rsplit('.', 1)[0] + "_output.jsonl")
+        with open(batch_path, encoding='utf-8') as f_in, open(output_path, 'w', encoding='utf-8') as f_out:
+            for line in f_in:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                f_out.write(json.dumps(self._run_request(request), ensure_ascii=False) + "\n")
+        return output_path
+
+    def poll(self, batch_id):
+        return "completed", batch_id
+
+    def _run_request(self, request):
+        try:
+            if self.chat_client is None:
+                content = self._echo_game(request["body"]["messages"][-1]["content"])
+            else:
+                response = self.chat_client.chat.completions.create(**request["body"])
+                content = response.choices[0].message.content
+        except Exception as e:
+            return {"custom_id": request["custom_id"], "response": None, "error": {"message": str(e)}}
+        body = {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]}
+        return {"custom_id": request["custom_id"], "response": {"status_code": 200, "body": body}, "error": None}
+
+    @staticmethod
+    def _echo_game(prompt):
+        lines = [line.strip() for line in prompt.splitlines()]
+        return "\n".join(line for line in lines if re.match(r'^[1-4]\.\s.+?:\s', line))
+
+
+class OpenAIBatchClient:
+    """
+    Submits a batch file through the provider's batch endpoint.
+    """
+
+    def __init__(self, openai_client, completion_window="24h"):
+        self.client = openai_client
+        self.completion_window = completion_window
+
+    def submit(self, batch_path):
+        with open(batch_path, 'rb') as f:
+            batch_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window
+        )
+        return batch.id
+
+    def poll(self, batch_id):
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status != "completed":
+            return batch.status, None
+        output_path = f"{batch_id}_output.jsonl"
+        # A batch whose requests all failed has only an error file, in the same line format
+        file_id = batch.output_file_id or batch.error_file_id
+        if file_id is None:
+            raise RuntimeError(f"Batch {batch_id} completed without an output or error file")
+        content = self.client.files.content(file_id)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(content.text)
+        return batch.status, output_path
+
+
+def wait_for_batch(batch_client, batch_id, poll_interval=BATCH_POLL_INTERVAL):
+    while True:
+        status, output_path = batch_client.poll(batch_id)
+        print(f"Batch {batch_id}: {status}")
+        if status == "completed":
+            return output_path
+        if status in BATCH_FINAL_STATUSES:
+            raise RuntimeError(f"Batch {batch_id} finished with status '{status}'")
+        time.sleep(poll_interval)
+
+
+def join_batch_results(games, output_path):
+    """
+    Matches batch output lines back to games by custom_id. Games whose request failed
+    or whose answer could not be parsed into four categories are kept unedited.
+    """
+    edited = list(games)
+    with open(output_path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            index = int(result["custom_id"].split("-")[-1])
+            response = result.get("response")
+            if result.get("error") or not response or response.get("status_code") != 200:
+                print(f"Request {result['custom_id']} failed, keeping the original game")
+                continue
+            parsed_dict = parse_text_to_dict(response["body"]["choices"][0]["message"]["content"])
+            if len(parsed_dict) != 4:
+                print(f"Request {result['custom_id']} returned {len(parsed_dict)} categories, keeping the original game")
+                continue
+            edited[index] = parsed_dict
+    return edited
+
+
+def edit_games_batch(games, batch_path, batch_client, poll_interval=BATCH_POLL_INTERVAL):
+    write_batch_file(build_batch_requests(games), batch_path)
+    batch_id = batch_client.submit(batch_path)
+    print(f"Submitted {len(games)} edit requests as batch {batch_id}")
+    output_path = wait_for_batch(batch_client, batch_id, poll_interval)
+    return join_batch_results(games, output_path)
+
+
+def edit_games(games):
+    new_games = []
+    for game in games:
+        output = edit_game(game)
+        parsed_dict = parse_text_to_dict(output)
+        new_games.append(parsed_dict)
+    return new_games
+
+
+def main(input_file, output_file, batch_client=None, verify=True):
+    """
+    Edits the games of input_file and ranks them into output_file. With verify, only the games
+    game_verifier finds problems in are sent to the editor; the rest are kept as they are.
+    """
+    with open(input_file, encoding='utf-8') as f:
+        text = f.read()
+
+    games = parse_initial(text)
+    to_edit = list(range(len(games)))
+    if verify:
+        import game_verifier
+
+        to_edit, _ = game_verifier.route_games(games, get_navec() if navec_available() else None)
+    selected = [games[i] for i in to_edit]
+    if not selected:
+        edited = []
+    elif batch_client is None:
+        edited = edit_games(selected)
+    else:
+        edited = edit_games_batch(selected, input_file.split('.')[0] + "_batch.jsonl", batch_client)
+    new_games = list(games)
+    for i, game in zip(to_edit, edited):
+        new_games[i] = game
 
-with open(INPUT_FILE, encoding='utf-8') as f:
-    text = f.read()
+    save_dicts_to_file(new_games, input_file.split('.')[0]+"_edited.txt")
 
-games = parse_initial(text)
-new_games = []
+    processed = process_runs(new_games)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write("\n\n".join(processed))
 
-for game in games:
-    output = edit_game(game)
-    parsed_dict = parse_text_to_dict(output)
-    new_games.append(parsed_dict)
 
-save_dicts_to_file(new_games, INPUT_FILE.split('.')[0]+"_edited.txt")
+if __name__ == "__main__":
+    INPUT_FILE = "llm_io.txt"
+    OUTPUT_FILE = "llm_io_edited&ranked.txt"
+    # None - one request per game, OpenAIBatchClient(get_client()) - batch endpoint,
+    # LocalBatchClient(get_client()) - local stand-in
+    BATCH_CLIENT = None
+    # False - send every game to the editor, not only the ones the local checks find problems in
+    VERIFY = True
 
-processed = process_runs(new_games)
-with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-    f.write("\n\n".join(processed))
+    main(INPUT_FILE, OUTPUT_FILE, BATCH_CLIENT, VERIFY)
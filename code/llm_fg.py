@@ -1,74 +1,18 @@
-from openai import OpenAI
 import random
-import pandas as pd
-from navec import Navec
-from sklearn.metrics.pairwise import cosine_similarity
 from itertools import combinations
+from prompt_templates import load_template
+from resources import get_client, get_navec, load_word_bank
+from lexicon import get_lexicon, select_valid_words
+from dataset_salvage import CATEGORY_SIZE, close_incomplete_run
+from llm_streaming import StreamedCompletion, FALSE_GROUP_BLOCK_FIELDS, run_steps_speculatively
 
-MY_KEY = "API_KEY"
-client = OpenAI(api_key=MY_KEY)
-
-# upload from https://github.com/natasha/navec
-navec = Navec.load('navec_hudlit_v1_12B_500K_300d_100q.tar')
-unk = navec['<pad>']
-
-INSTRUCTION = """
-Представь, что три эксперта создают головоломку Connections на русском языке.
-Каждый эксперт записывает своё размышление и делится им с остальными. Затем все эксперты переходят к следующему шагу и так далее.
-Если кто-то из экспертов осознаёт, что его ответ не удовлетворяет заданным требованиям, он от него отказывается. Таким образом эксперты приходят к единому мнению.
-
-Задача экспертов - создать четыре группы по четыре слова с чётко выраженной категоризацией. 
-Категории должны быть разнообразными, уникальными и хорошо определёнными.
-
-1. Категории в одной игре должны принадлежать к разным типам из списка:
-   a) Значение слова - конкретные, чётко определённые группы предметов или ПОНЯТИЙ ОДНОГО РОДА; они могут быть основаны на базовой семантике или на "энциклопедических" знаниях
-    - ПОРОДЫ СОБАК: МОПС, ХАСКИ, ПУДЕЛЬ, ТАКСА
-    - СИНОНИМЫ СЛОВА «ДОМ»: ХАТА, ЖИЛИЩЕ, ЛАЧУГА, ГНЕЗДО
-    - ВЕЩИ КРАСНОГО ЦВЕТА: КЛУБНИКА, МАРС, КРОВЬ, ЧИЛИ
-    - ФИЛЬМЫ ТАРКОВСКОГО: СТАЛКЕР, ЗЕРКАЛО, НОСТАЛЬГИЯ, ЖЕРТВОПРИНОШЕНИЕ
-    Также слова могут быть связаны более абстрактной ассоциацией, но слова не должны быть слишком разнородными.
-   b) Форма слова - слова, встречающиеся в устойчивых сочетаниях с одним общим словом, или имеющие общие структурные особенности
-    - ФРАНЦУЗСКИЙ ___: ПОЦЕЛУЙ, БУЛЬДОГ, МАНИКЮР, ЖИМ
-    - ЧЁРНЫЙ ___: ПЯТНИЦА, РЫНОК, СПИСОК, ИКРА
-    - АНАГРАММЫ: СЕКТА, СЕТКА, ТЕСАК, АСКЕТ
-    - СЛОВА С ОДИНАКОВЫМИ ГЛАСНЫМИ: ПОМОР, КАТАМАРАН, БУРУНДУК, ПЕРЕПЕЛ
-   c) Сочетание значения и формы слова
-    - СЛОВА, НАЧИНАЮЩИЕСЯ НА ЧИСЛИТЕЛЬНОЕ: ОДИНОЧКА, ДВАРФ, ТРИТОН, СЕМЬЯ
-
-2. Словами в категориях должны быть СУЩЕСТВИТЕЛЬНЫЕ РУССКОГО ЯЗЫКА, состоящие из ОДНОГО СЛОВА
-
-3. Каждая категория не должна быть слишком общей и должна иметь КОНКРЕТНОЕ название (не "ЖИВОТНЫЕ", а "ДОМАШНИЕ ЖИВОТНЫЕ" или "ХИЩНЫЕ ЖИВОТНЫЕ")
-
-4. Категории должны быть НЕЗАВИСИМЫМИ друг от друга - игрок должен иметь возможность решить головоломку единственным верным образом.
-Не должно быть ситуации, когда два слова, относящиеся к разным категориям, можно поменять между собой, и связь останется верной
-
-5. Слова в категории НЕ ДОЛЖНЫ БЫТЬ СЛИШКОМ ПОХОЖИ друг на друга (например, однокоренные) - тогда играть будет неинтересно
-
-ИЗБЕГАЙ:
-- Повторяющихся слов внутри категорий и между категориями (ВСЕ 16 СЛОВ ДОЛЖНЫ БЫТЬ УНИКАЛЬНЫ)
-- Слишком общих категорий (например, "ЕДА", "ЦВЕТА", "ЖИВОТНЫЕ")
-- Негомогенных слов, относящихся к одной категории (например, "ОБЕЗЬЯНА", "БОНОБО" и "МЛЕКОПИТАЮЩЕЕ" в категории "ЖИВОТНЫЕ")
-- Категорий с нечёткими границами
-- Объяснений в скобках
-
-ПРИМЕРЫ ПЛОХИХ КАТЕГОРИЙ:
-- МУЗЫКАЛЬНЫЙ ФЕСТИВАЛЬ: СЦЕНА, ПУБЛИКА, БИЛЕТ, АРТИСТ
-Это плохая категория, потому что относящиеся к ней слова слишком разнородные.
-- ПРОФЕССИИ: ОХРАННИК, ПОВАР, ВОДИТЕЛЬ, ВРАЧ
-Это плохая категория, потому что она слишком общая.
-- СЛОВА, ЗАКАНЧИВАЮЩИЕСЯ НА "Ы": ОГНИ, МОСТЫ, ВЕРШИНЫ, САДЫ
-Это плохая категория, потому что не все относящиеся к ней слова ей соответствуют ("ОГНИ" не заканчивается на Ы)
-- ЭЛЕМЕНТЫ ГРАФА: ВЕРШИНА, РЁБРО, ГАММИЛЬТОНИАН, КОМПОНЕНТА
-Это плохая группа, потому что она содержит несуществующие в русском языке слова: РЁБРО (правильно "РЕБРО") и ГАММИЛЬТОНИАН
-- ГЕРОИ РУССКИХ НАРОДНЫХ СКАЗОК: СОЛОВЕЙРАЗБОЙНИК, ИВАНЦАРЕВИЧ, БАБАЯГА, ВАСИЛИСАПРЕКРАСНАЯ
-Это плохая категория, потому что она тоже содержит несуществующие слова. Слова "ИВАНЦАРЕВИЧ" не существует, имя героя пишется раздельно в два слова
-
-ПРИ СОЗДАНИИ КАТЕГОРИИ НУЖНО ПРОВЕРИТЬ, ЧТО ОНА:
-1. Имеет чёткое, однозначное название
-2. Содержит 4 слова, каждое из которых точно соответствует категории и является существительным из одного слова
-3. Название и слова записаны в верхнем регистре
-4. Дополнительно: категория отличается по типу от предыдущих категорий 
-"""
+# navec token used for out-of-vocabulary words
+UNK_TOKEN = '<pad>'
+
+# In streaming mode, close the stream as soon as the answer block is complete
+STREAM_STOP_ON_BLOCK = False
+
+INSTRUCTION_TEMPLATE = 'instruction_fg.txt'
 
 
 # def append_to_csv(step, category, words, path):
@@ -90,6 +34,10 @@ def append_to_txt(run_number, step, category, words, path):
 
 
 def average_similarity(words):
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    navec = get_navec()
+    unk = navec[UNK_TOKEN]
     embeddings = [navec.get(word.lower(), unk).reshape(1, -1) for word in words]
     sims = [cosine_similarity(a, b)[0][0] for a, b in combinations(embeddings, 2)]
     return sum(sims) / len(sims)
@@ -99,6 +47,8 @@ def pick_closest(words, num):
     best_group = None
     best_score = -1
     words = list(set(words))
+    if len(words) < num:
+        raise ValueError(f"Only {len(words)} valid words, {num} needed: {words}")
     for combo in combinations(words, num):
         score = average_similarity(combo)
         if score > best_score:
@@ -107,68 +57,85 @@ def pick_closest(words, num):
     return list(best_group)
 
 
-def gen_initial_group(random_words):
-    user_prompt1 = f"""
-Пожалуйста создай категорию для головоломки Connections. Сперва напиши короткую историю НА РУССКОМ, опираясь на перевод этих слов: {', '.join(random_words)}.
-Затем, используя историю как вдохновение, придумай какую-то тематическую категорию и 8 разных слов, которые подходят под неё.
+def gen_more_words(category, valid_words, rejected_words, count):
+    """
+    Targeted re-request for a category with too few valid candidates:
+    only replacements are asked for, not the whole category.
+    """
+    rejected = ', '.join(word for word, _ in rejected_words)
+    user_prompt = load_template('more_words.txt').render(
+        category=category, valid_words=valid_words, rejected=rejected, num_words=2 * count
+    )
+    response = get_client().chat.completions.create(
+        model="gpt-4.1",
+        messages=[
+            {"role": "system", "content": load_template(INSTRUCTION_TEMPLATE).text},
+            {"role": "user", "content": user_prompt}
+        ]
+    )
+    text = response.choices[0].message.content
+    words_line = next((line for line in text.splitlines() if "Слова:" in line), "")
+    return [w.strip() for w in words_line.split("Слова:")[-1].split(",") if w.strip()]
 
-До того, как вынести финальный вердикт рассуждения почему та или иная группа лучше.
-Твой финальный ответ должен СТРОГО соответствовать формату ниже (без дополнительных строк, разделителей и выделений)!
 
-Формат ответа:
-Категория: НАЗВАНИЕ
-Слова: СЛОВО1, СЛОВО2, СЛОВО3, СЛОВО4, СЛОВО5, СЛОВО6, СЛОВО7, СЛОВО8
+def validate_words(category, words, need, rerequest: bool = True):
+    """
+    Drops multi-word, malformed and out-of-vocabulary candidates before selection.
+    Words without an embedding are rejected too, since they would get the placeholder vector in ranking.
     """
-    response = client.chat.completions.create(
+    return select_valid_words(
+        words, need, get_lexicon(),
+        rerequest=(lambda valid, rejected, missing: gen_more_words(category, valid, rejected, missing))
+        if rerequest else None,
+        require_embedding=True
+    )
+
+
+def gen_initial_group(random_words):
+    user_prompt1 = load_template('initial.txt').render(random_words=random_words)
+    response = get_client().chat.completions.create(
         model="gpt-4.1",
         temperature=0.8,
         messages=[
-            {"role": "system", "content": INSTRUCTION},
+            {"role": "system", "content": load_template(INSTRUCTION_TEMPLATE).text},
             {"role": "user", "content": user_prompt1}
         ]
     )
     return response.choices[0].message.content
 
 
-def gen_false_group(root_word, root_category, game):
+def build_false_group_prompt(root_word, root_category, game):
     used_words = [word for words_list in game.values() for word in words_list]
-    used_categories = [word for words_list in game.keys() for word in words_list]
-
-    user_prompt2 = f"""
-Я создаю головоломку Connections с намеренным пересечением слов внутри категорий.
-
-Я уже использовал слово {root_word} в категории {root_category}
+    used_categories = list(game.keys())
 
-Для этого слова предложи одну или несколько альтернативных категорий. В приоритете использовать полисемичность и омонимию используемых слов. 
-Новые категории должны относится использовать ДРУГОЕ значение или особенность формы слова, отличное от категории, в которой оно уже было использовано.
-Желательно также использовать разные ТИПЫ категорий (значение слова, форма слова, сочетание формы и значения).
+    user_prompt2 = load_template('fg.txt').render(
+        root_word=root_word, root_category=root_category, used_words=used_words, used_categories=used_categories
+    )
+    return user_prompt2
 
-Теперь выбери ОДНУ из этих альтернативных категорий, связь между которой и относящимся к ней словом кажется наиболее перспективной.
-Хорошо, если новое значение слова в категории отличается от значения, уже описанного в других категориях. В приоритете использовать многозначность слов
-Создай категорию с таким названием и аналогично сгенерируй 8 слов, которые подходят под эту категорию
 
-ВАЖНО:
-1. Все слова в новой категории должны быть ОДНОГО УРОВНЯ КЛАССИФИКАЦИИ между собой и с исходным словом из предыдущей категории
-2. НЕ используй слова из предыдущих категорий: {', '.join(used_words)}
-3. Новая категория должна быть уникальной и не повторять уже использованные: {', '.join(used_categories)} — важно, чтобы два слова из разных категорий нельзя было беспрепятственно поменять между ними
-4. Помни, что категории должны быть четко различимыми, чтобы каждая головоломка имела только одно возможное корректное решение
+def gen_false_group(root_word, root_category, game):
+    response = get_client().chat.completions.create(
+        model="gpt-4.1",
+        messages=[
+            {"role": "system", "content": load_template(INSTRUCTION_TEMPLATE).text},
+            {"role": "user", "content": build_false_group_prompt(root_word, root_category, game)}
+        ]
+    )
+    return response.choices[0].message.content
 
-До того, как вынести финальный вердикт рассуждения почему та или иная группа лучше.
-Твой финальный ответ должен СТРОГО соответствовать формату ниже (без дополнительных строк, разделителей и выделений)!
 
-Формат ответа:
-Выбранное слово: СЛОВО
-Категория: НАЗВАНИЕ
-Слова: СЛОВО1, СЛОВО2, СЛОВО3, СЛОВО4, СЛОВО5, СЛОВО6, СЛОВО7, СЛОВО8
-    """
-    response = client.chat.completions.create(
+def gen_false_group_stream(root_word, root_category, game):
+    return StreamedCompletion(
+        get_client(),
+        FALSE_GROUP_BLOCK_FIELDS,
+        stop_on_block=STREAM_STOP_ON_BLOCK,
         model="gpt-4.1",
         messages=[
-            {"role": "system", "content": INSTRUCTION},
-            {"role": "user", "content": user_prompt2}
+            {"role": "system", "content": load_template(INSTRUCTION_TEMPLATE).text},
+            {"role": "user", "content": build_false_group_prompt(root_word, root_category, game)}
         ]
     )
-    return response.choices[0].message.content
 
 
 def parse_response(text):
@@ -190,46 +157,116 @@ def parse_response(text):
     return category, words
 
 
-def false_group_pipeline(word_bank, num_games: int, output_filename: str):
-    for cycle in range(num_games):
-        print(f"\nGame generation {cycle + 1}...")
-
-        run_number = cycle + 1
+def false_group_steps_streaming(root_category, root_core_group, game, used_words, on_category):
+    """
+    False group steps over streamed completions: each step hands its answer block to the next
+    one as soon as the block is parsed, without waiting for the end of the stream.
+    """
+    def start_stream(step, provisional):
+        _, core_word = step
+        if provisional is None:
+            return gen_false_group_stream(core_word, root_category, game)
+        new_category, new_core_group = provisional
+        return gen_false_group_stream(core_word, root_category, {**game, new_category: new_core_group})
+
+    def apply_block(step, block, speculative):
+        _, core_word = step
+        new_category, new_words = block
+        new_words = [word for word in new_words if word not in used_words and word != core_word]
+        # No re-request for a speculative block: the stream may still end with another one
+        new_words = [word for word in validate_words(new_category, new_words, 3, rerequest=not speculative)
+                     if word not in used_words and word != core_word]
+        new_core_group = pick_closest(new_words, 3)
+        new_core_group.append(core_word)
+        return new_category, new_core_group
+
+    def commit_step(step, result):
+        step_index, _ = step
+        new_category, new_core_group = result
+        used_words.update(new_core_group)
+
+        print(f"Category {step_index+1}: {new_category} — {new_core_group}")
+        on_category(step_index+1, new_category, new_core_group)
+        game[new_category] = new_core_group
+
+    def on_error(step, e):
+        # Like the non-streaming path: the game is incomplete, so no more requests for it
+        print(f"Error on step {step[0]+1}: {e}")
+        return False
+
+    steps = list(enumerate(root_core_group))
+    run_steps_speculatively(steps, start_stream, apply_block, commit_step, on_error)
+
+
+def generate_game(word_bank, on_category=None, stream: bool = False):
+    """
+    Generates one game and returns its four false group categories as {category: words}.
+    on_category(step, category, words) is called for the root category
+    (step 'КОРНЕВАЯ КАТЕГОРИЯ') and for every accepted category.
+    Returns an empty dict if the root category could not be generated.
+    """
+    if on_category is None:
+        on_category = lambda step, category, words: None
+    game = {}
+
+    try:
+        random_words = random.sample(word_bank, 4)
+        root_category_raw = gen_initial_group(random_words)
+        root_category, root_words = parse_response(root_category_raw)
+        root_core_group = pick_closest(validate_words(root_category, root_words, 4), 4)
+    except Exception as e:
+        print(f"Error with generating initial category: {e}")
+        return game
+
+    print(f"Root category: {root_category} — {root_core_group}")
+    on_category('КОРНЕВАЯ КАТЕГОРИЯ', root_category, root_core_group)
+
+    used_words = set()
+    if stream:
+        false_group_steps_streaming(root_category, root_core_group, game, used_words, on_category)
+        return game
+
+    for step, core_word in enumerate(root_core_group):
         try:
-            random_words = random.sample(word_bank, 4)
-            root_category_raw = gen_initial_group(random_words)
-            root_category, root_words = parse_response(root_category_raw)
-            root_core_group = pick_closest(root_words, 4)
-        except Exception as e:
-            print(f"Error with generating initial category: {e}")
-            continue
-
-        print(f"Root category: {root_category} — {root_core_group}")
-        append_to_txt(run_number, 'КОРНЕВАЯ КАТЕГОРИЯ', root_category, root_core_group)
-
-        game = {}
-        used_words = set()
-        for step, core_word in enumerate(root_core_group):
             false_group_raw = gen_false_group(core_word, root_category, game)
             new_category, new_words = parse_response(false_group_raw)
 
             new_words = [word for word in new_words if word not in used_words and word != core_word]
+            new_words = [word for word in validate_words(new_category, new_words, 3)
+                         if word not in used_words and word != core_word]
             new_core_group = pick_closest(new_words, 3)
-            new_core_group.append(core_word)
-            used_words.update(new_core_group)
+        except Exception as e:
+            print(f"Error on step {step+1}: {e}")
+            return game
+        new_core_group.append(core_word)
+        used_words.update(new_core_group)
+
+        print(f"Category {step+1}: {new_category} — {new_core_group}")
+        on_category(step+1, new_category, new_core_group)
+        game[new_category] = new_core_group
+
+    return game
+
+
+def false_group_pipeline(word_bank, num_games: int, output_filename: str, stream: bool = False):
+    for cycle in range(num_games):
+        print(f"\nGame generation {cycle + 1}...")
+        run_number = cycle + 1
+
+        written = []
+
+        def write_category(step, category, words):
+            append_to_txt(run_number, step, category, words, output_filename)
+            written.append(step)
 
-            print(f"Category {step+1}: {new_category} — {new_core_group}")
-            append_to_txt(run_number, step+1, new_category, new_core_group, output_filename)
-            game[new_category] = new_core_group
+        generate_game(word_bank, write_category, stream)
+        # The root category line comes before the 4 false groups
+        close_incomplete_run(len(written), output_filename, CATEGORY_SIZE + 1)
 
 
 if __name__ == "__main__":
     NUMBER_OF_RUNS = 5
     OUTPUT_FILE = "llm_fg.txt"
 
-    df = pd.read_csv("nyt_connections.csv")
-    word_list = []
-    for words in df['words']:
-        word_list.extend([w.strip().lower() for w in words.split(",")])
-    word_list = list(set(word_list))
+    word_list = load_word_bank()
     false_group_pipeline(word_list, NUMBER_OF_RUNS, OUTPUT_FILE)
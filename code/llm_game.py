@@ -0,0 +1,247 @@
+import random
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+from prompt_templates import load_template
+from resources import get_client, get_navec, load_word_bank
+from lexicon import get_lexicon, check_word, normalize_word
+
+CATEGORY_SIZE = 4
+# Candidate games per request (the API's n parameter)
+DEFAULT_CANDIDATES = 4
+
+INSTRUCTION_TEMPLATE = 'instruction.txt'
+GAME_TEMPLATE = 'game_io.txt'
+
+OVERLAP_RE = re.compile(r"([^,()]+?)\s*\((\d)\s*->\s*(\d)\)")
+
+
+class UsageMeter:
+    """
+    Client wrapper counting requests and the tokens reported by the API, to compare modes.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def chat(self):
+        return self
+
+    @property
+    def completions(self):
+        return self
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def create(self, **kwargs):
+        response = self.client.chat.completions.create(**kwargs)
+        self.calls += 1
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.completion_tokens += usage.completion_tokens or 0
+        return response
+
+
+def gen_whole_games(random_words, n: int = DEFAULT_CANDIDATES, client=None) -> List[str]:
+    """
+    One request for a complete game; n candidate answers.
+    """
+    response = (client or get_client()).chat.completions.create(
+        model="gpt-4.1",
+        temperature=0.9,
+        n=n,
+        messages=[
+            {"role": "system", "content": load_template(INSTRUCTION_TEMPLATE).text},
+            {"role": "user", "content": load_template(GAME_TEMPLATE).render(random_words=random_words)}
+        ]
+    )
+    return [choice.message.content or "" for choice in response.choices]
+
+
+def parse_game_response(text) -> Tuple[Dict[str, List[str]], List[Tuple[str, int, int]]]:
+    """
+    {category: words} and the declared overlaps (word, its category number, the category number
+    it also fits). The last line of each kind wins, since the model may print drafts first.
+    """
+    categories = {}
+    words = {}
+    overlaps_line = None
+    for line in text.strip().split("\n"):
+        line = line.strip()
+        match = re.match(r"Категория (\d):(.*)", line)
+        if match:
+            categories[int(match.group(1))] = match.group(2).strip()
+            continue
+        match = re.match(r"Слова (\d):(.*)", line)
+        if match:
+            words[int(match.group(1))] = [w.strip() for w in match.group(2).split(",") if w.strip()]
+            continue
+        if line.startswith("Пересечения:"):
+            overlaps_line = line.split("Пересечения:")[-1]
+
+    if sorted(categories) != list(range(1, CATEGORY_SIZE + 1)) or sorted(words) != sorted(categories):
+        raise ValueError(f"Response does not contain needed lines. Received:\n{text}")
+    game = {categories[i]: words[i] for i in sorted(categories)}
+    overlaps = [(word.strip(), int(source), int(target))
+                for word, source, target in OVERLAP_RE.findall(overlaps_line or "")]
+    return game, overlaps
+
+
+def validate_game(game: Dict[str, List[str]], overlaps: Optional[List[Tuple[str, int, int]]] = None,
+                  lexicon=None) -> Optional[str]:
+    """
+    Returns the reason a game is rejected, or None: 4 distinct categories of 4 distinct valid
+    words, and, if overlaps are given, at least one declared overlap that is consistent.
+    """
+    if len(game) != CATEGORY_SIZE or len({normalize_word(c) for c in game}) != CATEGORY_SIZE:
+        return 'categories'
+    if any(len(words) != CATEGORY_SIZE for words in game.values()):
+        return 'group size'
+    all_words = [normalize_word(w) for words in game.values() for w in words]
+    if len(set(all_words)) != len(all_words):
+        return 'repeated word'
+    if lexicon is not None:
+        for words in game.values():
+            for word in words:
+                reason = check_word(word, lexicon, require_embedding=True)
+                if reason:
+                    return f"{word}: {reason}"
+    if overlaps is not None:
+        groups = [[normalize_word(w) for w in words] for words in game.values()]
+        if not overlaps:
+            return 'no overlaps'
+        for word, source, target in overlaps:
+            if not (1 <= source <= CATEGORY_SIZE and 1 <= target <= CATEGORY_SIZE) or source == target:
+                return f"overlap {word}: bad category numbers"
+            if normalize_word(word) not in groups[source - 1]:
+                return f"overlap {word}: not in category {source}"
+    return None
+
+
+def select_best(candidates: List[Tuple[Dict[str, List[str]], List]], target=None) -> Optional[int]:
+    """
+    Index of the candidate game closest to the difficulty target, scored in one vectorized pass.
+    """
+    import difficulty
+
+    if not candidates:
+        return None
+    puzzles = [[{"name": name, "words": words} for name, words in game.items()] for game, _ in candidates]
+    scores = difficulty.score_puzzles(puzzles, get_navec())
+    return int(difficulty.distances(scores, target or difficulty.DifficultyTarget()).argmin())
+
+
+def generate_game(word_bank, n: int = DEFAULT_CANDIDATES, client=None, rejections: Optional[List[str]] = None
+                  ) -> Optional[Tuple[Dict[str, List[str]], List[Tuple[str, int, int]]]]:
+    """
+    One request, n candidate games: the valid ones are ranked by the difficulty scorer and the
+    best is returned as ({category: words}, overlaps), or None if no candidate is valid.
+    If rejections is given, the reason of every rejected candidate is appended to it.
+    """
+    lexicon = get_lexicon()
+    valid = []
+    for text in gen_whole_games(random.sample(word_bank, 4), n, client):
+        try:
+            game, overlaps = parse_game_response(text)
+        except ValueError:
+            reason = 'format'
+        else:
+            reason = validate_game(game, overlaps, lexicon)
+            if reason is None:
+                valid.append((game, overlaps))
+                continue
+        if rejections is not None:
+            rejections.append(reason)
+    best = select_best(valid)
+    return None if best is None else valid[best]
+
+
+def append_game_to_txt(run_number, game, overlaps, path):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(f"\n--- Run {run_number} ---\n")
+        for step, (category, words) in enumerate(game.items(), 1):
+            f.write(f"{step}. {category.upper()}: {', '.join(words).upper()}\n")
+        f.write("Пересечения: " + ", ".join(f"{w.upper()} ({s} -> {t})" for w, s, t in overlaps) + "\n")
+        f.write("\n-------------------------------------\n")
+
+
+def intentional_overlap_pipeline(word_bank, num_games: int, output_filename: str, n: int = DEFAULT_CANDIDATES):
+    accepted = 0
+    for cycle in range(num_games):
+        print(f"\nGame generation {cycle + 1}...")
+        rejections = []
+        try:
+            result = generate_game(word_bank, n, rejections=rejections)
+        except Exception as e:
+            print(f"Error with generating the game: {e}")
+            continue
+        if rejections:
+            print(f"Rejected candidates: {', '.join(rejections)}")
+        if result is None:
+            continue
+        game, overlaps = result
+        for category, words in game.items():
+            print(f"{category} — {words}")
+        append_game_to_txt(cycle + 1, game, overlaps, output_filename)
+        accepted += 1
+
+    print(f"\nAccepted games: {accepted}/{num_games}. Results saved to '{output_filename}'")
+
+
+def compare_modes(word_bank, num_games: int, n: int = DEFAULT_CANDIDATES) -> Dict[str, Dict[str, float]]:
+    """
+    Runs the step-wise llm_io pipeline and the single-call mode for num_games games each and
+    reports latency per game, requests and tokens per accepted game and the acceptance rate.
+    """
+    import llm_io
+
+    results = {}
+    lexicon = get_lexicon()
+    step_meter = UsageMeter(get_client())
+    original_get_client = llm_io.get_client
+    llm_io.get_client = lambda: step_meter
+    try:
+        accepted, started = 0, time.perf_counter()
+        for _ in range(num_games):
+            game = llm_io.generate_game(word_bank)
+            accepted += validate_game(game, None, lexicon) is None
+        results['step-wise'] = _mode_summary(num_games, accepted, time.perf_counter() - started, step_meter)
+    finally:
+        llm_io.get_client = original_get_client
+
+    game_meter = UsageMeter(get_client())
+    accepted, started = 0, time.perf_counter()
+    for _ in range(num_games):
+        try:
+            accepted += generate_game(word_bank, n, game_meter) is not None
+        except Exception as e:
+            print(f"Error with generating the game: {e}")
+    results['single-call'] = _mode_summary(num_games, accepted, time.perf_counter() - started, game_meter)
+
+    for mode, summary in results.items():
+        print(f"{mode}: " + ", ".join(f"{key} {value}" for key, value in summary.items()))
+    return results
+
+
+def _mode_summary(games: int, accepted: int, seconds: float, meter: UsageMeter) -> Dict[str, float]:
+    return {
+        "acceptance_rate": round(accepted / games, 3) if games else 0.0,
+        "seconds_per_game": round(seconds / games, 3) if games else 0.0,
+        "requests_per_game": round(meter.calls / games, 2) if games else 0.0,
+        "tokens_per_accepted_game": round(meter.total_tokens / accepted) if accepted else None,
+    }
+
+
+if __name__ == "__main__":
+    NUMBER_OF_RUNS = 5
+    OUTPUT_FILE = "llm_game_io.txt"
+
+    word_list = load_word_bank()
+    intentional_overlap_pipeline(word_list, NUMBER_OF_RUNS, OUTPUT_FILE)
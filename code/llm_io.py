@@ -1,72 +1,19 @@
-from openai import OpenAI
 import random
-import pandas as pd
-from navec import Navec
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import List, Optional
 from itertools import combinations
+from prompt_templates import load_template
+from resources import get_client, get_navec, load_word_bank
+from lexicon import get_lexicon, select_valid_words
+from llm_streaming import StreamedCompletion, OVERLAP_BLOCK_FIELDS, run_steps_speculatively
+from dataset_salvage import LLM_RETRY_BUDGET, salvage_step, close_incomplete_run, summarize_steps
 
-MY_KEY = "API_KEY"
-client = OpenAI(api_key=MY_KEY)
-
-# upload from https://github.com/natasha/navec
-navec = Navec.load('navec_hudlit_v1_12B_500K_300d_100q.tar')
-unk = navec['<pad>']
-
-INSTRUCTION = """
-Представь, что три эксперта создают головоломку Connections на русском языке.
-Каждый эксперт записывает своё размышление и делится им с остальными. Затем все эксперты переходят к следующему шагу и так далее.
-Если кто-то из экспертов осознаёт, что его ответ не удовлетворяет заданным требованиям, он от него отказывается. Таким образом эксперты приходят к единому мнению.
-
-Задача экспертов - создать четыре группы по четыре слова с чётко выраженной категоризацией. 
-Категории должны быть разнообразными, уникальными и хорошо определёнными.
-
-1. Категории в одной игре должны принадлежать к разным типам из списка:
-   a) Значение слова - конкретные, чётко определённые группы предметов или ПОНЯТИЙ ОДНОГО РОДА; они могут быть основаны на базовой семантике или на "энциклопедических" знаниях
-    - ПОРОДЫ СОБАК: МОПС, ХАСКИ, ПУДЕЛЬ, ТАКСА
-    - СИНОНИМЫ СЛОВА «ДОМ»: ХАТА, ЖИЛИЩЕ, ЛАЧУГА, ГНЕЗДО
-    - ВЕЩИ КРАСНОГО ЦВЕТА: КЛУБНИКА, МАРС, КРОВЬ, ЧИЛИ
-    - ФИЛЬМЫ ТАРКОВСКОГО: СТАЛКЕР, ЗЕРКАЛО, НОСТАЛЬГИЯ, ЖЕРТВОПРИНОШЕНИЕ
-    Также слова могут быть связаны более абстрактной ассоциацией, но слова не должны быть слишком разнородными.
-   b) Форма слова - слова, встречающиеся в устойчивых сочетаниях с одним общим словом, или имеющие общие структурные особенности
-    - ФРАНЦУЗСКИЙ ___: ПОЦЕЛУЙ, БУЛЬДОГ, МАНИКЮР, ЖИМ
-    - ЧЁРНЫЙ ___: ПЯТНИЦА, РЫНОК, СПИСОК, ИКРА
-    - АНАГРАММЫ: СЕКТА, СЕТКА, ТЕСАК, АСКЕТ
-    - СЛОВА С ОДИНАКОВЫМИ ГЛАСНЫМИ: ПОМОР, КАТАМАРАН, БУРУНДУК, ПЕРЕПЕЛ
-   c) Сочетание значения и формы слова
-    - СЛОВА, НАЧИНАЮЩИЕСЯ НА ЧИСЛИТЕЛЬНОЕ: ОДИНОЧКА, ДВАРФ, ТРИТОН, СЕМЬЯ
-
-2. Словами в категориях должны быть СУЩЕСТВИТЕЛЬНЫЕ РУССКОГО ЯЗЫКА, состоящие из ОДНОГО СЛОВА
-
-3. Каждая категория не должна быть слишком общей и должна иметь КОНКРЕТНОЕ название (не "ЖИВОТНЫЕ", а "ДОМАШНИЕ ЖИВОТНЫЕ" или "ХИЩНЫЕ ЖИВОТНЫЕ")
-
-4. Категории должны быть НЕЗАВИСИМЫМИ друг от друга - игрок должен иметь возможность решить головоломку единственным верным образом.
-Не должно быть ситуации, когда два слова, относящиеся к разным категориям, можно поменять между собой, и связь останется верной.
-
-ИЗБЕГАЙ:
-- Повторяющихся слов внутри категорий и между категориями (ВСЕ 16 СЛОВ ДОЛЖНЫ БЫТЬ УНИКАЛЬНЫ)
-- Слишком общих категорий (например, "ЕДА", "ЦВЕТА", "ЖИВОТНЫЕ")
-- Негомогенных слов, относящихся к одной категории (например, "ОБЕЗЬЯНА", "БОНОБО" и "МЛЕКОПИТАЮЩЕЕ" в категории "ЖИВОТНЫЕ")
-- Категорий с нечёткими границами
-- Объяснений в скобках
-
-ПРИМЕРЫ ПЛОХИХ КАТЕГОРИЙ:
-- МУЗЫКАЛЬНЫЙ ФЕСТИВАЛЬ: СЦЕНА, ПУБЛИКА, БИЛЕТ, АРТИСТ
-Это плохая категория, потому что относящиеся к ней слова слишком разнородные.
-- ПРОФЕССИИ: ОХРАННИК, ПОВАР, ВОДИТЕЛЬ, ВРАЧ
-Это плохая категория, потому что она слишком общая.
-- СЛОВА, ЗАКАНЧИВАЮЩИЕСЯ НА "Ы": ОГНИ, МОСТЫ, ВЕРШИНЫ, САДЫ
-Это плохая категория, потому что не все относящиеся к ней слова ей соответствуют ("ОГНИ" не заканчивается на Ы)
-- ЭЛЕМЕНТЫ ГРАФА: ВЕРШИНА, РЁБРО, ГАММИЛЬТОНИАН, КОМПОНЕНТА
-Это плохая группа, потому что она содержит несуществующие в русском языке слова: РЁБРО (правильно "РЕБРО") и ГАММИЛЬТОНИАН
-- ГЕРОИ РУССКИХ НАРОДНЫХ СКАЗОК: СОЛОВЕЙРАЗБОЙНИК, ИВАНЦАРЕВИЧ, БАБАЯГА, ВАСИЛИСАПРЕКРАСНАЯ
-Это плохая категория, потому что она тоже содержит несуществующие слова. Слова "ИВАНЦАРЕВИЧ" не существует, имя героя пишется раздельно в два слова
-
-ПРИ СОЗДАНИИ КАТЕГОРИИ НУЖНО ПРОВЕРИТЬ, ЧТО ОНА:
-1. Имеет чёткое, однозначное название
-2. Содержит 4 слова, каждое из которых точно соответствует категории
-3. Название и слова записаны в верхнем регистре
-4. Дополнительно: категория отличается по типу от предыдущих категорий 
-"""
+# navec token used for out-of-vocabulary words
+UNK_TOKEN = '<pad>'
+
+# In streaming mode, close the stream as soon as the answer block is complete
+STREAM_STOP_ON_BLOCK = False
+
+INSTRUCTION_TEMPLATE = 'instruction.txt'
 
 
 # def append_to_csv(step, category, words, path):
@@ -88,6 +35,10 @@ def append_to_txt(run_number, step, category, words, path):
 
 
 def average_similarity(words):
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    navec = get_navec()
+    unk = navec[UNK_TOKEN]
     embeddings = [navec.get(word.lower(), unk).reshape(1, -1) for word in words]
     sims = [cosine_similarity(a, b)[0][0] for a, b in combinations(embeddings, 2)]
     return sum(sims) / len(sims)
@@ -97,6 +48,8 @@ def pick_closest_four(words):
     best_group = None
     best_score = -1
     words = list(set(words))
+    if len(words) < 4:
+        raise ValueError(f"Only {len(words)} valid words, 4 needed: {words}")
     for combo in combinations(words, 4):
         score = average_similarity(combo)
         if score > best_score:
@@ -105,27 +58,54 @@ def pick_closest_four(words):
     return list(best_group)
 
 
-def gen_initial_group(random_words):
-    user_prompt1 = f"""
-Пожалуйста создай категорию для головоломки Connections. Сперва напиши короткую историю НА РУССКОМ, опираясь на перевод этих слов: {', '.join(random_words)}.
-Затем, используя историю как вдохновение, придумай какую-то тематическую категорию и 8 разных слов, которые подходят под неё.
+def gen_more_words(category, valid_words, rejected_words, count):
+    """
+    Targeted re-request for a category with too few valid candidates:
+    only replacements are asked for, not the whole category.
+    """
+    rejected = ', '.join(word for word, _ in rejected_words)
+    user_prompt = load_template('more_words.txt').render(
+        category=category, valid_words=valid_words, rejected=rejected, num_words=2 * count
+    )
+    response = get_client().chat.completions.create(
+        model="gpt-4.1",
+        messages=[
+            {"role": "system", "content": load_template(INSTRUCTION_TEMPLATE).text},
+            {"role": "user", "content": user_prompt}
+        ]
+    )
+    text = response.choices[0].message.content
+    words_line = next((line for line in text.splitlines() if "Слова:" in line), "")
+    return [w.strip() for w in words_line.split("Слова:")[-1].split(",") if w.strip()]
 
-Формат ответа:
-Категория: НАЗВАНИЕ
-Слова: СЛОВО1, СЛОВО2, СЛОВО3, СЛОВО4, СЛОВО5, СЛОВО6, СЛОВО7, СЛОВО8
+
+def validate_words(category, words, need, rerequest: bool = True):
+    """
+    Drops multi-word, malformed and out-of-vocabulary candidates before selection.
+    Words without an embedding are rejected too, since they would get the placeholder vector in ranking.
     """
-    response = client.chat.completions.create(
+    return select_valid_words(
+        words, need, get_lexicon(),
+        rerequest=(lambda valid, rejected, missing: gen_more_words(category, valid, rejected, missing))
+        if rerequest else None,
+        require_embedding=True
+    )
+
+
+def gen_initial_group(random_words):
+    user_prompt1 = load_template('initial_io.txt').render(random_words=random_words)
+    response = get_client().chat.completions.create(
         model="gpt-4.1",
         temperature=0.8,
         messages=[
-            {"role": "system", "content": INSTRUCTION},
+            {"role": "system", "content": load_template(INSTRUCTION_TEMPLATE).text},
             {"role": "user", "content": user_prompt1}
         ]
     )
     return response.choices[0].message.content
 
 
-def gen_overlap_group(picked_words, game):
+def build_overlap_prompt(picked_words, game):
     words_with_categories = []
     for category, words in game.items():
         for word in words:
@@ -133,46 +113,38 @@ def gen_overlap_group(picked_words, game):
                 words_with_categories.append(f"{word} (категория: {category})")
 
     used_words = [word for words_list in game.values() for word in words_list]
-    used_categories = [word for words_list in game.keys() for word in words_list]
-
-    user_prompt2 = f"""
-Я создаю головоломку Connections с намеренным пересечением слов внутри категорий.
-
-Вот список слов, которые я уже использовал в предыдущих категориях (в скобках указана категория, в которой слово было использовано): 
-{', '.join(words_with_categories)}
-
-Для каждого из этих слов предложи одну или несколько альтернативных категорий. В приоритете использовать полисемичность и омонимию используемых слов. 
-Новые категории должны относится использовать ДРУГОЕ значение или особенность формы слова, отличное от категории, в которой оно уже было использовано.
-Желательно также использовать разные ТИПЫ категорий (значение слова, форма слова, сочетание формы и значения).
- 
-Теперь выбери ОДНУ из этих альтернативных категорий, связь между которой и относящимся к ней словом кажется наиболее перспективной.
-Хорошо, если новое значение слова в категории отличается от значения, уже описанного в других категориях. В приоритете использовать многозначность слов
-Создай категорию с таким названием и аналогично сгенерируй 8 слов, которые подходят под эту категорию
-
-ВАЖНО:
-1. Все слова в новой категории должны быть ОДНОГО УРОВНЯ КЛАССИФИКАЦИИ между собой и с исходным словом из предыдущей категории
-2. НЕ используй слова из предыдущих категорий: {', '.join(used_words)}
-3. Новая категория должна быть уникальной и не повторять уже использованные: {', '.join(used_categories)} — важно, чтобы два слова из разных категорий нельзя было беспрепятственно поменять между ними
-4. Помни, что категории должны быть четко различимыми, чтобы каждая головоломка имела только одно возможное корректное решение
-
-До того, как вынести финальный вердикт рассуждения почему та или иная группа лучше.
-Твой финальный ответ должен СТРОГО соответствовать формату ниже (без дополнительных строк, разделителей и выделений)!
-
-Формат ответа:
-Выбранное слово: СЛОВО
-Категория: НАЗВАНИЕ
-Слова: СЛОВО1, СЛОВО2, СЛОВО3, СЛОВО4, СЛОВО5, СЛОВО6, СЛОВО7, СЛОВО8
-    """
-    response = client.chat.completions.create(
+    used_categories = list(game.keys())
+
+    user_prompt2 = load_template('io.txt').render(
+        words_with_categories=words_with_categories, used_words=used_words, used_categories=used_categories
+    )
+    return user_prompt2
+
+
+def gen_overlap_group(picked_words, game):
+    response = get_client().chat.completions.create(
         model="gpt-4.1",
         messages=[
-            {"role": "system", "content": INSTRUCTION},
-            {"role": "user", "content": user_prompt2}
+            {"role": "system", "content": load_template(INSTRUCTION_TEMPLATE).text},
+            {"role": "user", "content": build_overlap_prompt(picked_words, game)}
         ]
     )
     return response.choices[0].message.content
 
 
+def gen_overlap_group_stream(picked_words, game):
+    return StreamedCompletion(
+        get_client(),
+        OVERLAP_BLOCK_FIELDS,
+        stop_on_block=STREAM_STOP_ON_BLOCK,
+        model="gpt-4.1",
+        messages=[
+            {"role": "system", "content": load_template(INSTRUCTION_TEMPLATE).text},
+            {"role": "user", "content": build_overlap_prompt(picked_words, game)}
+        ]
+    )
+
+
 def parse_initial_response(text):
     lines = [line.strip() for line in text.strip().split("\n") if line.strip()]
     category_line = None
@@ -215,46 +187,151 @@ def parse_overlap_response(text):
     return picked_word, category, words
 
 
-def intentional_overlap_pipeline(word_bank, num_games: int, output_filename: str):
-    for cycle in range(num_games):
-        print(f"\nGame generation {cycle + 1}...")
-        picked_words = []
-        game = {}
+def commit_salvaged_step(step, game, picked_words, used_words, on_category, step_log) -> bool:
+    """
+    Fills a failed step from the datasets (see dataset_salvage.salvage_step).
+    Returns False if no dataset category fits.
+    """
+    salvaged = salvage_step(game)
+    if salvaged is None:
+        return False
+    picked_word, new_category, new_core_group = salvaged
+    picked_words.append(picked_word)
+    used_words.update(new_core_group)
 
-        run_number = cycle + 1
-        try:
-            random_words = random.sample(word_bank, 4)
-            initial_category_raw = gen_initial_group(random_words)
-            initial_category, initial_words = parse_initial_response(initial_category_raw)
-            initial_core_group = pick_closest_four(initial_words)
-        except Exception as e:
-            print(f"Error with generating initial category: {e}")
-            continue
-
-        print(f"Category 1: {initial_category} — {initial_core_group}")
-        append_to_txt(run_number, 1, initial_category, initial_core_group, output_filename)
-        game[initial_category] = initial_core_group
-
-        used_words = set()
-        for step in range(2, 5):
+    print(f"Category {step} (from datasets): {new_category} — {new_core_group}")
+    on_category(step, new_category, new_core_group)
+    game[new_category] = new_core_group
+    step_log.append('dataset')
+    return True
+
+
+def overlap_steps_streaming(game, picked_words, used_words, on_category, step_log):
+    """
+    Steps 2-4 over streamed completions: each step hands its answer block to the next
+    one as soon as the block is parsed, without waiting for the end of the stream.
+    A failed step is filled from the datasets when possible.
+    """
+    def start_stream(step, provisional):
+        if provisional is None:
+            return gen_overlap_group_stream(picked_words, game)
+        picked_word, new_category, new_core_group = provisional
+        return gen_overlap_group_stream(picked_words + [picked_word], {**game, new_category: new_core_group})
+
+    def apply_block(step, block, speculative):
+        picked_word, new_category, new_words = block
+        new_words = [word for word in new_words if word not in used_words]
+        # No re-request for a speculative block: the stream may still end with another one
+        new_words = [word for word in validate_words(new_category, new_words, 4, rerequest=not speculative)
+                     if word not in used_words]
+        return picked_word, new_category, pick_closest_four(new_words)
+
+    def commit_step(step, result):
+        picked_word, new_category, new_core_group = result
+        picked_words.append(picked_word)
+        used_words.update(new_core_group)
+
+        print(f"Category {step}: {new_category} — {new_core_group}")
+        on_category(step, new_category, new_core_group)
+        game[new_category] = new_core_group
+        step_log.append('llm')
+
+    def on_error(step, e):
+        print(f"Error on step {step}: {e}")
+        if not commit_salvaged_step(step, game, picked_words, used_words, on_category, step_log):
+            step_log.append('lost')
+        return True
+
+    run_steps_speculatively(range(2, 5), start_stream, apply_block, commit_step, on_error)
+
+
+def generate_game(word_bank, on_category=None, stream: bool = False, step_log: Optional[List[str]] = None):
+    """
+    Generates one game and returns it as {category: words}. on_category(step, category, words)
+    is called for every accepted category, e.g. to write it out right away.
+    Returns an empty dict if the initial category could not be generated.
+    A step the LLM fails is filled from the datasets, and only if they have no fitting
+    category it is asked again, within LLM_RETRY_BUDGET requests per game.
+    If step_log is given, how every step was filled is appended to it (see summarize_steps).
+    """
+    if on_category is None:
+        on_category = lambda step, category, words: None
+    if step_log is None:
+        step_log = []
+    picked_words = []
+    game = {}
+
+    try:
+        random_words = random.sample(word_bank, 4)
+        initial_category_raw = gen_initial_group(random_words)
+        initial_category, initial_words = parse_initial_response(initial_category_raw)
+        initial_core_group = pick_closest_four(validate_words(initial_category, initial_words, 4))
+    except Exception as e:
+        print(f"Error with generating initial category: {e}")
+        step_log.append('lost')
+        return game
+
+    print(f"Category 1: {initial_category} — {initial_core_group}")
+    on_category(1, initial_category, initial_core_group)
+    game[initial_category] = initial_core_group
+    step_log.append('llm')
+
+    used_words = set(initial_core_group)
+    if stream:
+        overlap_steps_streaming(game, picked_words, used_words, on_category, step_log)
+        return game
+
+    retries_left = LLM_RETRY_BUDGET
+    for step in range(2, 5):
+        source = 'llm'
+        while True:
             try:
                 overlap_raw = gen_overlap_group(picked_words, game)
                 picked_word, new_category, new_words = parse_overlap_response(overlap_raw)
 
-                picked_words.append(picked_word)
-
                 new_words = [word for word in new_words if word not in used_words]
+                new_words = [word for word in validate_words(new_category, new_words, 4) if word not in used_words]
                 new_core_group = pick_closest_four(new_words)
+
+                picked_words.append(picked_word)
                 used_words.update(new_core_group)
 
                 print(f"Category {step}: {new_category} — {new_core_group}")
-                append_to_txt(run_number, step, new_category, new_core_group, output_filename)
+                on_category(step, new_category, new_core_group)
                 game[new_category] = new_core_group
+                step_log.append(source)
+                break
 
             except Exception as e:
                 print(f"Error on step {step}: {e}")
-                continue
+                if source == 'llm' and commit_salvaged_step(step, game, picked_words, used_words, on_category,
+                                                            step_log):
+                    break
+                if retries_left == 0:
+                    step_log.append('lost')
+                    break
+                retries_left -= 1
+                source = 'llm_retry'
+                print(f"Retrying step {step} with the LLM ({retries_left} retries left)")
+
+    return game
+
+
+def intentional_overlap_pipeline(word_bank, num_games: int, output_filename: str, stream: bool = False):
+    step_logs = []
+    for cycle in range(num_games):
+        print(f"\nGame generation {cycle + 1}...")
+        run_number = cycle + 1
+
+        def write_category(step, category, words):
+            append_to_txt(run_number, step, category, words, output_filename)
+
+        step_log = []
+        game = generate_game(word_bank, write_category, stream, step_log)
+        close_incomplete_run(len(game), output_filename)
+        step_logs.append(step_log)
 
+    print(summarize_steps(step_logs))
     print(f"\nResults saves to '{output_filename}'")
 
 
@@ -262,9 +339,5 @@ if __name__ == "__main__":
     NUMBER_OF_RUNS = 5
     OUTPUT_FILE = "llm_io.txt"
 
-    df = pd.read_csv("nyt_connections.csv")
-    word_list = []
-    for words in df['words']:
-        word_list.extend([w.strip().lower() for w in words.split(",")])
-    word_list = list(set(word_list))
+    word_list = load_word_bank()
     intentional_overlap_pipeline(word_list, NUMBER_OF_RUNS, OUTPUT_FILE)
@@ -0,0 +1,228 @@
+import threading
+import time
+from typing import Callable, List, Optional, Sequence, Tuple, Any
+
+CATEGORY_SIZE = 4
+
+# Lines of the final answer block, in the order the prompts ask for them
+OVERLAP_BLOCK_FIELDS = ("Выбранное слово:", "Категория:", "Слова:")
+FALSE_GROUP_BLOCK_FIELDS = ("Категория:", "Слова:")
+
+
+class AnswerBlockParser:
+    """
+    Incremental parser for the fixed answer block printed at the end of a completion.
+    Text is fed chunk by chunk; a block is complete once all of its lines were seen
+    in order and the words line is terminated (by a newline or by the end of the stream).
+    The model may print drafts while reasoning, so the last complete block wins.
+    """
+
+    def __init__(self, fields: Sequence[str], min_words: int = CATEGORY_SIZE):
+        self.fields = tuple(fields)
+        self.min_words = min_words
+        self.first: Optional[Tuple] = None
+        self.last: Optional[Tuple] = None
+        self._buffer = ""
+        self._values: List[str] = []
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Consumes a piece of the stream. Returns True if a new complete block was found.
+        """
+        self._buffer += chunk
+        found = False
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            found = self._consume_line(line) or found
+        return found
+
+    def close(self) -> bool:
+        """
+        Flushes the unterminated last line at the end of the stream.
+        """
+        line, self._buffer = self._buffer, ""
+        return self._consume_line(line)
+
+    def _consume_line(self, line: str) -> bool:
+        line = line.strip()
+        if not line:
+            return False
+
+        # A block always restarts on its first field, even in the middle of another one
+        if self.fields[0] in line:
+            self._values = [line.split(self.fields[0])[-1].strip()]
+        elif self._values and self.fields[len(self._values)] in line:
+            self._values.append(line.split(self.fields[len(self._values)])[-1].strip())
+        else:
+            self._values = []
+            return False
+
+        if len(self._values) < len(self.fields):
+            return False
+
+        values, self._values = self._values, []
+        block = self._make_block(values)
+        if block is None:
+            return False
+        if self.first is None:
+            self.first = block
+        self.last = block
+        return True
+
+    def _make_block(self, values: List[str]) -> Optional[Tuple]:
+        if not all(values):
+            return None
+        words = [w.strip() for w in values[-1].split(",") if w.strip()]
+        if len(words) < self.min_words:
+            return None
+        return tuple(values[:-1]) + (words,)
+
+
+class StreamedCompletion:
+    """
+    Streams a chat completion in a background thread and exposes the answer block
+    as soon as it is complete, before the stream has finished.
+    With stop_on_block the stream is closed right after the first complete block.
+    """
+
+    def __init__(
+            self,
+            client,
+            fields: Sequence[str],
+            stop_on_block: bool = False,
+            **create_kwargs
+    ):
+        self._client = client
+        self._create_kwargs = create_kwargs
+        self._parser = AnswerBlockParser(fields)
+        self._stop_on_block = stop_on_block
+        self._block_ready = threading.Event()
+        self._done = threading.Event()
+        self._cancelled = False
+        self._chunks: List[str] = []
+        self.error: Optional[BaseException] = None
+        self.started_at = time.perf_counter()
+        self.first_block_latency: Optional[float] = None
+        self.total_latency: Optional[float] = None
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            stream = self._client.chat.completions.create(stream=True, **self._create_kwargs)
+            try:
+                for chunk in stream:
+                    if self._cancelled:
+                        break
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    self._chunks.append(delta)
+                    if self._parser.feed(delta) and not self._block_ready.is_set():
+                        self._mark_block_ready()
+                        if self._stop_on_block:
+                            break
+            finally:
+                stream.close()
+            if self._parser.close() and not self._block_ready.is_set():
+                self._mark_block_ready()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.total_latency = time.perf_counter() - self.started_at
+            self._block_ready.set()
+            self._done.set()
+
+    def _mark_block_ready(self):
+        self.first_block_latency = time.perf_counter() - self.started_at
+        self._block_ready.set()
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    def first_block(self, timeout: Optional[float] = None) -> Tuple:
+        """
+        Waits for the first complete answer block. It may still be replaced by a later
+        block, so anything built on it is provisional until final_block() confirms it.
+        """
+        self._block_ready.wait(timeout)
+        if self._parser.first is None:
+            self._raise_missing()
+        return self._parser.first
+
+    def final_block(self, timeout: Optional[float] = None) -> Tuple:
+        """
+        Waits for the end of the stream and returns the last complete answer block.
+        """
+        self._done.wait(timeout)
+        if self._parser.last is None:
+            self._raise_missing()
+        return self._parser.last
+
+    def cancel(self):
+        """
+        Stops reading the stream; used when a speculative request is no longer needed.
+        """
+        self._cancelled = True
+
+    def _raise_missing(self):
+        if self.error is not None:
+            raise self.error
+        raise ValueError(f"Response does not contain needed lines. Received:\n{self.text}")
+
+
+def run_steps_speculatively(
+        steps: Sequence[Any],
+        start_stream: Callable[[Any, Optional[Any]], StreamedCompletion],
+        apply_block: Callable[[Any, Tuple, bool], Any],
+        commit_step: Callable[[Any, Any], None],
+        on_error: Callable[[Any, Exception], bool]
+):
+    """
+    Runs dependent pipeline steps over streamed completions.
+    start_stream(step, provisional) opens the request for a step; provisional is the
+    not yet committed result of the previous step (None once everything is committed).
+    apply_block(step, block, speculative) turns a parsed block into a step result.
+    With speculative True it is called on the first block before the stream is finished and
+    must not have side effects (no requests); if it raises, the step waits for the final block.
+    The final block is applied with speculative False, which may e.g. re-request missing words.
+    commit_step(step, result) records the result (file output, game state).
+    on_error(step, error) handles a failed step and returns True to go on with the next
+    step; otherwise no further request is made.
+
+    As soon as a step's first block is parsed, the next step is started speculatively on it.
+    If the finished stream ends with a different block, the speculative request is cancelled
+    and the next step is restarted from the committed state.
+    """
+    pending = None
+    for i, step in enumerate(steps):
+        streamed = pending or start_stream(step, None)
+        pending = None
+        has_next = i + 1 < len(steps)
+        try:
+            block = streamed.first_block()
+            try:
+                result = apply_block(step, block, True)
+            except Exception:
+                result = None
+            if has_next and result is not None:
+                pending = start_stream(steps[i + 1], result)
+
+            final = streamed.final_block()
+            if final != block or result is None:
+                if pending is not None:
+                    pending.cancel()
+                    pending = None
+                result = apply_block(step, final, False)
+
+            commit_step(step, result)
+        except Exception as e:
+            if pending is not None:
+                pending.cancel()
+                pending = None
+            if not on_error(step, e):
+                return
@@ -0,0 +1,239 @@
+import json
+import os
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from prompt_templates import load_template
+from resources import get_client
+from lexicon import get_lexicon, check_word
+
+NYT_PATH = "nyt_connections.csv"
+NYT_GAME_COLUMN = "game_id"
+NYT_CATEGORY_COLUMN = "category"
+NYT_WORDS_COLUMN = "words"
+
+MEMO_PATH = "translation_memo.json"
+TRANSLATION_PACK_SIZE = 8
+MAX_TRANSLATION_ATTEMPTS = 3
+
+ITEM_RE = re.compile(r'^\[(.+?)\]\s*(.+)$')
+
+
+def load_nyt_games(path: str = NYT_PATH) -> "OrderedDict[str, Dict[str, List[str]]]":
+    """
+    Groups the NYT archive into games: game_id -> {category: words}.
+    """
+    import pandas as pd
+
+    df = pd.read_csv(path)
+    games = OrderedDict()
+    for _, row in df.iterrows():
+        game_id = str(row[NYT_GAME_COLUMN])
+        words = [w.strip().upper() for w in str(row[NYT_WORDS_COLUMN]).split(",") if w.strip()]
+        games.setdefault(game_id, {})[str(row[NYT_CATEGORY_COLUMN]).strip().upper()] = words
+    return games
+
+
+class TranslationMemo:
+    """
+    Persistent translations reused across games: category names and words within a category.
+    A word is only reused under the same category, since Connections words are picked for
+    their several meanings; its translation under another category is sent as a hint.
+    """
+
+    def __init__(self, path: str = MEMO_PATH):
+        self.path = path
+        self.categories: Dict[str, str] = {}
+        self.words: Dict[str, str] = {}
+        self.words_in_category: Dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            self.categories = data.get("categories", {})
+            self.words = data.get("words", {})
+            self.words_in_category = data.get("words_in_category", {})
+
+    def save(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "categories": self.categories,
+                "words": self.words,
+                "words_in_category": self.words_in_category
+            }, f, ensure_ascii=False, indent=1)
+
+    def category(self, category: str) -> Optional[str]:
+        return self.categories.get(category)
+
+    def word(self, category: str, word: str) -> Optional[str]:
+        return self.words_in_category.get(f"{category}|{word}")
+
+    def word_hint(self, word: str) -> Optional[str]:
+        """
+        A translation of the word under some other category.
+        """
+        return self.words.get(word)
+
+    def add_category(self, category: str, translation: str):
+        self.categories[category] = translation
+
+    def add_word(self, category: str, word: str, translation: str):
+        self.words_in_category[f"{category}|{word}"] = translation
+        self.words.setdefault(word, translation)
+
+
+def duplicate_names(game: Dict[str, List[str]], memo: TranslationMemo) -> List[str]:
+    """
+    Categories of the game whose translation repeats the one of an earlier category.
+    """
+    seen, duplicates = set(), []
+    for category in game:
+        translation = memo.category(category)
+        if translation is None:
+            continue
+        if translation in seen:
+            duplicates.append(category)
+        seen.add(translation)
+    return duplicates
+
+
+def unresolved_items(game_id: str, game: Dict[str, List[str]], memo: TranslationMemo) -> List[Tuple[str, str, str]]:
+    """
+    Items of a game the memo cannot translate: (item_id, category, word or None for the name).
+    A category whose name translates like another category of the game is asked again.
+    Ids are stable: '<game>:<category index>' and '<game>:<category index>:<word index>'.
+    """
+    duplicates = duplicate_names(game, memo)
+    items = []
+    for i, (category, words) in enumerate(game.items(), 1):
+        if memo.category(category) is None or category in duplicates:
+            items.append((f"{game_id}:{i}", category, None))
+        for j, word in enumerate(words, 1):
+            if memo.word(category, word) is None:
+                items.append((f"{game_id}:{i}:{j}", category, word))
+    return items
+
+
+def build_pack_prompt(items: List[Tuple[str, str, Optional[str]]], memo: Optional[TranslationMemo] = None) -> str:
+    lines = []
+    for item_id, category, word in items:
+        if word is None:
+            line = f"[{item_id}] категория: {category}"
+            taken = memo.category(category) if memo is not None else None
+            if taken:
+                line += f" (не «{taken}»: так уже названа другая категория этой игры)"
+        else:
+            line = f"[{item_id}] {word} (категория: {category})"
+            hint = memo.word_hint(word) if memo is not None else None
+            if hint:
+                line += f" (в другой категории переводилось как «{hint}»)"
+        lines.append(line)
+    items_block = "\n".join(lines)
+    user_prompt = load_template('translation_packed.txt').render(items_block=items_block)
+    return user_prompt
+
+
+def translate_pack(items: List[Tuple[str, str, Optional[str]]], memo: Optional[TranslationMemo] = None
+                   ) -> Tuple[Dict[str, str], int]:
+    """
+    One request for a pack of items. Returns item_id -> translation and the tokens spent.
+    """
+    response = get_client().chat.completions.create(
+        model="gpt-4.1",
+        messages=[{"role": "user", "content": build_pack_prompt(items, memo)}]
+    )
+    translations = {}
+    for line in response.choices[0].message.content.splitlines():
+        match = ITEM_RE.match(line.strip())
+        if match:
+            translations[match.group(1).strip()] = match.group(2).strip().upper()
+    usage = getattr(response, "usage", None)
+    return translations, (usage.total_tokens if usage else 0)
+
+
+def apply_translations(items, translations, memo: TranslationMemo, lexicon) -> int:
+    """
+    Stores valid translations in the memo; words failing the lexical check are left
+    unresolved so they are asked again. Returns the number of rejected translations.
+    """
+    rejected = 0
+    for item_id, category, word in items:
+        translation = translations.get(item_id)
+        if not translation:
+            continue
+        if word is None:
+            memo.add_category(category, translation)
+        elif check_word(translation, lexicon) is None:
+            memo.add_word(category, word, translation)
+        else:
+            rejected += 1
+    return rejected
+
+
+def assemble_game(game: Dict[str, List[str]], memo: TranslationMemo) -> Dict[str, List[str]]:
+    return {
+        memo.category(category): [memo.word(category, word) for word in words]
+        for category, words in game.items()
+    }
+
+
+def translate_games(
+        games: "OrderedDict[str, Dict[str, List[str]]]",
+        memo: TranslationMemo,
+        pack_size: int = TRANSLATION_PACK_SIZE
+) -> "OrderedDict[str, Dict[str, List[str]]]":
+    """
+    Translates games through the memo, sending only the items it cannot resolve.
+    Several games go into one request; games still unresolved after
+    MAX_TRANSLATION_ATTEMPTS rounds, also those with two categories translated
+    to the same name, are skipped.
+    """
+    lexicon = get_lexicon()
+    calls, tokens, rejected = 0, 0, 0
+    pending = list(games)
+    for attempt in range(MAX_TRANSLATION_ATTEMPTS):
+        if not pending:
+            break
+        still_pending = []
+        for start in range(0, len(pending), pack_size):
+            pack_ids = pending[start:start + pack_size]
+            # Items repeated inside the pack are sent once
+            items, seen = [], set()
+            for game_id in pack_ids:
+                for item in unresolved_items(game_id, games[game_id], memo):
+                    key = (item[1], item[2])
+                    if key not in seen:
+                        seen.add(key)
+                        items.append(item)
+            if items:
+                translations, used_tokens = translate_pack(items, memo)
+                calls += 1
+                tokens += used_tokens
+                rejected += apply_translations(items, translations, memo, lexicon)
+                memo.save()
+            still_pending.extend(g for g in pack_ids if unresolved_items(g, games[g], memo))
+        pending = still_pending
+        if pending:
+            print(f"Round {attempt + 1}: {len(pending)} games still have untranslated items")
+
+    translated = OrderedDict(
+        (game_id, assemble_game(game, memo)) for game_id, game in games.items() if game_id not in pending
+    )
+    print(f"Translated {len(translated)}/{len(games)} games with {calls} requests and {tokens} tokens")
+    print(f"Rejected translations: {rejected}, skipped games: {len(pending)}")
+    return translated
+
+
+def save_translated(translated, filename: str):
+    with open(filename, 'w', encoding='utf-8') as f:
+        blocks = []
+        for game in translated.values():
+            blocks.append("\n".join(f"{i}. {cat}: {', '.join(words)}" for i, (cat, words) in enumerate(game.items(), 1)))
+        f.write("\n\n".join(blocks))
+
+
+if __name__ == "__main__":
+    OUTPUT_FILE = "translated.txt"
+
+    nyt_games = load_nyt_games(NYT_PATH)
+    translation_memo = TranslationMemo(MEMO_PATH)
+    save_translated(translate_games(nyt_games, translation_memo), OUTPUT_FILE)
@@ -0,0 +1,329 @@
+import random
+import time
+from itertools import combinations
+from typing import Dict, List, Optional, Set, Tuple
+import form_index
+
+CATEGORY_SIZE = 4
+MAIN_TYPES = ('meaning', 'form')
+# Search time per puzzle, seconds
+TIME_BUDGET = 0.5
+# Children tried per node, the ones sharing the most words with the puzzle first
+MAX_BRANCHING = 12
+# Random draws of words tried per complete set of categories
+DRAW_ATTEMPTS = 4
+
+
+class OverlapIndex:
+    """
+    The datasets as bitsets: every word gets an id, and every category with at least
+    CATEGORY_SIZE words is a Python int with the bits of its words set. 'multi' has the
+    bits of the words that belong to more than one category. 'fits' has the words a player
+    would see fit a category: its bits, the words of the categories of the same name, and for
+    the computed form categories the words matching the rule that were left out of the category
+    (form_index.distinct_stems()).
+    """
+
+    def __init__(self, data_by_category: Dict[str, Dict[str, Dict[str, Set[str]]]]):
+        self.words: List[str] = []
+        word_ids: Dict[str, int] = {}
+        self.categories: List[Tuple[str, str, str]] = []  # main_type, subtype, category_name
+        self.bits: List[int] = []
+        self.by_type: Dict[str, List[int]] = {main_type: [] for main_type in MAIN_TYPES}
+        self.by_word: List[List[int]] = []  # word id -> category ids
+
+        for main_type in MAIN_TYPES:
+            for subtype, categories in data_by_category.get(main_type, {}).items():
+                for name, words in categories.items():
+                    if len(words) < CATEGORY_SIZE:
+                        continue
+                    category_id = len(self.categories)
+                    bits = 0
+                    for word in words:
+                        word_id = word_ids.get(word)
+                        if word_id is None:
+                            word_id = word_ids[word] = len(self.words)
+                            self.words.append(word)
+                            self.by_word.append([])
+                        self.by_word[word_id].append(category_id)
+                        bits |= 1 << word_id
+                    self.categories.append((main_type, subtype, name))
+                    self.bits.append(bits)
+                    self.by_type[main_type].append(category_id)
+
+        self.fits: List[int] = list(self.bits)
+        form_ids = {name: category_id for category_id, (main_type, subtype, name) in enumerate(self.categories)
+                    if main_type == 'form' and subtype in form_index.FORM_SUBTYPES}
+        if form_ids:
+            for classes in form_index.form_classes(self.words).values():
+                for name, members in classes.items():
+                    category_id = form_ids.get(name)
+                    if category_id is not None:
+                        for word in members:
+                            self.fits[category_id] |= 1 << word_ids[word]
+        # Categories of different subtypes can share a name, and the player only sees the name
+        by_name: Dict[str, int] = {}
+        for (_, _, name), bits in zip(self.categories, self.fits):
+            by_name[name] = by_name.get(name, 0) | bits
+        self.fits = [by_name[name] for _, _, name in self.categories]
+
+        self.multi = 0
+        for word_id, category_ids in enumerate(self.by_word):
+            if len(category_ids) > 1:
+                self.multi |= 1 << word_id
+
+    def word_ids(self, bits: int) -> List[int]:
+        result = []
+        while bits:
+            low = bits & -bits
+            result.append(low.bit_length() - 1)
+            bits ^= low
+        return result
+
+
+def clean_bits(position: int, groups: List[int], fits: List[int]) -> int:
+    """
+    Words of the group at position that fit no other group.
+    """
+    others = 0
+    for i, bits in enumerate(fits):
+        if i != position:
+            others |= bits
+    return groups[position] & ~others
+
+
+def red_herrings(drawn: List[List[int]], fits: List[int]) -> Optional[int]:
+    """
+    Pairs of groups linked by a red herring: a word drawn for one group that also fits the other.
+    None if the draw is ambiguous: herrings both ways between two groups (the words could swap),
+    or more than one word of a group fitting the same other group.
+    """
+    linked = set()
+    for a, words in enumerate(drawn):
+        for b, bits in enumerate(fits):
+            if a == b:
+                continue
+            herrings = sum(1 for word_id in words if bits >> word_id & 1)
+            if herrings > 1 or herrings and (b, a) in linked:
+                return None
+            if herrings:
+                linked.add((a, b))
+    return len(linked)
+
+
+def count_solutions(drawn: List[List[int]], fits: List[int], limit: int = 2) -> int:
+    """
+    Ways to split the drawn words back into the groups so that every group gets CATEGORY_SIZE
+    words that fit it, counted up to limit. A puzzle is uniquely solvable if this is 1.
+    """
+    words = [word_id for group in drawn for word_id in group]
+    free = [CATEGORY_SIZE] * len(fits)
+    count = 0
+
+    def place(i: int):
+        nonlocal count
+        if i == len(words):
+            count += 1
+            return
+        for group, bits in enumerate(fits):
+            if free[group] and bits >> words[i] & 1:
+                free[group] -= 1
+                place(i + 1)
+                free[group] += 1
+                if count >= limit:
+                    return
+
+    place(0)
+    return count
+
+
+def _reaches(start: int, goal: int, edges: Set[Tuple[int, int]]) -> bool:
+    stack, seen = [start], {start}
+    while stack:
+        node = stack.pop()
+        if node == goal:
+            return True
+        for a, b in edges:
+            if a == node and b not in seen:
+                seen.add(b)
+                stack.append(b)
+    return False
+
+
+def draw_words(groups: List[int], fits: List[int], index: OverlapIndex, rng=random) -> Optional[List[List[int]]]:
+    """
+    CATEGORY_SIZE words per group: red herrings first, then words that fit no other group.
+    Every pair of groups gets at most one herring, in one direction, and the directions never
+    form a cycle, so the puzzle has one solution: moving words between groups needs a cycle.
+    """
+    count = len(groups)
+    clean = [clean_bits(i, groups, fits) for i in range(count)]
+    drawn: List[List[int]] = [[] for _ in range(count)]
+    edges: Set[Tuple[int, int]] = set()  # (a, b): a herring of group a fits group b
+    pairs = [(a, b) for a in range(count) for b in range(count) if a != b]
+    rng.shuffle(pairs)
+    # Groups with fewer than CATEGORY_SIZE words of their own need their herrings first
+    pairs.sort(key=lambda pair: clean[pair[0]].bit_count() >= CATEGORY_SIZE)
+    for a, b in pairs:
+        if (a, b) in edges or (b, a) in edges or clean[a].bit_count() < CATEGORY_SIZE - len(drawn[a]) - 1:
+            continue
+        candidates = index.word_ids(groups[a] & fits[b])
+        rng.shuffle(candidates)
+        for word_id in candidates:
+            targets = [c for c in range(count) if c != a and fits[c] >> word_id & 1]
+            if any((a, c) in edges or (c, a) in edges or _reaches(c, a, edges) for c in targets):
+                continue
+            drawn[a].append(word_id)
+            edges.update((a, c) for c in targets)
+            break
+
+    for a in range(count):
+        need = CATEGORY_SIZE - len(drawn[a])
+        words = index.word_ids(clean[a])
+        if len(words) < need:
+            return None
+        drawn[a].extend(rng.sample(words, need))
+    return drawn
+
+
+def solve(index: OverlapIndex, time_budget: float = TIME_BUDGET, rng=random,
+          stats: Optional[Dict] = None) -> List[Tuple[str, List[str]]]:
+    """
+    Depth-first search for CATEGORY_SIZE categories alternating 'meaning'/'form' that
+    maximizes the red_herrings() of a uniquely solvable draw. Every added category must share
+    a word with the chosen ones, branches where a group has no word left that fits it alone or
+    that cannot beat the best score found are cut, and the search stops at the time budget with
+    the best solution. If stats is given, nodes, leaves, seconds, nodes_per_second and score are
+    written to it.
+    """
+    import dataset_io
+
+    started = time.perf_counter()
+    deadline = started + time_budget
+    best_score = -1
+    best_drawn = None
+    best_path: List[int] = []
+    nodes = leaves = 0
+    perfect = len(list(combinations(range(CATEGORY_SIZE), 2)))
+
+    def linkable(path: List[int]) -> int:
+        # Pairs of chosen groups a herring could link
+        return sum(1 for a, b in combinations(path, 2)
+                   if index.bits[a] & index.fits[b] or index.bits[b] & index.fits[a])
+
+    def upper_bound(path: List[int]) -> int:
+        # Every pair with a group still to come may get a herring
+        return perfect - len(list(combinations(path, 2))) + linkable(path)
+
+    def children(path: List[int], union: int) -> List[int]:
+        main_type = MAIN_TYPES[len(path) % 2]
+        counts: Dict[int, int] = {}
+        for word_id in index.word_ids(union & index.multi):
+            for category_id in index.by_word[word_id]:
+                if category_id not in path and index.categories[category_id][0] == main_type:
+                    counts[category_id] = counts.get(category_id, 0) + 1
+        ordered = sorted(counts, key=lambda c: (-counts[c], rng.random()))
+        return ordered[:MAX_BRANCHING]
+
+    def leaf(path: List[int]):
+        nonlocal best_score, best_drawn, best_path
+        groups = [index.bits[c] for c in path]
+        fits = [index.fits[c] for c in path]
+        names = [index.categories[c][2] for c in path]
+        for _ in range(DRAW_ATTEMPTS):
+            drawn = draw_words(groups, fits, index, rng)
+            if drawn is None:
+                continue
+            score = red_herrings(drawn, fits)
+            if score is None or score <= best_score or count_solutions(drawn, fits) != 1:
+                continue
+            # A drawn word under another chosen category would have two places as well
+            if any(dataset_io.hypernym_conflict(names[i], [index.words[w] for w in words], names[:i] + names[i + 1:])
+                   for i, words in enumerate(drawn)):
+                continue
+            best_score, best_drawn, best_path = score, drawn, list(path)
+
+    def search(path: List[int], union: int):
+        nonlocal nodes, leaves
+        nodes += 1
+        if len(path) == CATEGORY_SIZE:
+            leaves += 1
+            if linkable(path) > best_score:
+                leaf(path)
+            return
+        used_names = [index.categories[c][2] for c in path]
+        for category_id in children(path, union):
+            if time.perf_counter() > deadline or best_score == perfect:
+                return
+            name = index.categories[category_id][2]
+            if name in used_names or dataset_io.hypernym_conflict(name, [], used_names):
+                continue
+            path.append(category_id)
+            groups = [index.bits[c] for c in path]
+            fits = [index.fits[c] for c in path]
+            if all(clean_bits(i, groups, fits) for i in range(len(path))) and upper_bound(path) > best_score:
+                search(path, union | index.bits[category_id])
+            path.pop()
+
+    roots = list(index.by_type[MAIN_TYPES[0]])
+    rng.shuffle(roots)
+    for root in roots:
+        if time.perf_counter() > deadline or best_score == perfect:
+            break
+        search([root], index.bits[root])
+
+    seconds = time.perf_counter() - started
+    if stats is not None:
+        stats.update(nodes=nodes, leaves=leaves, seconds=round(seconds, 4),
+                     nodes_per_second=round(nodes / seconds) if seconds else 0, score=best_score)
+    if best_drawn is None:
+        return []
+    return [(index.categories[c][2], [index.words[w] for w in words]) for c, words in zip(best_path, best_drawn)]
+
+
+_INDEX = None
+
+
+def get_index() -> OverlapIndex:
+    global _INDEX
+    if _INDEX is None:
+        import dataset_io
+
+        data_by_category, _ = dataset_io.get_datasets()
+        print("Building overlap index...")
+        _INDEX = OverlapIndex(data_by_category)
+    return _INDEX
+
+
+def intentional_overlap_pipeline(num_runs: int, output_filename: str, time_budget: float = TIME_BUDGET):
+    index = get_index()
+
+    print(f"\n--- Starting {num_runs} solver Intentional Overlap Generations ({time_budget}s each) ---")
+    print(f"Results will be saved to '{output_filename}'")
+
+    total_nodes = total_seconds = 0
+    with open(output_filename, 'w', encoding='utf-8') as f:
+        successful_runs = 0
+        for i in range(num_runs):
+            f.write(f"--- Run {i + 1} ---\n")
+            stats = {}
+            generated_data = solve(index, time_budget, stats=stats)
+            total_nodes += stats["nodes"]
+            total_seconds += stats["seconds"]
+            if generated_data:
+                successful_runs += 1
+                for step, (category, words) in enumerate(generated_data):
+                    f.write(f"{step + 1}. {category}: {', '.join(words)}\n")
+                print(f"Run {i + 1}: {stats['score']} red herrings, {stats['nodes']} nodes")
+            else:
+                f.write("No connections were generated for this run (or an error occurred).\n")
+            f.write("\n-------------------------------------\n\n")
+
+    print(f"\nFinished {num_runs} solver runs. Results saved to '{output_filename}'.")
+    print(f"Successfully generated full 4-category puzzles: {successful_runs}/{num_runs} times.")
+    if total_seconds:
+        print(f"Nodes explored per second: {total_nodes / total_seconds:.0f}")
+
+
+if __name__ == "__main__":
+    intentional_overlap_pipeline(5, "solver_io.txt")
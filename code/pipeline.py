@@ -0,0 +1,283 @@
+import importlib
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+from resources import load_word_bank
+
+CATEGORY_SIZE = 4
+DEFAULT_QUEUE_SIZE = 4
+
+_STOP = object()
+
+
+@dataclass
+class PuzzleItem:
+    run_number: int
+    game: Dict[str, List[str]]
+    started_at: float
+    edited: Optional[Dict[str, List[str]]] = None
+    ranked: Optional[str] = None
+
+
+@dataclass
+class Stage:
+    """
+    One pipeline step. func takes a PuzzleItem and returns it (possibly updated),
+    or None to drop the puzzle. workers threads read from a queue of queue_size items,
+    so a slow stage blocks the stages before it instead of buffering everything.
+    """
+    name: str
+    func: Callable[[PuzzleItem], Optional[PuzzleItem]]
+    workers: int = 1
+    queue_size: int = DEFAULT_QUEUE_SIZE
+
+
+@dataclass
+class PipelineStats:
+    generated: int = 0
+    dropped: Dict[str, int] = field(default_factory=dict)
+    completed: int = 0
+    latencies: List[float] = field(default_factory=list)
+    wall_time: float = 0.0
+
+    def summary(self) -> str:
+        lines = [f"Generated puzzles: {self.generated}, completed: {self.completed}, wall time: {self.wall_time:.1f}s"]
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            lines.append(
+                f"Latency per puzzle: median {latencies[len(latencies) // 2]:.2f}s, "
+                f"max {latencies[-1]:.2f}s"
+            )
+        for name, count in self.dropped.items():
+            lines.append(f"Dropped at '{name}': {count}")
+        return "\n".join(lines)
+
+
+class FileSinks:
+    """
+    Writes finished puzzles in the formats of the standalone scripts: the raw generation
+    file ('--- Run N ---' blocks), the '_edited.txt' file and the ranked file.
+    Puzzles are appended as soon as they are done, so nothing is kept in memory.
+    """
+
+    def __init__(self, raw_path: Optional[str] = None, edited_path: Optional[str] = None,
+                 ranked_path: Optional[str] = None):
+        self.raw_path = raw_path
+        self.edited_path = edited_path
+        self.ranked_path = ranked_path
+        self._lock = threading.Lock()
+        self._ranked_written = 0
+        for path in (raw_path, edited_path, ranked_path):
+            if path:
+                open(path, 'w', encoding='utf-8').close()
+
+    def write(self, item: PuzzleItem):
+        with self._lock:
+            if self.raw_path:
+                with open(self.raw_path, 'a', encoding='utf-8') as f:
+                    f.write(f"--- Run {item.run_number} ---\n")
+                    for step, (category, words) in enumerate(item.game.items()):
+                        f.write(f"{step + 1}. {category}: {', '.join(words)}\n")
+                    f.write("\n-------------------------------------\n\n")
+            if self.edited_path and item.edited is not None:
+                with open(self.edited_path, 'a', encoding='utf-8') as f:
+                    for i, (cat, words) in enumerate(item.edited.items(), 1):
+                        f.write(f"{i}. {cat.upper()}: {', '.join(words)}\n")
+                    f.write("\n")
+            if self.ranked_path and item.ranked is not None:
+                with open(self.ranked_path, 'a', encoding='utf-8') as f:
+                    if self._ranked_written:
+                        f.write("\n\n")
+                    f.write(item.ranked)
+                self._ranked_written += 1
+
+
+class PipelineRunner:
+    """
+    Runs generate -> stages -> sink in one process. Every stage has its own worker threads
+    and a bounded input queue, so each puzzle moves on as soon as the previous stage is done with it.
+    """
+
+    def __init__(self, generate: Callable[[], Optional[Dict[str, List[str]]]], stages: List[Stage],
+                 sink: Optional[Callable[[PuzzleItem], None]] = None, generator_workers: int = 1):
+        self.generate = generate
+        self.stages = stages
+        self.sink = sink
+        self.generator_workers = generator_workers
+        self.stats = PipelineStats()
+        self._stats_lock = threading.Lock()
+
+    def run(self, num_runs: int) -> PipelineStats:
+        started = time.perf_counter()
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        # The last stage feeds the sink directly
+        queues.append(None)
+        run_numbers = iter(range(1, num_runs + 1))
+        run_numbers_lock = threading.Lock()
+
+        def next_run_number():
+            with run_numbers_lock:
+                return next(run_numbers, None)
+
+        def generator_worker():
+            while True:
+                run_number = next_run_number()
+                if run_number is None:
+                    return
+                item_started = time.perf_counter()
+                try:
+                    game = self.generate()
+                except Exception as e:
+                    print(f"Error generating run {run_number}: {e}")
+                    game = None
+                if not game or len(game) != CATEGORY_SIZE:
+                    self._drop("generate")
+                    continue
+                with self._stats_lock:
+                    self.stats.generated += 1
+                self._forward(PuzzleItem(run_number, game, item_started), queues[0])
+
+        def stage_worker(stage, in_queue, out_queue):
+            while True:
+                item = in_queue.get()
+                if item is _STOP:
+                    return
+                try:
+                    result = stage.func(item)
+                except Exception as e:
+                    print(f"Error in stage '{stage.name}' for run {item.run_number}: {e}")
+                    result = None
+                if result is None:
+                    self._drop(stage.name)
+                    continue
+                self._forward(result, out_queue)
+
+        groups = [[threading.Thread(target=generator_worker, daemon=True) for _ in range(self.generator_workers)]]
+        for i, stage in enumerate(self.stages):
+            groups.append([
+                threading.Thread(target=stage_worker, args=(stage, queues[i], queues[i + 1]), daemon=True)
+                for _ in range(stage.workers)
+            ])
+        for group in groups:
+            for thread in group:
+                thread.start()
+
+        # Shut the stages down in order: once a group is done, stop every worker of the next one
+        for i, group in enumerate(groups):
+            for thread in group:
+                thread.join()
+            if i < len(self.stages):
+                for _ in range(self.stages[i].workers):
+                    queues[i].put(_STOP)
+
+        self.stats.wall_time = time.perf_counter() - started
+        return self.stats
+
+    def _forward(self, item: PuzzleItem, out_queue):
+        if out_queue is not None:
+            out_queue.put(item)
+            return
+        if self.sink is not None:
+            self.sink(item)
+        with self._stats_lock:
+            self.stats.completed += 1
+            self.stats.latencies.append(time.perf_counter() - item.started_at)
+
+    def _drop(self, stage_name: str):
+        with self._stats_lock:
+            self.stats.dropped[stage_name] = self.stats.dropped.get(stage_name, 0) + 1
+
+
+def make_generator(source: str, puzzle_type: str, stream: bool = False) -> Callable[[], Optional[Dict[str, List[str]]]]:
+    """
+    Returns a function producing one {category: words} game.
+    source: 'dataset' or 'llm'; puzzle_type: 'io' (intentional overlap) or 'fg' (false group).
+    """
+    if source == 'dataset' and puzzle_type == 'io':
+        dataset_io = importlib.import_module('dataset_io')
+        data_by_category, data_by_word = dataset_io.get_datasets()
+        return lambda: dict(dataset_io.generate_intentional_overlap(data_by_category, data_by_word))
+    if source == 'dataset' and puzzle_type == 'fg':
+        dataset_fg = importlib.import_module('dataset_fg')
+        data_by_category, data_by_word = dataset_fg.get_datasets()
+
+        def generate_fg():
+            generated = dataset_fg.generate_false_group(data_by_category, data_by_word)
+            return dict(generated[1]) if generated else None
+        return generate_fg
+    if source == 'llm':
+        module = importlib.import_module('llm_io' if puzzle_type == 'io' else 'llm_fg')
+        word_bank = load_word_bank()
+        return lambda: module.generate_game(word_bank, stream=stream)
+    raise ValueError(f"Unknown source/type combination: {source}/{puzzle_type}")
+
+
+def edit_stage(workers: int = 4, verify: bool = True) -> Stage:
+    """
+    Sends a puzzle to the editor. With verify, as in llm_editing.main, only puzzles game_verifier
+    finds problems in are edited; the rest go on unchanged.
+    """
+    llm_editing = importlib.import_module('llm_editing')
+    if verify:
+        game_verifier = importlib.import_module('game_verifier')
+        resources = importlib.import_module('resources')
+        navec = resources.get_navec() if resources.navec_available() else None
+
+    def edit(item: PuzzleItem) -> Optional[PuzzleItem]:
+        if verify:
+            problems = game_verifier.verify_games([item.game], navec)[0]
+            if not problems:
+                item.edited = dict(item.game)
+                return item
+            print(f"Run {item.run_number}: {'; '.join(problems)}")
+        edited = llm_editing.parse_text_to_dict(llm_editing.edit_game(item.game))
+        if len(edited) != CATEGORY_SIZE:
+            return None
+        item.edited = edited
+        return item
+    return Stage("edit", edit, workers=workers)
+
+
+def rank_stage(workers: int = 1) -> Stage:
+    llm_editing = importlib.import_module('llm_editing')
+
+    def rank(item: PuzzleItem) -> PuzzleItem:
+        item.ranked = llm_editing.rank_game(item.edited if item.edited is not None else item.game, verbose=False)
+        return item
+    return Stage("rank", rank, workers=workers)
+
+
+def run_pipeline(source: str, puzzle_type: str, num_runs: int, output_prefix: str,
+                 edit: Optional[bool] = None, generator_workers: int = 1, edit_workers: int = 4,
+                 stream: bool = False, verify: bool = True) -> PipelineStats:
+    """
+    generate -> (edit) -> rank for num_runs puzzles. Output files follow the script naming:
+    '<prefix>.txt', '<prefix>_edited.txt' and '<prefix>_edited&ranked.txt'
+    ('<prefix>_ranked.txt' without editing). By default only LLM games are edited, and with verify
+    only the ones game_verifier finds problems in.
+    """
+    if edit is None:
+        edit = source == 'llm'
+    stages = [edit_stage(edit_workers, verify)] if edit else []
+    stages.append(rank_stage())
+
+    sinks = FileSinks(
+        raw_path=f"{output_prefix}.txt",
+        edited_path=f"{output_prefix}_edited.txt" if edit else None,
+        ranked_path=f"{output_prefix}_edited&ranked.txt" if edit else f"{output_prefix}_ranked.txt"
+    )
+    runner = PipelineRunner(make_generator(source, puzzle_type, stream), stages, sinks.write, generator_workers)
+    stats = runner.run(num_runs)
+    print(stats.summary())
+    return stats
+
+
+if __name__ == "__main__":
+    NUMBER_OF_RUNS = 5
+    SOURCE = 'llm'
+    PUZZLE_TYPE = 'io'
+    OUTPUT_PREFIX = "llm_io"
+
+    run_pipeline(SOURCE, PUZZLE_TYPE, NUMBER_OF_RUNS, OUTPUT_PREFIX, generator_workers=2)
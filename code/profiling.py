@@ -0,0 +1,133 @@
+import functools
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+# Off by default. Hot loops check the flag themselves before calling in here,
+# so a disabled build costs one global lookup per instrumented spot.
+ENABLED = False
+
+_lock = threading.Lock()
+_local = threading.local()
+_counters: Dict[str, int] = defaultdict(int)
+# stack path ('a;b;c') -> [calls, total seconds, self seconds]
+_sections: Dict[str, list] = {}
+
+
+def enable(flag: bool = True):
+    global ENABLED
+    ENABLED = flag
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _sections.clear()
+
+
+def count(name: str, n: int = 1):
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] += n
+
+
+class _Section:
+    __slots__ = ('name', 'started', 'children', 'path')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        self.path = f"{stack[-1].path};{self.name}" if stack else self.name
+        self.children = 0.0
+        stack.append(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        stack = _local.stack
+        stack.pop()
+        if stack:
+            stack[-1].children += elapsed
+        with _lock:
+            record = _sections.get(self.path)
+            if record is None:
+                record = _sections[self.path] = [0, 0.0, 0.0]
+            record[0] += 1
+            record[1] += elapsed
+            record[2] += elapsed - self.children
+        return False
+
+
+class _NullSection:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SECTION = _NullSection()
+
+
+def section(name: str):
+    """
+    Timer for a block: `with profiling.section('name'):`. Nested sections form stacks,
+    so the profile can be drawn as a flame graph. Does nothing when profiling is disabled.
+    """
+    if not ENABLED:
+        return _NULL_SECTION
+    return _Section(name)
+
+
+def profiled(name: str):
+    """
+    Decorator timing every call of a function as a section. When profiling is disabled
+    the only cost is one extra call frame, so it is meant for functions, not inner loops.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with _Section(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def snapshot() -> Tuple[Dict[str, int], Dict[str, Tuple[int, float, float]]]:
+    """
+    Counters and sections (stack path -> calls, total seconds, self seconds) collected so far.
+    """
+    with _lock:
+        return dict(_counters), {path: tuple(record) for path, record in _sections.items()}
+
+
+def summary(title: Optional[str] = None) -> str:
+    counters, sections = snapshot()
+    lines = [f"--- Profile: {title} ---" if title else "--- Profile ---"]
+    for path, (calls, total, self_time) in sorted(sections.items(), key=lambda item: -item[1][1]):
+        lines.append(f"{path:<60} {calls:>9} calls {total * 1000:>10.1f} ms total {self_time * 1000:>10.1f} ms self")
+    for name, value in sorted(counters.items()):
+        lines.append(f"{name:<60} {value:>9}")
+    return "\n".join(lines)
+
+
+def write_collapsed(path: str):
+    """
+    Writes self time per stack in the collapsed format ('a;b;c <microseconds>' per line)
+    read by flamegraph.pl, speedscope and inferno.
+    """
+    _, sections = snapshot()
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, (_, _, self_time) in sorted(sections.items()):
+            f.write(f"{stack} {int(self_time * 1_000_000)}\n")
@@ -0,0 +1,123 @@
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+PROMPTS_DIR = 'prompts'
+# gpt-4.1 tokenizer
+TOKENIZER_ENCODING = 'o200k_base'
+
+# Placeholders as written in prompts/: {name} or {'<separator>'.join(name)}
+PLACEHOLDER_RE = re.compile(r"\{(?:'([^']*)'\.join\((\w+)\)|(\w+))\}")
+
+
+@lru_cache(maxsize=1)
+def _get_encoder():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        # No tiktoken, or its encoding file cannot be downloaded (offline)
+        print(f"Tokenizer '{TOKENIZER_ENCODING}' is not available, token counts are estimated: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Exact token count with tiktoken. Without it, falls back to a rough estimate
+    (words and punctuation marks), which is enough for relative decisions only.
+    """
+    encoder = _get_encoder()
+    if encoder is None:
+        return len(re.findall(r'\w+|[^\w\s]', text))
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+class RenderedPrompt:
+    """
+    Rendered prompt text with a lazily computed, cached token count.
+    """
+    __slots__ = ('text', '_tokens')
+
+    def __init__(self, text: str):
+        self.text = text
+        self._tokens: Optional[int] = None
+
+    @property
+    def tokens(self) -> int:
+        if self._tokens is None:
+            self._tokens = count_tokens(self.text)
+        return self._tokens
+
+    def __str__(self):
+        return self.text
+
+
+class Template:
+    """
+    A prompt file split once into static segments and placeholder slots.
+    Rendering copies the segment list, fills the slots and joins it: one string allocation
+    for the result plus one per joined list.
+    """
+
+    def __init__(self, name: str, source: str):
+        self.name = name
+        self._parts: List[str] = []
+        self._slots: List[Tuple[int, str, Optional[str]]] = []  # (part index, variable, join separator)
+        position = 0
+        for match in PLACEHOLDER_RE.finditer(source):
+            self._parts.append(source[position:match.start()])
+            separator, join_name, plain_name = match.groups()
+            self._slots.append((len(self._parts), join_name or plain_name, separator if join_name else None))
+            self._parts.append('')
+            position = match.end()
+        self._parts.append(source[position:])
+        self.variables = tuple(dict.fromkeys(slot[1] for slot in self._slots))
+        self._static_tokens: Optional[int] = None
+
+    @property
+    def static_tokens(self) -> int:
+        """
+        Tokens in the static segments, counted once per template.
+        """
+        if self._static_tokens is None:
+            self._static_tokens = sum(count_tokens(part) for part in self._parts if part)
+        return self._static_tokens
+
+    @property
+    def text(self) -> str:
+        """
+        The source of a template without placeholders.
+        """
+        if self._slots:
+            raise ValueError(f"Template '{self.name}' has placeholders: {', '.join(self.variables)}")
+        return self._parts[0]
+
+    def render(self, **values) -> str:
+        parts = self._parts[:]
+        for index, variable, separator in self._slots:
+            value = values[variable]
+            parts[index] = separator.join(value) if separator is not None else str(value)
+        return ''.join(parts)
+
+    def render_prompt(self, **values) -> RenderedPrompt:
+        return RenderedPrompt(self.render(**values))
+
+
+@lru_cache(maxsize=None)
+def load_template(name: str) -> Template:
+    """
+    Loads and compiles prompts/<name> once per process.
+    """
+    with open(os.path.join(PROMPTS_DIR, name), encoding='utf-8') as f:
+        return Template(name, f.read())
+
+
+def template_stats() -> Dict[str, int]:
+    """
+    Static token count of every template in PROMPTS_DIR.
+    """
+    return {
+        name: load_template(name).static_tokens
+        for name in sorted(os.listdir(PROMPTS_DIR)) if name.endswith('.txt')
+    }
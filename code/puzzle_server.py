@@ -0,0 +1,290 @@
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+CATEGORY_SIZE = 4
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# Puzzles kept ready per type
+QUEUE_SIZE = 50
+# Generation attempts on the request thread when a queue runs dry, before answering 503
+COLD_ATTEMPTS = 20
+PUZZLE_TYPES = ('io', 'fg')
+
+
+def make_dataset_generators() -> Dict[str, Callable[[], Optional[List[Dict]]]]:
+    """
+    Puzzle type -> function returning one puzzle as a list of {"name", "words"} categories
+    (a false group also has "initial"), using the datasets loaded once by get_datasets().
+    """
+    import dataset_io
+    import dataset_fg
+
+    data_by_category, data_by_word = dataset_io.get_datasets()
+
+    def intentional_overlap():
+        generated = dataset_io.generate_intentional_overlap(data_by_category, data_by_word)
+        return [{"name": name, "words": words} for name, words in generated]
+
+    def false_group():
+        generated = dataset_fg.generate_false_group(data_by_category, data_by_word)
+        if not generated:
+            return None
+        (initial_name, initial_words), related = generated
+        categories = [{"name": name, "words": words} for name, words in related]
+        return categories + [{"name": initial_name, "words": initial_words, "initial": True}]
+
+    return {'io': intentional_overlap, 'fg': false_group}
+
+
+def make_pool_generators(path: str) -> Dict[str, Callable[[], Optional[List[Dict]]]]:
+    import category_pool
+
+    pool = category_pool.CategoryPool(path)
+    lock = threading.Lock()  # one SQLite connection shared by the fillers
+
+    def intentional_overlap():
+        with lock:
+            generated = category_pool.assemble_intentional_overlap(pool)
+        return [{"name": name, "words": words} for name, words in generated]
+
+    def false_group():
+        with lock:
+            generated = category_pool.assemble_false_group(pool)
+        if not generated:
+            return None
+        (initial_name, initial_words), related = generated
+        categories = [{"name": name, "words": words} for name, words in related]
+        return categories + [{"name": initial_name, "words": initial_words, "initial": True}]
+
+    return {'io': intentional_overlap, 'fg': false_group}
+
+
+def validate_puzzle(puzzle_type: str, categories: Optional[List[Dict]]) -> bool:
+    """
+    Four groups of four words and no word used twice. In a false group the initial
+    category is made of the shared words, so only the related categories are checked.
+    """
+    if not categories:
+        return False
+    groups = [c for c in categories if not c.get("initial")]
+    if len(groups) != CATEGORY_SIZE or any(len(c["words"]) != CATEGORY_SIZE for c in groups):
+        return False
+    words = [w for c in groups for w in c["words"]]
+    if len(set(words)) != len(words):
+        return False
+    if puzzle_type == 'fg':
+        initial = [c for c in categories if c.get("initial")]
+        return len(initial) == 1 and set(initial[0]["words"]) <= set(words)
+    return True
+
+
+class PuzzleService:
+    """
+    Keeps a queue of validated puzzles per type, refilled by background threads, and counts
+    what happens to them. When a queue runs dry a puzzle is generated on the request thread,
+    up to cold_attempts tries.
+    """
+
+    def __init__(self, generators: Dict[str, Callable[[], Optional[List[Dict]]]],
+                 queue_size: int = QUEUE_SIZE, rank: Optional[Callable[[List[Dict]], List[Dict]]] = None,
+                 cold_attempts: int = COLD_ATTEMPTS):
+        self.generators = generators
+        self.rank = rank
+        self.cold_attempts = cold_attempts
+        self.queues = {name: queue.Queue(maxsize=queue_size) for name in generators}
+        self.started_at = time.time()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {name: {"generated": 0, "rejected": 0, "served": 0, "served_cold": 0, "unavailable": 0,
+                             "generation_seconds": 0.0, "serve_seconds": 0.0} for name in generators}
+
+    def _produce(self, puzzle_type: str) -> Optional[List[Dict]]:
+        started = time.perf_counter()
+        try:
+            puzzle = self.generators[puzzle_type]()
+        except Exception as e:
+            print(f"Error generating a '{puzzle_type}' puzzle: {e}")
+            puzzle = None
+        valid = validate_puzzle(puzzle_type, puzzle)
+        if valid and self.rank is not None:
+            puzzle = self.rank(puzzle)
+        with self._lock:
+            stats = self.stats[puzzle_type]
+            stats["generation_seconds"] += time.perf_counter() - started
+            stats["generated" if valid else "rejected"] += 1
+        return puzzle if valid else None
+
+    def _fill(self, puzzle_type: str):
+        puzzles = self.queues[puzzle_type]
+        while not self._stop.is_set():
+            puzzle = self._produce(puzzle_type)
+            if puzzle is None:
+                continue
+            while not self._stop.is_set():
+                try:
+                    puzzles.put(puzzle, timeout=0.5)
+                    break
+                except queue.Full:
+                    pass
+
+    def start(self, workers_per_type: int = 1):
+        for puzzle_type in self.generators:
+            for _ in range(workers_per_type):
+                threading.Thread(target=self._fill, args=(puzzle_type,), daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def get(self, puzzle_type: str) -> Optional[List[Dict]]:
+        """
+        A puzzle from the queue, or one generated now if the queue is empty.
+        None if cold_attempts generation attempts all failed.
+        """
+        started = time.perf_counter()
+        cold = False
+        try:
+            puzzle = self.queues[puzzle_type].get_nowait()
+        except queue.Empty:
+            cold = True
+            puzzle = None
+            for _ in range(self.cold_attempts):
+                puzzle = self._produce(puzzle_type)
+                if puzzle is not None:
+                    break
+        with self._lock:
+            stats = self.stats[puzzle_type]
+            if puzzle is None:
+                stats["unavailable"] += 1
+                return None
+            stats["served"] += 1
+            stats["served_cold"] += cold
+            stats["serve_seconds"] += time.perf_counter() - started
+        return puzzle
+
+    def metrics(self) -> Dict:
+        uptime = time.time() - self.started_at
+        result = {"uptime_seconds": round(uptime, 1), "types": {}}
+        with self._lock:
+            for puzzle_type, stats in self.stats.items():
+                attempts = stats["generated"] + stats["rejected"]
+                result["types"][puzzle_type] = {
+                    "queue_depth": self.queues[puzzle_type].qsize(),
+                    "queue_size": self.queues[puzzle_type].maxsize,
+                    "generated": stats["generated"],
+                    "rejected": stats["rejected"],
+                    "served": stats["served"],
+                    "served_cold": stats["served_cold"],
+                    "unavailable": stats["unavailable"],
+                    "generated_per_second": round(stats["generated"] / uptime, 2) if uptime else 0.0,
+                    "generation_ms_avg": round(stats["generation_seconds"] / attempts * 1000, 2) if attempts else 0.0,
+                    "serve_ms_avg": round(stats["serve_seconds"] / stats["served"] * 1000, 3) if stats["served"] else 0.0,
+                }
+        return result
+
+
+def make_handler(service: PuzzleService):
+    class PuzzleHandler(BaseHTTPRequestHandler):
+        # GET /puzzle/io, /puzzle/fg, /metrics, /health
+
+        def do_GET(self):
+            path = self.path.split('?', 1)[0].rstrip('/')
+            if path == '/health':
+                self._send(200, {"status": "ok"})
+            elif path == '/metrics':
+                self._send(200, service.metrics())
+            elif path.startswith('/puzzle/') and path[len('/puzzle/'):] in service.generators:
+                puzzle_type = path[len('/puzzle/'):]
+                categories = service.get(puzzle_type)
+                if categories is None:
+                    self._send(503, {"error": f"no '{puzzle_type}' puzzle could be generated"})
+                else:
+                    self._send(200, {"type": puzzle_type, "categories": categories})
+            else:
+                self._send(404, {"error": f"unknown path '{self.path}'"})
+
+        def _send(self, status: int, body: Dict):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+        def address_string(self):
+            # Unix socket clients have no (host, port) address
+            return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    return PuzzleHandler
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ('unix', 0)
+
+
+def make_ranker():
+    """
+    Orders categories from easy to difficult by navec similarity, like dataset_editing.
+    """
+    import dataset_editing
+
+    def rank(categories: List[Dict]) -> List[Dict]:
+        groups = [c for c in categories if not c.get("initial")]
+        scores = {id(c): dataset_editing.average_similarity(c["words"]) for c in groups}
+        ranked = sorted(groups, key=lambda c: scores[id(c)], reverse=True)
+        return ranked + [c for c in categories if c.get("initial")]
+
+    return rank
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_socket: Optional[str] = None,
+          queue_size: int = QUEUE_SIZE, pool_path: Optional[str] = None, rank: bool = False,
+          workers_per_type: int = 1):
+    """
+    Loads everything once, starts the fillers and serves until interrupted. Runs offline:
+    puzzles come from the dataset generators (or the category pool).
+    """
+    print("Warming up...")
+    generators = make_pool_generators(pool_path) if pool_path else make_dataset_generators()
+    ranker = None
+    if rank:
+        import resources
+
+        resources.get_navec()
+        ranker = make_ranker()
+    service = PuzzleService(generators, queue_size, ranker)
+    service.start(workers_per_type)
+
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = UnixHTTPServer(unix_socket, make_handler(service))
+        print(f"Serving puzzles on unix socket '{unix_socket}'")
+    else:
+        server = ThreadingHTTPServer((host, port), make_handler(service))
+        print(f"Serving puzzles on http://{host}:{port}/puzzle/io, /puzzle/fg, /metrics")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+        if unix_socket and os.path.exists(unix_socket):
+            os.remove(unix_socket)
+
+
+if __name__ == "__main__":
+    serve()
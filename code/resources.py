@@ -0,0 +1,59 @@
+import os
+from functools import lru_cache
+
+MY_KEY = "API_KEY"
+# upload from https://github.com/natasha/navec
+NAVEC_PATH = 'navec_hudlit_v1_12B_500K_300d_100q.tar'
+# Project vocabulary extracted from the full model by compact_embeddings.py
+COMPACT_NAVEC_PATH = 'navec_compact.npz'
+
+
+@lru_cache(maxsize=1)
+def get_client():
+    """
+    OpenAI client shared by the LLM modules, created on first use.
+    """
+    from openai import OpenAI
+
+    return OpenAI(api_key=MY_KEY)
+
+
+@lru_cache(maxsize=1)
+def get_full_navec():
+    """
+    The full navec model (the model takes seconds to load).
+    """
+    from navec import Navec
+
+    return Navec.load(NAVEC_PATH)
+
+
+@lru_cache(maxsize=1)
+def get_navec():
+    """
+    Navec embeddings shared by all modules, loaded on first use: the compact model if it was
+    extracted (words missing from it are looked up in the full model), else the full one.
+    """
+    if os.path.exists(COMPACT_NAVEC_PATH):
+        from compact_embeddings import CompactNavec
+
+        fallback = get_full_navec if os.path.exists(NAVEC_PATH) else None
+        return CompactNavec.load(COMPACT_NAVEC_PATH, fallback)
+    return get_full_navec()
+
+
+def navec_available() -> bool:
+    return os.path.exists(COMPACT_NAVEC_PATH) or os.path.exists(NAVEC_PATH)
+
+
+def load_word_bank(path: str = "nyt_connections.csv"):
+    """
+    Unique lower-case words of the NYT Connections archive, used to seed LLM games.
+    """
+    import pandas as pd
+
+    df = pd.read_csv(path)
+    word_list = []
+    for words in df['words']:
+        word_list.extend([w.strip().lower() for w in words.split(",")])
+    return list(set(word_list))
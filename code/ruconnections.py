@@ -0,0 +1,393 @@
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+# Heavy modules (pandas, sklearn, navec, openai) are imported only by the subcommand that needs them,
+# so '--help' and the dataset generators start without paying for them.
+
+# (puzzle type, source) -> (module, default output file)
+GENERATORS = {
+    ('io', 'dataset'): ('dataset_io', 'dataset_io.txt'),
+    ('fg', 'dataset'): ('dataset_fg', 'dataset_fg.txt'),
+    ('io', 'llm'): ('llm_io', 'llm_io.txt'),
+    ('fg', 'llm'): ('llm_fg', 'llm_fg.txt'),
+    ('io', 'llm-game'): ('llm_game', 'llm_game_io.txt'),
+    ('io', 'hybrid'): ('llm+dataset', 'llm_io_ds.txt'),
+    ('io', 'pool'): ('category_pool', 'pool_io.txt'),
+    ('fg', 'pool'): ('category_pool', 'pool_fg.txt'),
+    ('io', 'solver'): ('overlap_solver', 'solver_io.txt'),
+    ('io', 'batch'): ('batch_generator', 'batch_io.txt'),
+    ('fg', 'batch'): ('batch_generator', 'batch_fg.txt'),
+}
+
+STARTUP_LOG_PATH = 'startup_times.jsonl'
+STARTUP_REPEATS = 5
+# Command lines timed by 'bench startup'
+STARTUP_COMMANDS = [
+    ['--help'],
+    ['generate', 'io', '--source', 'dataset'],
+    ['generate', 'fg', '--source', 'dataset'],
+    ['generate', 'io', '--source', 'llm'],
+    ['generate', 'fg', '--source', 'llm'],
+    ['generate', 'io', '--source', 'hybrid'],
+    ['edit', 'in.txt', 'out.txt'],
+    ['rank', 'in.txt', 'out.txt'],
+    ['translate'],
+]
+
+
+def generator_module(args) -> str:
+    key = (args.type, args.source)
+    if key not in GENERATORS:
+        raise SystemExit(f"No generator for type '{args.type}' with source '{args.source}'")
+    return GENERATORS[key][0]
+
+
+def set_word_filters(args):
+    if args.max_rank is not None or args.exclude_oov:
+        import dataset_io
+
+        dataset_io.MAX_WORD_RANK = args.max_rank
+        dataset_io.EXCLUDE_OOV_WORDS = args.exclude_oov
+
+
+def add_word_filter_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--max-rank', type=int,
+                        help="dataset generators: drop words rarer than this frequency rank")
+    parser.add_argument('--exclude-oov', action='store_true',
+                        help="dataset generators: drop words missing from navec")
+
+
+def run_generate(args):
+    set_word_filters(args)
+    module = importlib.import_module(generator_module(args))
+    output = args.output or GENERATORS[(args.type, args.source)][1]
+    if args.best_of:
+        if args.source != 'dataset':
+            raise SystemExit("--best-of works with the dataset source only")
+        import difficulty
+
+        target = difficulty.DifficultyTarget(easiest_min=args.easiest_min, hardest_max=args.hardest_max)
+        difficulty.difficulty_pipeline(args.type, args.runs, args.output or f"dataset_{args.type}_targeted.txt",
+                                       target, args.best_of, args.workers)
+    elif args.source == 'solver':
+        module.intentional_overlap_pipeline(args.runs, output, args.time_budget)
+    elif args.source in ('dataset', 'pool', 'batch'):
+        weights = None
+        if args.adaptive and args.source == 'dataset':
+            import adaptive_weights
+
+            weights = adaptive_weights.enable(args.adaptive_path)
+        if args.type == 'io':
+            module.intentional_overlap_pipeline(args.runs, output)
+        else:
+            module.false_group_pipeline(args.runs, output)
+        if weights is not None:
+            weights.save()
+            print(f"Adaptive weights saved to '{weights.path}'")
+    elif args.source == 'llm-game':
+        from resources import load_word_bank
+
+        module.intentional_overlap_pipeline(load_word_bank(args.word_bank), args.runs, output, args.candidates)
+    elif args.source == 'llm':
+        from resources import load_word_bank
+
+        word_bank = load_word_bank(args.word_bank)
+        if args.type == 'io':
+            module.intentional_overlap_pipeline(word_bank, args.runs, output, args.stream)
+        else:
+            module.false_group_pipeline(word_bank, args.runs, output, args.stream)
+    else:
+        from seed_index import get_seed_index
+
+        module.intentional_overlap_pipeline_ambiguous(get_seed_index(), args.runs, output)
+
+
+def run_pool(args):
+    import category_pool
+    import resources
+
+    navec = None
+    if not args.no_navec and resources.navec_available():
+        navec = resources.get_navec()
+    category_pool.build_pool(args.path, navec, args.groups)
+
+
+def run_navec(args):
+    import compact_embeddings
+
+    compact_embeddings.build_compact(args.output, args.head, args.word_bank)
+
+
+def run_serve(args):
+    import puzzle_server
+
+    set_word_filters(args)
+    puzzle_server.serve(args.host, args.port, args.unix_socket, args.queue_size, args.pool, args.rank, args.workers)
+
+
+def run_edit(args):
+    import llm_editing
+
+    batch_client = None
+    if args.batch == 'local':
+        batch_client = llm_editing.LocalBatchClient(llm_editing.get_client())
+    elif args.batch == 'openai':
+        batch_client = llm_editing.OpenAIBatchClient(llm_editing.get_client())
+    llm_editing.main(args.input, args.output, batch_client, not args.edit_all)
+
+
+def run_rank(args):
+    import dataset_editing
+
+    dataset_editing.main(args.input, args.output)
+    print(f"Results saved to '{args.output}'")
+
+
+def run_translate(args):
+    import llm_translation
+
+    games = llm_translation.load_nyt_games(args.input)
+    memo = llm_translation.TranslationMemo(args.memo)
+    llm_translation.save_translated(llm_translation.translate_games(games, memo), args.output)
+
+
+def run_bench(args):
+    if args.target == 'startup':
+        bench_startup(args.repeat, args.log)
+    elif args.target == 'navec':
+        import compact_embeddings
+
+        compact_embeddings.benchmark_load()
+    elif args.target == 'llm-modes':
+        import llm_game
+        from resources import load_word_bank
+
+        llm_game.compare_modes(load_word_bank(args.word_bank), args.games, args.candidates)
+    elif args.target == 'batch':
+        import batch_generator
+
+        batch_generator.benchmark(args.batch_size)
+    elif args.target == 'llm':
+        import bench_llm
+        from fake_openai import FakeConfig
+
+        output = args.output or bench_llm.BENCH_OUTPUT_PATH
+        if args.compare:
+            bench_llm.compare(output, args.compare)
+        else:
+            config = FakeConfig(args.latency, args.latency_median, args.latency_spread, args.throttle_rate,
+                                args.malformed_rate, seed=args.seed)
+            bench_llm.run_benchmark(config, args.pipelines, args.games, args.concurrency, args.stream, output,
+                                    args.verbose)
+    elif args.compare:
+        import bench_datasets
+
+        bench_datasets.compare(args.output or bench_datasets.BENCH_OUTPUT_PATH, args.compare)
+    else:
+        import bench_datasets
+
+        bench_datasets.run_benchmark(args.seeds, args.runs, args.output or bench_datasets.BENCH_OUTPUT_PATH,
+                                     args.profile, args.adaptive_path if args.adaptive else None)
+
+
+# Modules a command line imports before it starts working; used by '--startup-only'
+def startup_modules(args) -> List[str]:
+    if args.command == 'generate':
+        return [generator_module(args)]
+    return {
+        'edit': ['llm_editing'],
+        'rank': ['dataset_editing'],
+        'translate': ['llm_translation'],
+        'pool': ['category_pool'],
+        'navec': ['compact_embeddings'],
+        'serve': ['puzzle_server'],
+    }.get(args.command, [])
+
+
+def measure_startup(argv: List[str], repeat: int) -> float:
+    """
+    Median wall time in ms of a fresh interpreter parsing argv and importing what the command needs.
+    """
+    script = os.path.abspath(__file__)
+    extra = [] if argv == ['--help'] else ['--startup-only']
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, script] + extra + argv, stdout=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - started) * 1000)
+    times.sort()
+    return times[len(times) // 2]
+
+
+def load_last_record(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    last = None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                last = json.loads(line)
+    return last
+
+
+def bench_startup(repeat: int = STARTUP_REPEATS, log_path: str = STARTUP_LOG_PATH) -> Dict[str, float]:
+    """
+    Times the startup of every command in STARTUP_COMMANDS and appends the results to log_path
+    (one JSON record per run), printing the change against the previous record.
+    """
+    from bench_datasets import current_commit
+
+    previous = load_last_record(log_path)
+    previous_results = previous["results"] if previous else {}
+    results = {}
+    for argv in STARTUP_COMMANDS:
+        name = ' '.join(argv)
+        results[name] = round(measure_startup(argv, repeat), 1)
+        line = f"{name:<40} {results[name]:8.1f} ms"
+        if name in previous_results:
+            line += f"  ({results[name] - previous_results[name]:+.1f} ms)"
+        print(line)
+
+    record = {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "commit": current_commit(),
+        "python": sys.version.split()[0],
+        "repeat": repeat,
+        "results": results
+    }
+    with open(log_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"Startup times appended to '{log_path}'")
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='ruconnections', description="Russian Connections puzzle tools")
+    parser.add_argument('--startup-only', action='store_true', help=argparse.SUPPRESS)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate = subparsers.add_parser('generate', help="generate puzzles")
+    generate.add_argument('type', choices=['io', 'fg'], help="intentional overlap or false group")
+    generate.add_argument('--source', choices=['dataset', 'llm', 'llm-game', 'hybrid', 'pool', 'solver', 'batch'],
+                          default='dataset',
+                          help="'pool' assembles puzzles from a pool built by the 'pool' command; "
+                               "'llm-game' asks for the whole game in one request")
+    generate.add_argument('-n', '--runs', type=int, default=5, help="number of puzzles")
+    generate.add_argument('-o', '--output', help="output file (the script's default name if omitted)")
+    generate.add_argument('--stream', action='store_true', help="stream LLM answers (llm source only)")
+    generate.add_argument('--word-bank', default='nyt_connections.csv', help="NYT archive used as the word bank")
+    generate.add_argument('--candidates', type=int, default=4,
+                          help="llm-game source: candidate games sampled per request")
+    generate.add_argument('--adaptive', action='store_true',
+                          help="dataset source: sample subtypes with learned weights and update them")
+    generate.add_argument('--time-budget', type=float, default=0.5,
+                          help="solver source: search time per puzzle, seconds")
+    generate.add_argument('--best-of', type=int, metavar='N',
+                          help="dataset source: generate N candidates per puzzle and keep the one closest "
+                               "to the target difficulty profile")
+    generate.add_argument('--easiest-min', type=float, help="--best-of: minimum cohesion of the easiest group")
+    generate.add_argument('--hardest-max', type=float, help="--best-of: maximum cohesion of the hardest group")
+    generate.add_argument('--workers', type=int, default=1, help="--best-of: processes generating candidates")
+    generate.add_argument('--adaptive-path', default='adaptive_weights.json', help="learned subtype weights")
+    add_word_filter_arguments(generate)
+    generate.set_defaults(func=run_generate)
+
+    pool = subparsers.add_parser('pool', help="build the scored category pool")
+    pool.add_argument('--path', default='category_pool.sqlite')
+    pool.add_argument('--groups', type=int, default=8, help="candidate groups per category")
+    pool.add_argument('--no-navec', action='store_true', help="build without cohesion scores")
+    pool.set_defaults(func=run_pool)
+
+    navec = subparsers.add_parser('navec', help="extract the compact navec model for the project vocabulary")
+    navec.add_argument('--output', default='navec_compact.npz')
+    navec.add_argument('--head', type=int, default=20000, help="most frequent navec words kept as well")
+    navec.add_argument('--word-bank', default='nyt_connections.csv', help="NYT archive whose words are kept")
+    navec.set_defaults(func=run_navec)
+
+    serve = subparsers.add_parser('serve', help="serve puzzles over HTTP from warm in-memory generators")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--unix-socket', help="listen on a Unix socket instead of TCP")
+    serve.add_argument('--queue-size', type=int, default=50, help="ready puzzles kept per type")
+    serve.add_argument('--workers', type=int, default=1, help="filler threads per type")
+    serve.add_argument('--pool', help="assemble puzzles from this category pool instead of the datasets")
+    serve.add_argument('--rank', action='store_true', help="order categories by navec similarity")
+    add_word_filter_arguments(serve)
+    serve.set_defaults(func=run_serve)
+
+    edit = subparsers.add_parser('edit', help="edit and rank LLM puzzles")
+    edit.add_argument('input')
+    edit.add_argument('output')
+    edit.add_argument('--batch', choices=['none', 'local', 'openai'], default='none',
+                      help="one request per game, a local batch stand-in or the OpenAI batch endpoint")
+    edit.add_argument('--edit-all', action='store_true',
+                      help="send every game to the editor, not only the ones the local checks find problems in")
+    edit.set_defaults(func=run_edit)
+
+    rank = subparsers.add_parser('rank', help="rank puzzle categories by embedding similarity")
+    rank.add_argument('input')
+    rank.add_argument('output')
+    rank.set_defaults(func=run_rank)
+
+    translate = subparsers.add_parser('translate', help="translate NYT games")
+    translate.add_argument('--input', default='nyt_connections.csv')
+    translate.add_argument('--output', default='translated.txt')
+    translate.add_argument('--memo', default='translation_memo.json')
+    translate.set_defaults(func=run_translate)
+
+    bench = subparsers.add_parser('bench', help="run benchmarks")
+    bench.add_argument('target', nargs='?', choices=['startup', 'datasets', 'batch', 'navec', 'llm-modes', 'llm'],
+                       default='startup')
+    bench.add_argument('--repeat', type=int, default=STARTUP_REPEATS, help="startup: runs per command")
+    bench.add_argument('--log', default=STARTUP_LOG_PATH, help="startup: file the results are appended to")
+    bench.add_argument('--seeds', type=int, nargs='+', help="datasets: random seeds")
+    bench.add_argument('--runs', type=int, default=200, help="datasets: puzzles per seed and generator")
+    bench.add_argument('--output', help="datasets, llm: results file (bench_datasets.json, bench_llm.json)")
+    bench.add_argument('--games', type=int, default=10, help="llm-modes, llm: games per mode or pipeline")
+    bench.add_argument('--pipelines', nargs='+', choices=['io', 'fg', 'ambiguous'],
+                       help="llm: LLM pipelines to drive against the fake API (all by default)")
+    bench.add_argument('--concurrency', type=int, default=1, help="llm: games generated in parallel")
+    bench.add_argument('--stream', action='store_true', help="llm: stream the answers (io and fg)")
+    bench.add_argument('--latency', choices=['fixed', 'uniform', 'lognormal'], default='lognormal',
+                       help="llm: latency distribution of the fake API")
+    bench.add_argument('--latency-median', type=float, default=0.2, help="llm: median latency, seconds")
+    bench.add_argument('--latency-spread', type=float, default=0.5,
+                       help="llm: relative half-width (uniform) or log-scale deviation (lognormal)")
+    bench.add_argument('--throttle-rate', type=float, default=0.0,
+                       help="llm: share of requests answered with 429")
+    bench.add_argument('--malformed-rate', type=float, default=0.0,
+                       help="llm: share of answers without the answer format block")
+    bench.add_argument('--seed', type=int, help="llm: seed of the fake API's random draws")
+    bench.add_argument('--verbose', action='store_true', help="llm: show the pipelines' output")
+    bench.add_argument('--candidates', type=int, default=4, help="llm-modes: candidates per single-call request")
+    bench.add_argument('--word-bank', default='nyt_connections.csv',
+                       help="llm-modes: NYT archive used as the word bank")
+    bench.add_argument('--batch-size', type=int, default=4096, help="batch: puzzles built in lockstep")
+    bench.add_argument('--profile', action='store_true',
+                       help="datasets: collect counters and timers, write '<generator>.folded' flame graph stacks")
+    bench.add_argument('--adaptive', action='store_true',
+                       help="datasets: sample subtypes with the learned weights (not saved)")
+    bench.add_argument('--adaptive-path', default='adaptive_weights.json', help="datasets: learned subtype weights")
+    bench.add_argument('--compare', metavar='BASELINE',
+                       help="datasets, llm: compare the results file with a baseline instead of running")
+    bench.set_defaults(func=run_bench)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = build_parser().parse_args(argv)
+    if args.startup_only:
+        for name in startup_modules(args):
+            importlib.import_module(name)
+        return
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
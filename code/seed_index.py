@@ -0,0 +1,183 @@
+import csv
+import json
+import os
+import random
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+AMBIGUOUS_PATH = 'ambiguous.csv'
+SEED_INDEX_PATH = 'seed_index.json'
+
+# A sense category is useful only if it can fill a whole prompt request (8 words)
+MIN_SENSE_CATEGORY_SIZE = 8
+
+
+def load_ambiguous(path: str = AMBIGUOUS_PATH) -> Dict[str, List[str]]:
+    """
+    Reads the polysemy dataset: word -> list of its senses (hypernyms).
+    """
+    result = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        reader = csv.DictReader(f, delimiter=";")
+        for row in reader:
+            word = row["word"].strip()
+            hypernym = row["hypernym"].strip()
+            result[word].append(hypernym)
+    return dict(result)
+
+
+class AliasSampler:
+    """
+    Walker's alias method: O(n) setup, O(1) weighted draw.
+    """
+
+    def __init__(self, weights: List[float]):
+        n = len(weights)
+        total = sum(weights)
+        scaled = [w * n / total for w in weights]
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+
+    def draw(self, rng=random) -> int:
+        i = rng.randrange(len(self.prob))
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+
+def score_word(
+        word: str,
+        senses: List[str],
+        data_by_category: Dict[str, Dict[str, Dict[str, Set[str]]]],
+        data_by_word: Dict[str, Dict[str, Dict[str, Set[str]]]]
+) -> int:
+    """
+    Number of distinct well-populated categories the word can be used in: its senses that
+    exist as meaning categories and every dataset category that already contains the word.
+    """
+    categories = set()
+    for subtypes in data_by_category.get('meaning', {}).values():
+        for sense in senses:
+            sense = sense.upper()
+            if len(subtypes.get(sense, ())) >= MIN_SENSE_CATEGORY_SIZE:
+                categories.add(('meaning', sense))
+
+    upper_word = word.upper()
+    for main_type, subtypes in data_by_word.items():
+        for subtype, word_to_cats in subtypes.items():
+            for cat in word_to_cats.get(upper_word, ()):
+                if len(data_by_category[main_type][subtype][cat]) >= MIN_SENSE_CATEGORY_SIZE:
+                    categories.add((main_type, cat))
+    return len(categories)
+
+
+class SeedIndex:
+    """
+    Polysemous seed words with their senses and productivity scores, sampled in O(1)
+    proportionally to the score. Words without any populated sense category are left out.
+    """
+
+    def __init__(self, words: List[str], senses: List[List[str]], scores: List[int]):
+        self.words = words
+        self.senses = senses
+        self.scores = scores
+        self._sampler = AliasSampler([float(s) for s in scores]) if words else None
+
+    def __len__(self):
+        return len(self.words)
+
+    @classmethod
+    def build(
+            cls,
+            ambiguous: Dict[str, List[str]],
+            data_by_category: Dict[str, Dict[str, Dict[str, Set[str]]]],
+            data_by_word: Dict[str, Dict[str, Dict[str, Set[str]]]]
+    ) -> 'SeedIndex':
+        words, senses, scores = [], [], []
+        for word, word_senses in ambiguous.items():
+            score = score_word(word, word_senses, data_by_category, data_by_word)
+            if score > 0:
+                words.append(word)
+                senses.append(word_senses)
+                scores.append(score)
+        if not words:
+            # No overlap with the datasets at all: fall back to uniform sampling
+            words = list(ambiguous)
+            senses = [ambiguous[w] for w in words]
+            scores = [1] * len(words)
+        return cls(words, senses, scores)
+
+    def sample(self, k: int, rng=random) -> List[Tuple[str, List[str]]]:
+        """
+        k distinct (word, senses) pairs, weighted by score.
+        """
+        k = min(k, len(self.words))
+        chosen = []
+        seen = set()
+        while len(chosen) < k:
+            i = self._sampler.draw(rng)
+            if i not in seen:
+                seen.add(i)
+                chosen.append((self.words[i], self.senses[i]))
+        return chosen
+
+    def save(self, path: str = SEED_INDEX_PATH, fingerprint: Optional[List[Tuple[str, int, int]]] = None):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"fingerprint": fingerprint, "words": self.words, "senses": self.senses,
+                       "scores": self.scores}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str = SEED_INDEX_PATH, fingerprint: Optional[List[Tuple[str, int, int]]] = None
+             ) -> Optional['SeedIndex']:
+        """
+        Saved index, or None if there is none or ambiguous.csv or a dataset changed since it was built.
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        # JSON turns the fingerprint tuples into lists
+        if data.get("fingerprint") != json.loads(json.dumps(fingerprint)):
+            return None
+        return cls(data["words"], data["senses"], data["scores"])
+
+
+def sources_fingerprint(ambiguous_path: str = AMBIGUOUS_PATH, data_dir: str = 'datasets'
+                        ) -> List[Tuple[str, int, int]]:
+    """
+    (path, size, mtime) of ambiguous.csv and of every dataset CSV the index is built from.
+    """
+    from word_stats import datasets_fingerprint
+
+    fingerprint = datasets_fingerprint(data_dir)
+    if os.path.exists(ambiguous_path):
+        stat = os.stat(ambiguous_path)
+        fingerprint.append((ambiguous_path, stat.st_size, int(stat.st_mtime)))
+    return fingerprint
+
+
+def get_seed_index(ambiguous_path: str = AMBIGUOUS_PATH, path: str = SEED_INDEX_PATH,
+                   rebuild: bool = False) -> SeedIndex:
+    """
+    Loads the precomputed index, or builds it from ambiguous.csv and the bundled datasets,
+    also when one of them changed since the index was saved.
+    """
+    fingerprint = sources_fingerprint(ambiguous_path)
+    if not rebuild:
+        index = SeedIndex.load(path, fingerprint)
+        if index is not None:
+            return index
+
+    import dataset_io
+
+    data_by_category, data_by_word = dataset_io.get_datasets()
+    index = SeedIndex.build(load_ambiguous(ambiguous_path), data_by_category, data_by_word)
+    index.save(path, fingerprint)
+    print(f"Seed index with {len(index)} words saved to '{path}'")
+    return index
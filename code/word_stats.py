@@ -0,0 +1,166 @@
+import os
+import pickle
+from array import array
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+CATEGORY_SIZE = 4
+WORD_STATS_PATH = 'word_stats.pkl'
+RANK_SOURCE_NAVEC = 'navec'
+RANK_SOURCE_DATASETS = 'datasets'
+
+
+def datasets_fingerprint(data_dir: str) -> List[Tuple[str, int, int]]:
+    """
+    (path, size, mtime) of every dataset CSV, so saved stats are recomputed when a file changes.
+    """
+    result = []
+    for root, _, files in os.walk(data_dir):
+        for name in files:
+            if name.endswith('.csv'):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                result.append((path, stat.st_size, int(stat.st_mtime)))
+    return sorted(result)
+
+
+class WordStats:
+    """
+    Frequency rank (0 is the most frequent) and out-of-vocabulary flag of every dataset word.
+    Ranks come from the order of the navec vocabulary, which is sorted by corpus frequency;
+    without the full model they come from the number of dataset categories a word is in.
+    """
+
+    def __init__(self, words: List[str], ranks: array, oov: bytearray, rank_source: str):
+        self.words = words
+        self.ranks = ranks
+        self.oov = oov
+        self.rank_source = rank_source
+        self.ids: Dict[str, int] = {word: i for i, word in enumerate(words)}
+
+    def __len__(self):
+        return len(self.words)
+
+    def rank(self, word: str) -> Optional[int]:
+        i = self.ids.get(word)
+        return None if i is None else self.ranks[i]
+
+    def is_oov(self, word: str) -> bool:
+        i = self.ids.get(word)
+        return i is not None and bool(self.oov[i])
+
+    @classmethod
+    def build(cls, data_by_word: Dict[str, Dict[str, Dict[str, Set[str]]]], navec=None,
+              vocabulary: Optional[List[str]] = None) -> 'WordStats':
+        """
+        vocabulary: navec's frequency-ordered words (navec.vocab.words); navec: any model
+        supporting 'word in navec', used for the OOV flags.
+        """
+        occurrences = Counter()
+        for subtypes in data_by_word.values():
+            for word_to_cats in subtypes.values():
+                for word, categories in word_to_cats.items():
+                    occurrences[word] += len(categories)
+        words = sorted(occurrences)
+
+        if vocabulary is not None:
+            positions = {word: i for i, word in enumerate(vocabulary)}
+            beyond = len(vocabulary)
+            ranks = array('I', [positions.get(word.lower(), beyond) for word in words])
+            rank_source = RANK_SOURCE_NAVEC
+        else:
+            by_count = sorted(words, key=lambda word: (-occurrences[word], word))
+            positions = {word: i for i, word in enumerate(by_count)}
+            ranks = array('I', [positions[word] for word in words])
+            rank_source = RANK_SOURCE_DATASETS
+
+        oov = bytearray(len(words))
+        if navec is not None:
+            for i, word in enumerate(words):
+                oov[i] = word.lower() not in navec
+        return cls(words, ranks, oov, rank_source)
+
+    def keep(self, max_rank: Optional[int] = None, exclude_oov: bool = False) -> Callable[[str], bool]:
+        """
+        Predicate for prune_datasets: words at most max_rank and, with exclude_oov, in navec.
+        """
+        def keep_word(word: str) -> bool:
+            i = self.ids.get(word)
+            if i is None:
+                return True
+            if exclude_oov and self.oov[i]:
+                return False
+            return max_rank is None or self.ranks[i] <= max_rank
+
+        return keep_word
+
+    def save(self, path: str, fingerprint: List[Tuple[str, int, int]]):
+        with open(path, 'wb') as f:
+            pickle.dump((fingerprint, self.words, self.ranks, self.oov, self.rank_source), f)
+
+    @classmethod
+    def load(cls, path: str, fingerprint: List[Tuple[str, int, int]]) -> Optional['WordStats']:
+        """
+        Saved stats, or None if there are none or the datasets or models changed since they were computed.
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            saved_fingerprint, words, ranks, oov, rank_source = pickle.load(f)
+        if saved_fingerprint != fingerprint:
+            return None
+        return cls(words, ranks, oov, rank_source)
+
+
+def get_word_stats(data_by_word: Dict[str, Dict[str, Dict[str, Set[str]]]], data_dir: str = 'datasets',
+                   path: str = WORD_STATS_PATH) -> WordStats:
+    """
+    Stats saved next to the datasets snapshot at path, computed and saved on first use or when
+    a dataset file or a navec model changed (ranks and OOV flags depend on the models).
+    The navec models are only loaded when the stats are computed.
+    """
+    from lexicon import sources_fingerprint
+
+    fingerprint = sources_fingerprint(data_dir)
+    stats = WordStats.load(path, fingerprint)
+    if stats is not None:
+        return stats
+
+    import resources
+
+    print("Computing word frequency ranks and OOV flags...")
+    navec = resources.get_navec() if resources.navec_available() else None
+    vocabulary = None
+    if os.path.exists(resources.NAVEC_PATH):
+        vocabulary = resources.get_full_navec().vocab.words
+    stats = WordStats.build(data_by_word, navec, vocabulary)
+    stats.save(path, fingerprint)
+    print(f"Word stats for {len(stats)} words ({stats.rank_source} ranks, {sum(stats.oov)} OOV) "
+          f"saved to '{path}'")
+    return stats
+
+
+def prune_datasets(
+        data_by_category: Dict[str, Dict[str, Dict[str, Set[str]]]],
+        keep: Callable[[str], bool]
+) -> Tuple[Dict[str, Dict[str, Dict[str, Set[str]]]], Dict[str, Dict[str, Dict[str, Set[str]]]]]:
+    """
+    Datasets without the words keep rejects and without the categories left with fewer than
+    CATEGORY_SIZE words, with data_by_word rebuilt to match.
+    """
+    pruned_by_category = {}
+    pruned_by_word = {}
+    for main_type, subtypes in data_by_category.items():
+        for subtype, categories in subtypes.items():
+            kept_categories = {}
+            word_to_cats: Dict[str, Set[str]] = {}
+            for category, words in categories.items():
+                kept = {word for word in words if keep(word)}
+                if len(kept) < CATEGORY_SIZE:
+                    continue
+                kept_categories[category] = kept
+                for word in kept:
+                    word_to_cats.setdefault(word, set()).add(category)
+            pruned_by_category.setdefault(main_type, {})[subtype] = kept_categories
+            pruned_by_word.setdefault(main_type, {})[subtype] = word_to_cats
+    return pruned_by_category, pruned_by_word
@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+import adaptive_weights
+import dataset_fg
+import dataset_io
+from adaptive_weights import AdaptiveWeights, MAX_FACTOR, MIN_FACTOR
+
+
+class FixedBeta:
+    def __init__(self, value):
+        self.value = value
+
+    def betavariate(self, alpha, beta):
+        return self.value
+
+
+def test_factor_is_clamped():
+    weights = AdaptiveWeights({'fg|form|a|0': [10.0, 10.0]})
+    weights.rng = FixedBeta(1.0)
+    assert weights.factor('fg', 'form', 'a', 0) == pytest.approx(2.0)
+    weights.rng = FixedBeta(0.999)
+    weights.record('fg', [('form', 'b', 0)] * 200, False)
+    assert weights.factor('fg', 'form', 'a', 0) == MAX_FACTOR
+    weights.rng = FixedBeta(0.0)
+    assert weights.factor('fg', 'form', 'a', 0) == MIN_FACTOR
+
+
+def test_record_halves_old_observations(monkeypatch):
+    monkeypatch.setattr(adaptive_weights, 'MAX_OBSERVATIONS', 10)
+    weights = AdaptiveWeights()
+    weights.record('io', [('form', 'a', 1)] * 11, True)
+    assert weights.arms['io|form|a|1'] == [5.5, 0.0]
+    assert weights._totals['io'] == [5.5, 0.0]
+
+
+def test_save_load_round_trip(tmp_path):
+    path = str(tmp_path / "weights.json")
+    weights = AdaptiveWeights(path=path)
+    weights.record('fg', [('form', 'a', 0), ('meaning', 'b', 2)], True)
+    weights.record('fg', [('form', 'a', 0)], False)
+    weights.save()
+    loaded = AdaptiveWeights.load(path)
+    assert loaded.arms == {'fg|form|a|0': [1.0, 1.0], 'fg|meaning|b|2': [1.0, 0.0]}
+    assert loaded._totals == weights._totals
+    assert loaded.success_rates() == weights.success_rates()
+    assert AdaptiveWeights.load(str(tmp_path / "missing.json")).arms == {}
+
+
+class FixedFactors:
+    def __init__(self, factors):
+        self.factors = factors
+
+    def factor(self, generator, main_type, subtype, tier):
+        return self.factors[subtype]
+
+
+def test_related_search_order_prefers_productive_subtypes(monkeypatch):
+    data_by_word = {'form': {'good': {'КОТ': {'A'}}, 'bad': {'КОТ': {'B'}}, 'other': {'ПЁС': {'C'}}}}
+    monkeypatch.setattr(dataset_io, 'ADAPTIVE_WEIGHTS', FixedFactors({'good': 4.0, 'bad': 0.25}))
+    random.seed(0)
+    orders = [dataset_fg.related_search_order('КОТ', ['form'], data_by_word, 1) for _ in range(200)]
+    assert all(main_type == 'form' and sorted(subtypes) == ['bad', 'good'] for main_type, subtypes in orders)
+    assert sum(subtypes[0] == 'good' for _, subtypes in orders) > 170
+    assert dataset_fg.related_search_order('ЁЖ', ['form'], data_by_word, 1) is None
+
+
+def test_false_group_records_every_pick_by_tier(monkeypatch, tmp_path):
+    initial = ['КОТ', 'ПЁС', 'ЁЖ', 'УЖ']
+    data_by_category = {
+        'meaning': {'animals': {'ЖИВОТНЫЕ': set(initial)}},
+        'form': {'short': {f"С {word}": {word} | {f"{word}{i}" for i in range(3)} for word in initial}},
+    }
+    data_by_word = {}
+    for main_type, subtypes in data_by_category.items():
+        for subtype, categories in subtypes.items():
+            for name, words in categories.items():
+                for word in words:
+                    data_by_word.setdefault(main_type, {}).setdefault(subtype, {}).setdefault(word, set()).add(name)
+    weights = AdaptiveWeights(path=str(tmp_path / "weights.json"))
+    monkeypatch.setattr(dataset_io, 'ADAPTIVE_WEIGHTS', weights)
+    monkeypatch.setattr(dataset_io, 'HYPERNYM_CLOSURE', None)
+    monkeypatch.setattr(dataset_io, 'EDGE_WEIGHTS', {})
+
+    random.seed(1)
+    assert dataset_fg.generate_false_group(data_by_category, data_by_word) is not None
+    assert weights.arms['fg|meaning|animals|0'][0] == 1
+    for tier in range(1, 5):
+        assert weights.arms[f'fg|form|short|{tier}'][0] == 1
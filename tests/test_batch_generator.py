@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+import dataset_io
+from batch_generator import BatchGenerator, BatchIndex
+from hypernym_closure import HypernymClosure
+
+WORDS = [f"С{i:02}" for i in range(48)]
+
+
+def toy_datasets():
+    rng = random.Random(0)
+    hypernyms = {
+        'ЖИВОТНЫЕ': set(rng.sample(WORDS, 5)) | {'ПТИЦЫ'},
+        'ПТИЦЫ': set(rng.sample(WORDS, 6)),
+        'РЫБЫ': set(rng.sample(WORDS, 6)),
+    }
+    associations = {f"АССОЦИАЦИИ {c}": set(rng.sample(WORDS, 6)) for c in range(8)}
+    anagrams = {f"АНАГРАММЫ {c}": set(rng.sample(WORDS, 6)) for c in range(12)}
+    return {'meaning': {'hypernyms': hypernyms, 'associations': associations}, 'form': {'anagrams': anagrams}}
+
+
+@pytest.fixture
+def datasets(monkeypatch):
+    data_by_category = toy_datasets()
+    closure = HypernymClosure.build(data_by_category['meaning']['hypernyms'])
+    monkeypatch.setattr(dataset_io, 'HYPERNYM_CLOSURE', closure)
+    categories = {name: (main_type, words) for main_type, subtypes in data_by_category.items()
+                  for categories in subtypes.values() for name, words in categories.items()}
+    return BatchGenerator(BatchIndex(data_by_category), seed=0), categories, closure
+
+
+def conflicts(closure, groups):
+    """
+    Groups related to an earlier one, or with a word under an earlier one (the contract of hypernym_conflict).
+    """
+    return [name for i, (name, words) in enumerate(groups) for earlier, _ in groups[:i]
+            if closure.related(name, earlier) or any(closure.is_under(word, earlier) for word in words)]
+
+
+def test_batch_intentional_overlap_puzzles_are_valid(datasets):
+    generator, categories, closure = datasets
+    batch = generator.intentional_overlap(300)
+    puzzles = generator.to_intentional_overlap(batch, check_conflicts=True)
+    assert puzzles
+    # The toy hierarchy makes some batch puzzles conflict; the check drops exactly those
+    assert len(generator.to_intentional_overlap(batch)) > len(puzzles)
+    for puzzle in puzzles:
+        assert len(puzzle) == 4
+        assert len({name for name, _ in puzzle}) == 4
+        words = [word for _, group in puzzle for word in group]
+        assert len(words) == len(set(words)) == 16
+        assert categories[puzzle[0][0]][0] == 'meaning'
+        for name, group in puzzle:
+            assert set(group) <= categories[name][1]
+        assert conflicts(closure, puzzle) == []
+
+
+def test_batch_false_group_puzzles_are_valid(datasets):
+    generator, categories, closure = datasets
+    batch = generator.false_group(300)
+    puzzles = generator.to_false_group(batch, check_conflicts=True)
+    assert puzzles
+    assert len(generator.to_false_group(batch)) > len(puzzles)
+    for (initial_name, initial_words), related in puzzles:
+        assert len(set(initial_words)) == 4 and set(initial_words) <= categories[initial_name][1]
+        assert len({initial_name} | {name for name, _ in related}) == 5
+        words = [word for _, group in related for word in group]
+        assert len(words) == len(set(words)) == 16
+        assert [group[0] for _, group in related] == initial_words
+        for name, group in related:
+            assert set(group) <= categories[name][1]
+            assert categories[name][0] != categories[initial_name][0]
+        # The shared first word is meant to fit both categories
+        assert conflicts(closure, [(initial_name, [])] + [(name, group[1:]) for name, group in related]) == []
@@ -0,0 +1,54 @@
+import random
+from collections import Counter
+
+import pytest
+
+import category_pool
+import dataset_io
+
+
+def toy_datasets():
+    data_by_category = {'form': {}, 'meaning': {'things': {}}}
+    for subtype in ('collocations', 'anagrams', 'prefixes'):
+        data_by_category['form'][subtype] = {
+            f"{subtype} {c}": {f"{subtype[:3].upper()}{c}{w}" for w in range(5)} for c in range(6)}
+    data_by_category['meaning']['things'] = {f"ВЕЩИ {c}": {f"ВЕЩ{c}{w}" for w in range(5)} for c in range(6)}
+    data_by_word = {}
+    for main_type, subtypes in data_by_category.items():
+        for subtype, categories in subtypes.items():
+            for name, words in categories.items():
+                for word in words:
+                    data_by_word.setdefault(main_type, {}).setdefault(subtype, {}).setdefault(word, set()).add(name)
+    return data_by_category, data_by_word
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_io, 'get_datasets', toy_datasets)
+    monkeypatch.setattr(dataset_io, 'HYPERNYM_CLOSURE', None)
+    monkeypatch.setattr(dataset_io, 'ADAPTIVE_WEIGHTS', None)
+    monkeypatch.setattr(dataset_io, 'FORM_SUBTYPE_WEIGHTS', {'collocations': 4, 'anagrams': 1, 'prefixes': 0})
+    path = str(tmp_path / "pool.sqlite")
+    category_pool.build_pool(path, groups_per_category=3)
+    return category_pool.CategoryPool(path)
+
+
+def test_random_group_follows_subtype_weights(pool):
+    rng = random.Random(0)
+    subtypes = Counter()
+    for _ in range(2000):
+        name, words = pool.random_group('form', set(), set(), rng)
+        assert len(set(words)) == category_pool.CATEGORY_SIZE
+        subtypes[name.split()[0]] += 1
+    assert subtypes['prefixes'] == 0
+    # Both subtypes have as many groups, so they are drawn 4:1 like in dataset_io
+    assert 3.3 < subtypes['collocations'] / subtypes['anagrams'] < 4.8
+
+
+def test_random_group_skips_used_words_and_categories(pool):
+    rng = random.Random(0)
+    used_categories = {f"ВЕЩИ {c}" for c in range(5)}
+    name, words = pool.random_group('meaning', set(), used_categories, rng)
+    assert name == "ВЕЩИ 5"
+    assert pool.random_group('meaning', {f"ВЕЩ5{w}" for w in range(5)}, used_categories, rng) is None
+    assert pool.random_group('missing', set(), set(), rng) is None
@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+import dataset_io
+from hypernym_closure import HypernymClosure
+
+
+def test_edge_weights_never_draw_zero_strength_edges():
+    weights = dataset_io.EdgeWeights.build({'КОТ': [('A', 0.0), ('B', 1.0), ('C', 0.5), ('D', 0.0)]})
+    random.seed(0)
+    for _ in range(200):
+        assert sorted(weights.sample('КОТ', {'A', 'B', 'C', 'D'}, 2)) == ['B', 'C']
+    assert weights.sample('КОТ', {'A', 'B', 'C', 'D'}, 3) is None
+    assert weights.sample('ПЁС', {'A'}, 1) is None
+
+
+def test_weight_cutoff_must_be_positive():
+    with pytest.raises(ValueError):
+        dataset_io.load_datasets_with_subtypes(weight_cutoff=0)
+
+
+@pytest.fixture
+def closure(monkeypatch):
+    closure = HypernymClosure.build({
+        'ЖИВОТНЫЕ': ['ПТИЦЫ', 'КОШКА', 'СОБАКА', 'КОРОВА'],
+        'ПТИЦЫ': ['ВОРОНА', 'СОРОКА', 'ГРАЧ', 'ДРОЗД'],
+    })
+    monkeypatch.setattr(dataset_io, 'HYPERNYM_CLOSURE', closure)
+    monkeypatch.setattr(dataset_io, 'ADAPTIVE_WEIGHTS', None)
+    monkeypatch.setattr(dataset_io, 'EDGE_WEIGHTS', {})
+    return closure
+
+
+def test_pick_random_category_skips_conflicting_categories(closure):
+    data = {'meaning': {'hypernyms': {
+        'ЖИВОТНЫЕ': {'КОШКА', 'СОБАКА', 'КОРОВА', 'ВОРОНА', 'СОРОКА'},
+        'ПТИЦЫ': {'ВОРОНА', 'СОРОКА', 'ГРАЧ', 'ДРОЗД'},
+        'ЧЁРНОЕ': {'ВОРОНА', 'ГРАЧ', 'УГОЛЬ', 'НОЧЬ', 'САЖА'},
+        'МЕБЕЛЬ': {'СТОЛ', 'СТУЛ', 'ШКАФ', 'ДИВАН'},
+    }}}
+    random.seed(0)
+    for _ in range(100):
+        main_type, subtype, name, words = dataset_io.pick_random_category('meaning', data, set(), {'ЖИВОТНЫЕ'})
+        assert name == 'МЕБЕЛЬ'
+
+    del data['meaning']['hypernyms']['МЕБЕЛЬ']
+    data['meaning']['hypernyms']['ЧЁРНОЕ'].discard('САЖА')
+    assert dataset_io.pick_random_category('meaning', data, set(), {'ЖИВОТНЫЕ'}) is None
@@ -0,0 +1,111 @@
+import random
+
+import pytest
+
+import dataset_io
+import dataset_salvage
+import llm_fg
+import llm_io
+from dataset_salvage import SEPARATOR
+
+DATA_BY_CATEGORY = {
+    'meaning': {'hypernyms': {'ЖИВОТНЫЕ': {'КОТ', 'ПЁС', 'ЁЖ', 'УЖ', 'ЛИС'}}},
+    'form': {'anagrams': {'АНАГРАММЫ': {'КОТ', 'ТОК', 'КТО', 'ОТК', 'ТКО'}}},
+}
+GAME_WORDS = [['КОТ', 'А1', 'А2', 'А3'], ['Б1', 'Б2', 'Б3', 'Б4'], ['В1', 'В2', 'В3', 'В4'], ['Г1', 'Г2', 'Г3', 'Г4']]
+
+
+def by_word(data_by_category):
+    data_by_word = {}
+    for main_type, subtypes in data_by_category.items():
+        for subtype, categories in subtypes.items():
+            for name, words in categories.items():
+                for word in words:
+                    data_by_word.setdefault(main_type, {}).setdefault(subtype, {}).setdefault(word, set()).add(name)
+    return data_by_word
+
+
+@pytest.fixture
+def datasets(monkeypatch):
+    monkeypatch.setattr(dataset_io, 'get_datasets', lambda: (DATA_BY_CATEGORY, by_word(DATA_BY_CATEGORY)))
+    monkeypatch.setattr(dataset_io, 'HYPERNYM_CLOSURE', None)
+    monkeypatch.setattr(dataset_io, 'ADAPTIVE_WEIGHTS', None)
+    monkeypatch.setattr(dataset_io, 'EDGE_WEIGHTS', {})
+    random.seed(0)
+
+
+def test_salvage_step_overlaps_a_game_word(datasets):
+    word, category, words = dataset_salvage.salvage_step({'ОБЩЕЕ': GAME_WORDS[0]})
+    assert word == 'КОТ'
+    main_type = 'form' if category == 'АНАГРАММЫ' else 'meaning'
+    subtype, = DATA_BY_CATEGORY[main_type]
+    assert set(words) == DATA_BY_CATEGORY[main_type][subtype][category] - {'КОТ'}
+    # Both categories with КОТ are in the game already
+    game = {'ОБЩЕЕ': GAME_WORDS[0], 'АНАГРАММЫ': ['ТОК', 'КТО', 'ОТК', 'ТКО'], 'ЖИВОТНЫЕ': ['ПЁС', 'ЁЖ', 'УЖ', 'ЛИС']}
+    assert dataset_salvage.salvage_step(game) is None
+
+
+def stub_llm_io(monkeypatch, failing_steps):
+    """
+    LLM steps 1-4 of llm_io answer with GAME_WORDS, the ones in failing_steps raise.
+    """
+    step = iter(range(1, 100))
+    answers = {}
+
+    def generate(*args):
+        n = next(step)
+        if n in failing_steps:
+            raise ValueError(f"no answer block in step {n}")
+        answers[n] = n
+        return n
+
+    monkeypatch.setattr(llm_io, 'gen_initial_group', generate)
+    monkeypatch.setattr(llm_io, 'gen_overlap_group', generate)
+    monkeypatch.setattr(llm_io, 'parse_initial_response', lambda n: (f"КАТЕГОРИЯ {n}", GAME_WORDS[0]))
+    monkeypatch.setattr(llm_io, 'parse_overlap_response', lambda n: ('А1', f"КАТЕГОРИЯ {n}", GAME_WORDS[n - 1]))
+    monkeypatch.setattr(llm_io, 'validate_words', lambda category, words, need: words)
+    monkeypatch.setattr(llm_io, 'pick_closest_four', lambda words: words[:4])
+
+
+def test_failed_step_is_filled_from_the_datasets(datasets, monkeypatch, tmp_path):
+    stub_llm_io(monkeypatch, failing_steps={3})
+    path = str(tmp_path / "io.txt")
+    llm_io.intentional_overlap_pipeline(['СЛОВО'] * 4, 1, path)
+
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    assert "3. АНАГРАММЫ: " in text or "3. ЖИВОТНЫЕ: " in text
+    assert "4. КАТЕГОРИЯ 4: " in text
+    assert text.count(SEPARATOR.strip()) == 1
+
+
+def test_incomplete_runs_get_one_separator(datasets, monkeypatch, tmp_path):
+    # Steps 2-4 fail: 2 and 3 are salvaged, 4 has nothing left to salvage and no retries left
+    monkeypatch.setattr(llm_io, 'LLM_RETRY_BUDGET', 0)
+    stub_llm_io(monkeypatch, failing_steps={2, 3, 4})
+    path = str(tmp_path / "io.txt")
+    llm_io.intentional_overlap_pipeline(['СЛОВО'] * 4, 1, path)
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    assert "3. " in text and "4. " not in text
+    assert text.count(SEPARATOR.strip()) == 1
+
+
+def test_false_group_stopped_early_gets_one_separator(monkeypatch, tmp_path):
+    monkeypatch.setattr(llm_fg, 'gen_initial_group', lambda words: ("КОРЕНЬ", GAME_WORDS[0]))
+    monkeypatch.setattr(llm_fg, 'parse_response', lambda raw: raw)
+    monkeypatch.setattr(llm_fg, 'validate_words', lambda category, words, need, **kwargs: words)
+    monkeypatch.setattr(llm_fg, 'pick_closest', lambda words, num: list(words[:num]))
+    # Only the first false group request of the first run is answered
+    answers = iter([("КАТЕГОРИЯ 1", GAME_WORDS[1])])
+    monkeypatch.setattr(llm_fg, 'gen_false_group', lambda *args: next(answers))
+    path = str(tmp_path / "fg.txt")
+
+    llm_fg.false_group_pipeline(['СЛОВО'] * 4, 2, path)
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    # Run 1 has its root and one false group, run 2 only its root: each is closed once
+    runs = text.split(SEPARATOR)
+    assert len(runs) == 3 and runs[-1] == ""
+    assert "--- Run 1 ---" in runs[0] and "1. КАТЕГОРИЯ 1" in runs[0]
+    assert runs[1].strip() == "КОРНЕВАЯ КАТЕГОРИЯ. КОРЕНЬ: КОТ, А1, А2, А3"
@@ -0,0 +1,84 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import difficulty
+
+NAMES = ['А', 'Б', 'В', 'Г']
+
+
+def random_navec(words, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    navec = {'<unk>': np.zeros(dim, dtype=np.float32)}
+    for word in words:
+        navec[word.lower()] = rng.normal(size=dim).astype(np.float32)
+    return navec
+
+
+def puzzle(groups, initial=None):
+    result = [{"name": name, "words": words} for name, words in zip(NAMES, groups)]
+    if initial is not None:
+        result.insert(0, {"name": "НАЧАЛО", "words": initial, "initial": True})
+    return result
+
+
+def cosine(a, b):
+    return float(a @ b / np.linalg.norm(a) / np.linalg.norm(b))
+
+
+def reference_scores(groups, navec):
+    vectors = [[navec[w.lower()] for w in group if w.lower() in navec] for group in groups]
+    cohesion = [np.mean([cosine(a, b) for a, b in itertools.combinations(v, 2)]) for v in vectors]
+    cross = max(np.mean([cosine(a, b) for a in vectors[i] for b in vectors[j]])
+                for i, j in itertools.permutations(range(4), 2))
+    return cohesion, cross
+
+
+def test_scores_match_a_direct_computation():
+    puzzles = [[[f"С{p}{g}{w}" for w in range(4)] for g in range(4)] for p in range(3)]
+    # Puzzles share words, so the word rows are looked up once for all of them
+    puzzles[1][2] = puzzles[0][0]
+    navec = random_navec({w for groups in puzzles for group in groups for w in group})
+    scores = difficulty.score_puzzles([puzzle(groups) for groups in puzzles], navec)
+
+    for n, groups in enumerate(puzzles):
+        cohesion, cross = reference_scores(groups, navec)
+        assert scores["group_cohesion"][n] == pytest.approx(cohesion, abs=1e-5)
+        assert scores["cohesion"][n] == pytest.approx(sorted(cohesion, reverse=True), abs=1e-5)
+        assert scores["confusability"][n] == pytest.approx(cross, abs=1e-5)
+        assert scores["oov"][n] == 0
+        word = groups[1][2]
+        others = [navec[w.lower()] for w in groups[3]]
+        assert scores["word_affinity"][n, 1 * 4 + 2, 3] == pytest.approx(
+            np.mean([cosine(navec[word.lower()], v) for v in others]), abs=1e-5)
+
+
+def test_oov_words_padding_and_initial_group():
+    groups = [[f"С{g}{w}" for w in range(4)] for g in range(4)]
+    navec = random_navec([w for group in groups for w in group if w != "С00"])
+    # The initial category of a false group is not a group the player sorts, so it is not scored
+    fg = puzzle(groups, initial=["НЕТ1", "НЕТ2", "НЕТ3", "НЕТ4"])
+    short = puzzle([group[:3] if g == 3 else group for g, group in enumerate(groups)])
+    scores = difficulty.score_puzzles([fg, short], navec)
+
+    assert list(scores["oov"]) == [1, 1]
+    # The OOV word and the missing fourth word leave their groups scored over the present words
+    cohesion, _ = reference_scores(groups, navec)
+    assert scores["group_cohesion"][0] == pytest.approx(cohesion, abs=1e-5)
+    assert scores["group_cohesion"][1, 3] == pytest.approx(
+        reference_scores(groups[:3] + [groups[3][:3]], navec)[0][3], abs=1e-5)
+    assert not scores["word_affinity"][0, 0].any()
+    assert not scores["word_affinity"][1, 15].any()
+
+
+def test_separated_groups_are_cohesive_and_not_confusable():
+    groups = [[f"С{g}{w}" for w in range(4)] for g in range(4)]
+    navec = {'<unk>': np.zeros(4, dtype=np.float32)}
+    for g, group in enumerate(groups):
+        for word in group:
+            navec[word.lower()] = np.eye(4, dtype=np.float32)[g]
+    scores = difficulty.score_puzzles([puzzle(groups)], navec)
+    assert scores["cohesion"][0] == pytest.approx([1, 1, 1, 1])
+    assert scores["confusability"][0] == pytest.approx(0)
+    assert (scores["word_affinity"][0].argmax(axis=1) == np.repeat(np.arange(4), 4)).all()
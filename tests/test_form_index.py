@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import dataset_io
+import resources
+from form_index import build_form_index, distinct_stems, form_classes, navec_words
+
+
+def test_distinct_stems_keeps_the_shortest_word_per_root():
+    assert distinct_stems(['МУЗЫКА', 'МУЗЫКАНТЫ', 'МУЗЫКУ', 'МУЗЫКАЛЬНОСТЬ', 'МУЗЕЙ']) == {'МУЗЫКА', 'МУЗЕЙ'}
+
+
+def test_same_root_words_do_not_make_a_class():
+    words = ['МУЗЫКА', 'МУЗЫКАНТЫ', 'МУЗЫКУ', 'МУЗЫКАЛЬНОСТЬ', 'МУЗЫРЬКА', 'МУЗЫЧОК']
+    assert 'НАЧИНАЮТСЯ НА МУЗЫ-' in form_classes(words)['prefixes']
+    assert build_form_index(words)['prefixes'] == {}
+    index = build_form_index(words + ['МУЗЫЛЬНИК'])
+    assert index['prefixes'] == {'НАЧИНАЮТСЯ НА МУЗЫ-': {'МУЗЫКА', 'МУЗЫРЬКА', 'МУЗЫЧОК', 'МУЗЫЛЬНИК'}}
+
+
+def test_vowel_classes_are_named_by_vowel_order():
+    index = build_form_index(['КОЛОКОЛ', 'МОЛОКО', 'МОРОЗОВ', 'ПОЛОТНО', 'КАРАНДАШ'])
+    assert index['vowel_patterns'] == {'ГЛАСНЫЕ ПО ПОРЯДКУ О-О-О': {'КОЛОКОЛ', 'МОЛОКО', 'МОРОЗОВ', 'ПОЛОТНО'}}
+
+
+def fake_navec(words):
+    return SimpleNamespace(vocab=SimpleNamespace(words=['<pad>', '<unk>'] + words))
+
+
+def test_navec_words_of_full_and_compact_models():
+    assert navec_words(fake_navec(['молоко', 'колокол']), max_rank=2) == ['<PAD>', '<UNK>', 'МОЛОКО']
+    assert navec_words(SimpleNamespace(words=['мороз'])) == ['МОРОЗ']
+    assert navec_words(SimpleNamespace(words=None)) == []
+
+
+def test_form_index_over_navec_words(tmp_path, monkeypatch):
+    data_by_word = {'meaning': {'things': {word: {'ВЕЩИ'} for word in ['КОЛОКОЛ', 'МОЛОКО']}}}
+    monkeypatch.setattr(dataset_io, 'load_datasets_with_subtypes', lambda edge_weights: ({}, data_by_word))
+    monkeypatch.setattr(dataset_io, 'USE_HYPERNYM_CLOSURE', False)
+    monkeypatch.setattr(dataset_io, 'FORM_INDEX_NAVEC_WORDS', True)
+    monkeypatch.setattr(dataset_io, '_DATASETS', None)
+    monkeypatch.chdir(tmp_path)
+    open(resources.NAVEC_PATH, 'wb').close()
+    monkeypatch.setattr(resources, 'get_full_navec', lambda: fake_navec(['порошок', 'полотно', 'небо']))
+
+    data_by_category, _ = dataset_io.get_datasets()
+    assert data_by_category['form']['vowel_patterns'] == {
+        'ГЛАСНЫЕ ПО ПОРЯДКУ О-О-О': {'КОЛОКОЛ', 'МОЛОКО', 'ПОРОШОК', 'ПОЛОТНО'}}
@@ -0,0 +1,82 @@
+import numpy as np
+
+import game_verifier
+from hypernym_closure import HypernymClosure
+from lexicon import Lexicon, SOURCE_DATASET, SOURCE_NAVEC
+
+GAME = {
+    'ЖИВОТНЫЕ': ['КОШКА', 'СОБАКА', 'МЫШЬ', 'КРЫСА'],
+    'МЕБЕЛЬ': ['СТОЛ', 'СТУЛ', 'ШКАФ', 'ДИВАН'],
+    'ВОДОЁМЫ': ['РЕКА', 'МОРЕ', 'ОЗЕРО', 'ПРУД'],
+    'ЦВЕТА': ['КРАСНЫЙ', 'СИНИЙ', 'ЖЁЛТЫЙ', 'ЗЕЛЁНЫЙ'],
+}
+WORDS = [word for words in GAME.values() for word in words]
+
+
+def lexicon(words=WORDS, sources=SOURCE_DATASET | SOURCE_NAVEC):
+    return Lexicon.build({word.replace('Ё', 'Е'): sources for word in words})
+
+
+def fake_navec(game):
+    # One axis per group, so every group is cohesive and far from the others
+    navec = {'<unk>': np.zeros(len(game), dtype=np.float32)}
+    for g, words in enumerate(game.values()):
+        for word in words:
+            vector = np.full(len(game), 0.01, dtype=np.float32)
+            vector[g] = 1.0
+            navec[word.lower()] = vector
+    return navec
+
+
+def test_clean_game_has_no_problems(monkeypatch):
+    monkeypatch.setattr(game_verifier, 'get_lexicon', lexicon)
+    assert game_verifier.verify_games([GAME], fake_navec(GAME), use_datasets=False) == [[]]
+
+
+def test_structure_problems():
+    game = dict(GAME)
+    game['ЦВЕТА'] = ['КОШКА', 'СИНИЙ', 'ЖЁЛТЫЙ']
+    problems = game_verifier.structure_problems(game)
+    assert "group size: ЦВЕТА has 3 words" in problems
+    assert "duplicate: КОШКА" in problems
+
+
+def test_lexicon_problems():
+    problems = game_verifier.lexicon_problems(GAME, lexicon([w for w in WORDS if w != 'ПРУД']))
+    assert problems == ["oov: ПРУД"]
+
+
+def test_dataset_problems():
+    word_categories = {'КОШКА': {'ЖИВОТНЫЕ', 'МЕБЕЛЬ'}}
+    closure = HypernymClosure.build({'ЦВЕТА': ['СИНИЙ'], 'ВОДОЁМЫ': ['СИНИЙ']})
+    problems = game_verifier.dataset_problems(GAME, word_categories, closure)
+    assert "swap: КОШКА also fits МЕБЕЛЬ (datasets)" in problems
+    assert "hypernym: ЦВЕТА overlaps another category" in problems
+
+
+def test_embedding_problems_find_swapped_words():
+    navec = fake_navec(GAME)
+    game = {name: list(words) for name, words in GAME.items()}
+    game['ЖИВОТНЫЕ'][0], game['МЕБЕЛЬ'][0] = game['МЕБЕЛЬ'][0], game['ЖИВОТНЫЕ'][0]
+    problems = game_verifier.embedding_problems([GAME, game], navec)
+    assert problems[0] == []
+    assert any(p.startswith("swap: СТОЛ is closer to МЕБЕЛЬ") for p in problems[1])
+    assert any(p.startswith("swap: КОШКА is closer to ЖИВОТНЫЕ") for p in problems[1])
+
+
+def test_route_games_sends_only_games_with_problems(monkeypatch):
+    monkeypatch.setattr(game_verifier, 'get_lexicon', lexicon)
+    broken = dict(GAME)
+    broken['ЦВЕТА'] = ['КРАСНЫЙ', 'СИНИЙ', 'ЖЁЛТЫЙ', 'КОШКА']
+    to_edit, problems = game_verifier.route_games([GAME, broken, GAME], use_datasets=False)
+    assert to_edit == [1]
+    assert problems[0] == [] and problems[2] == []
+
+
+def test_route_games_without_navec(monkeypatch):
+    # A lexicon built without navec has no embedding flags: words are only checked against the datasets
+    monkeypatch.setattr(game_verifier, 'get_lexicon', lambda: lexicon([w for w in WORDS if w != 'ПРУД'],
+                                                                      SOURCE_DATASET))
+    to_edit, problems = game_verifier.route_games([GAME, GAME], None, use_datasets=False)
+    assert to_edit == [0, 1]
+    assert problems[0] == ["oov: ПРУД"]
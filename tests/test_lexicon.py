@@ -0,0 +1,119 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+import dataset_io
+import lexicon
+import resources
+from lexicon import (Lexicon, MinimalPerfectHash, SOURCE_DATASET, SOURCE_NAVEC, check_word, hash_word,
+                     select_valid_words)
+
+WORDS = ["КОШКА", "СОБАКА", "МЫШЬ", "КРЫСА", "СТОЛ", "СТУЛ", "ШКАФ", "ДИВАН", "ЕЖ", "ЕЛКА", "ПОЛ-ЛИТРА"]
+
+
+def random_words(count, seed=0):
+    rng = random.Random(seed)
+    letters = "АБВГДЕЖЗИКЛМНОПРСТУФХЦЧШЩЭЮЯ"
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 10))))
+    return sorted(words)
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 10, 1000])
+def test_perfect_hash_maps_keys_to_distinct_slots(count):
+    hashes = [hash_word(word) for word in random_words(count)]
+    mph = MinimalPerfectHash.build(hashes)
+    assert sorted(mph.slot(hashed) for hashed in hashes) == list(range(count))
+
+
+def test_lexicon_round_trip(tmp_path):
+    lexicon = Lexicon.build({word: SOURCE_DATASET | SOURCE_NAVEC for word in WORDS})
+    path = tmp_path / "lexicon.pkl"
+    fingerprint = [("datasets/a.csv", 10, 20)]
+    lexicon.save(path, fingerprint)
+    loaded = Lexicon.load(path, fingerprint)
+
+    assert len(loaded) == len(WORDS)
+    assert sorted(loaded.index(word) for word in WORDS) == list(range(len(WORDS)))
+    for word in WORDS:
+        assert word in loaded
+        assert loaded.word_sources(word) == SOURCE_DATASET | SOURCE_NAVEC
+    # Lookups are normalized like the build
+    assert "кошка" in loaded
+    assert "Ёлка" in loaded
+    assert Lexicon.load(path, [("datasets/a.csv", 10, 21)]) is None
+
+
+def test_unknown_words_are_rejected():
+    lexicon = Lexicon.build({word: SOURCE_DATASET for word in WORDS})
+    unknown = [word for word in random_words(2000, seed=1) if word not in WORDS]
+    assert not any(word in lexicon for word in unknown)
+    assert Lexicon.build({}).index("КОШКА") is None
+
+
+def test_check_word_reasons():
+    lexicon = Lexicon.build({"КОШКА": SOURCE_DATASET | SOURCE_NAVEC, "СТОЛ": SOURCE_DATASET})
+    assert check_word(" кошка ", lexicon, require_embedding=True) is None
+    assert check_word("СТОЛ", lexicon) is None
+    assert check_word("СТОЛ", lexicon, require_embedding=True) == 'no-embedding'
+    assert check_word("СОБАКА", lexicon) == 'oov'
+    assert check_word("ЧЁРНАЯ КОШКА", lexicon) == 'multi-word'
+    assert check_word("КОШКА (ЖИВОТНОЕ)", lexicon) == 'parenthetical'
+    assert check_word("CAT", lexicon) == 'malformed'
+
+
+def test_require_embedding_without_navec_raises():
+    lexicon = Lexicon.build({"КОШКА": SOURCE_DATASET})
+    with pytest.raises(ValueError):
+        check_word("КОШКА", lexicon, require_embedding=True)
+
+
+def test_select_valid_words_rerequests_once():
+    lexicon = Lexicon.build({word: SOURCE_DATASET for word in WORDS})
+    calls = []
+
+    def rerequest(valid, rejected, missing):
+        calls.append((valid, rejected, missing))
+        return ["ШКАФ", "НЕТТАКОГО"]
+
+    words = select_valid_words(["КОШКА", "кошка", "СОБАКА", "ЗЗЗЗ"], 3, lexicon, rerequest)
+    assert words == ["КОШКА", "СОБАКА", "ШКАФ"]
+    assert len(calls) == 1 and calls[0][2] == 1
+
+
+class FakeNavec:
+    def __init__(self, words):
+        self.vocab = type('Vocab', (), {'words': ['<pad>', '<unk>'] + words})()
+        self.vectors = {word: np.full(4, i, dtype=np.float32) for i, word in enumerate(self.vocab.words)}
+
+    def __contains__(self, word):
+        return word in self.vectors
+
+    def __getitem__(self, word):
+        return self.vectors[word]
+
+
+def test_lexicon_from_compact_model_alone(tmp_path, monkeypatch):
+    from compact_embeddings import CompactNavec
+
+    monkeypatch.chdir(tmp_path)
+    CompactNavec.build(FakeNavec(['кошка', 'собака']), ['стол'], head=10).save(resources.COMPACT_NAVEC_PATH)
+    assert not os.path.exists(resources.NAVEC_PATH)
+    data_by_word = {'main': {'sub': {word: {'ВЕЩИ'} for word in ["КОШКА", "СТОЛ", "СТУЛ"]}}}
+    monkeypatch.setattr(dataset_io, 'get_datasets', lambda: ({}, data_by_word))
+    monkeypatch.setattr(lexicon, '_LEXICON', None)
+    resources.get_navec.cache_clear()
+    try:
+        built = lexicon.get_lexicon(path=str(tmp_path / "lexicon.pkl"))
+    finally:
+        resources.get_navec.cache_clear()
+
+    assert built.has_embeddings
+    assert check_word("КОШКА", built, require_embedding=True) is None
+    assert check_word("СОБАКА", built, require_embedding=True) is None
+    assert check_word("СТУЛ", built, require_embedding=True) == 'no-embedding'
+    # The compact model is part of the fingerprint, so the saved lexicon is rebuilt when it changes
+    assert (resources.COMPACT_NAVEC_PATH,) == tuple(p for p, _, _ in lexicon.sources_fingerprint()[-1:])
@@ -0,0 +1,58 @@
+import json
+from types import SimpleNamespace
+
+import llm_editing
+
+GAMES = [
+    {"A": ["1", "2", "3", "4"], "B": ["5", "6", "7", "8"], "C": ["9", "10", "11", "12"], "D": ["13", "14", "15", "16"]},
+    {"E": ["1", "2", "3", "4"], "F": ["5", "6", "7", "8"], "G": ["9", "10", "11", "12"], "H": ["13", "14", "15", "16"]},
+    {"I": ["1", "2", "3", "4"], "J": ["5", "6", "7", "8"], "K": ["9", "10", "11", "12"], "L": ["13", "14", "15", "16"]},
+]
+EDITED = "1. НОВАЯ: А, Б, В, Г\n2. ВТОРАЯ: Д, Е, Ж, З\n3. ТРЕТЬЯ: И, К, Л, М\n4. ЧЕТВЁРТАЯ: Н, О, П, Р"
+
+
+def ok_line(index, content):
+    body = {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]}
+    return {"custom_id": f"game-{index}", "response": {"status_code": 200, "body": body}, "error": None}
+
+
+def write_lines(path, lines):
+    with open(path, 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        f.write("\n")
+
+
+def test_join_batch_results_out_of_order_and_failed(tmp_path):
+    path = tmp_path / "output.jsonl"
+    write_lines(path, [
+        ok_line(2, EDITED),
+        {"custom_id": "game-0", "response": None, "error": {"message": "server error"}},
+        {"custom_id": "game-1", "response": {"status_code": 500, "body": {}}, "error": None},
+    ])
+    edited = llm_editing.join_batch_results(GAMES, path)
+    assert edited[0] == GAMES[0]
+    assert edited[1] == GAMES[1]
+    assert list(edited[2]) == ["НОВАЯ", "ВТОРАЯ", "ТРЕТЬЯ", "ЧЕТВЁРТАЯ"]
+
+
+def test_join_batch_results_keeps_unparsable_answers(tmp_path):
+    path = tmp_path / "output.jsonl"
+    write_lines(path, [ok_line(1, "Не могу отредактировать"), ok_line(0, EDITED)])
+    edited = llm_editing.join_batch_results(GAMES, path)
+    assert edited[0]["НОВАЯ"] == ["А", "Б", "В", "Г"]
+    assert edited[1] == GAMES[1]
+    assert edited[2] == GAMES[2]
+
+
+def test_openai_batch_poll_reads_the_error_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    error_line = json.dumps({"custom_id": "game-0", "response": None, "error": {"message": "bad"}})
+    batch = SimpleNamespace(status="completed", output_file_id=None, error_file_id="file-err")
+    client = SimpleNamespace(
+        batches=SimpleNamespace(retrieve=lambda batch_id: batch),
+        files=SimpleNamespace(content=lambda file_id: SimpleNamespace(text=error_line + "\n")),
+    )
+    status, path = llm_editing.OpenAIBatchClient(client).poll("batch-1")
+    assert status == "completed"
+    assert llm_editing.join_batch_results(GAMES[:1], path) == GAMES[:1]
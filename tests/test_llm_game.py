@@ -0,0 +1,58 @@
+import pytest
+
+from llm_game import parse_game_response, validate_game
+
+GAME = {
+    'ПТИЦЫ': ['ГРАЧ', 'ДРОЗД', 'СОКОЛ', 'ЧАЙКА'],
+    'РЕКИ': ['ВОЛГА', 'ОКА', 'ДОН', 'УРАЛ'],
+    'ГОРЫ': ['ЭЛЬБРУС', 'КАЗБЕК', 'АЛТАЙ', 'ХИБИНЫ'],
+    'ФАМИЛИИ ПИСАТЕЛЕЙ': ['ГОГОЛЬ', 'ЧЕХОВ', 'БУНИН', 'ТОЛСТОЙ'],
+}
+
+
+def response(game, overlaps):
+    lines = []
+    for i, (name, words) in enumerate(game.items(), 1):
+        lines += [f"Категория {i}: {name}", f"Слова {i}: {', '.join(words)}"]
+    return "\n".join(lines + [f"Пересечения: {overlaps}"])
+
+
+def test_last_draft_wins():
+    draft = {f"ЧЕРНОВИК {i}": [f"С{i}{w}" for w in range(4)] for i in range(1, 5)}
+    text = "Сначала набросок:\n" + response(draft, "С10 (1 -> 2)") + "\n\nИтог:\n" + \
+        response(GAME, "ГРАЧ (1 -> 4), ДОН (2 -> 3)")
+    game, overlaps = parse_game_response(text)
+    assert game == GAME
+    assert overlaps == [('ГРАЧ', 1, 4), ('ДОН', 2, 3)]
+    assert validate_game(game, overlaps) is None
+
+
+def test_missing_category_line_is_an_error():
+    text = response(GAME, "ГРАЧ (1 -> 4)").replace("Категория 3:", "Категория:")
+    with pytest.raises(ValueError):
+        parse_game_response(text)
+
+
+def test_bad_overlap_numbers():
+    assert validate_game(GAME, [('ГРАЧ', 1, 1)]) == "overlap ГРАЧ: bad category numbers"
+    assert validate_game(GAME, [('ГРАЧ', 1, 5)]) == "overlap ГРАЧ: bad category numbers"
+    assert validate_game(GAME, [('ГРАЧ', 0, 2)]) == "overlap ГРАЧ: bad category numbers"
+    assert validate_game(GAME, [('ГРАЧ', 2, 4)]) == "overlap ГРАЧ: not in category 2"
+    assert validate_game(GAME, []) == 'no overlaps'
+    # Without overlaps asked for, only the groups are checked
+    assert validate_game(GAME) is None
+
+
+def test_repeated_words():
+    game = dict(GAME, РЕКИ=['ВОЛГА', 'ОКА', 'ДОН', 'грач '])
+    assert validate_game(game) == 'repeated word'
+    game = dict(GAME, РЕКИ=['ВОЛГА', 'ОКА', 'ОКА', 'УРАЛ'])
+    assert validate_game(game) == 'repeated word'
+    game = dict(GAME, ГОРЫ=['ЕЛКА', 'КАЗБЕК', 'АЛТАЙ', 'ХИБИНЫ'], РЕКИ=['ВОЛГА', 'ОКА', 'ДОН', 'Ёлка'])
+    assert validate_game(game) == 'repeated word'
+
+
+def test_group_and_category_shape():
+    assert validate_game(dict(GAME, РЕКИ=['ВОЛГА', 'ОКА', 'ДОН'])) == 'group size'
+    games = list(GAME.items())
+    assert validate_game(dict(games[:3] + [('птицы', games[3][1])])) == 'categories'
@@ -0,0 +1,175 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from llm_streaming import (AnswerBlockParser, FALSE_GROUP_BLOCK_FIELDS, OVERLAP_BLOCK_FIELDS, StreamedCompletion,
+                           run_steps_speculatively)
+
+COMPLETION = (
+    "Эксперт 1: подумаем.\n"
+    "Выбранное слово: КЛЮЧ\n"
+    "Категория: МУЗЫКА\n"
+    "Слова: НОТА, ГАММА, АККОРД, ТАКТ\n"
+    "Эксперт 2: лучше так.\n"
+    "Выбранное слово: КЛЮЧ\n"
+    "Категория: ЗАМОК\n"
+    "Слова: ДВЕРЬ, СЕЙФ, ЗАСОВ, ЦЕПЬ"
+)
+
+
+def feed_in_chunks(parser, text, size):
+    found = []
+    for start in range(0, len(text), size):
+        found.append(parser.feed(text[start:start + size]))
+    found.append(parser.close())
+    return found
+
+
+def test_blocks_split_across_chunks():
+    for size in (1, 3, 7, 24, len(COMPLETION)):
+        parser = AnswerBlockParser(OVERLAP_BLOCK_FIELDS)
+        found = feed_in_chunks(parser, COMPLETION, size)
+        assert sum(found) == 2
+        assert parser.first == ("КЛЮЧ", "МУЗЫКА", ["НОТА", "ГАММА", "АККОРД", "ТАКТ"])
+        assert parser.last == ("КЛЮЧ", "ЗАМОК", ["ДВЕРЬ", "СЕЙФ", "ЗАСОВ", "ЦЕПЬ"])
+
+
+def test_unterminated_words_line_waits_for_close():
+    parser = AnswerBlockParser(FALSE_GROUP_BLOCK_FIELDS)
+    assert not parser.feed("Категория: РЕКИ\nСлова: ВОЛГА, ОКА, ДОН, ")
+    assert parser.last is None
+    assert not parser.feed("НЕВА")
+    assert parser.close()
+    assert parser.last == ("РЕКИ", ["ВОЛГА", "ОКА", "ДОН", "НЕВА"])
+
+
+def test_incomplete_or_interrupted_blocks_are_ignored():
+    parser = AnswerBlockParser(FALSE_GROUP_BLOCK_FIELDS)
+    feed_in_chunks(parser, "Категория: РЕКИ\nкакая-то строка\nСлова: ВОЛГА, ОКА, ДОН, НЕВА\n", 5)
+    assert parser.last is None
+    # Too few words
+    feed_in_chunks(parser, "Категория: РЕКИ\nСлова: ВОЛГА, ОКА\n", 5)
+    assert parser.last is None
+
+
+def test_block_restarts_on_its_first_field():
+    parser = AnswerBlockParser(FALSE_GROUP_BLOCK_FIELDS)
+    feed_in_chunks(parser, "Категория: ЧЕРНОВИК\nКатегория: РЕКИ\nСлова: ВОЛГА, ОКА, ДОН, НЕВА\n", 4)
+    assert parser.first == ("РЕКИ", ["ВОЛГА", "ОКА", "ДОН", "НЕВА"])
+
+
+class FakeStream:
+    def __init__(self, chunks, gate=None):
+        self.chunks = chunks
+        self.gate = gate
+        self.closed = False
+
+    def __iter__(self):
+        for i, text in enumerate(self.chunks):
+            if i == 1 and self.gate is not None:
+                self.gate.wait(5)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+    def close(self):
+        self.closed = True
+
+
+def fake_client(stream=None, error=None):
+    def create(**kwargs):
+        if error is not None:
+            raise error
+        return stream
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+def test_streamed_completion_exposes_first_block_before_the_end():
+    gate = threading.Event()
+    first, second = COMPLETION.split("Эксперт 2")
+    stream = FakeStream([first, "Эксперт 2" + second], gate)
+    streamed = StreamedCompletion(fake_client(stream), OVERLAP_BLOCK_FIELDS)
+    assert streamed.first_block(5) == ("КЛЮЧ", "МУЗЫКА", ["НОТА", "ГАММА", "АККОРД", "ТАКТ"])
+    assert streamed.total_latency is None
+    gate.set()
+    assert streamed.final_block(5) == ("КЛЮЧ", "ЗАМОК", ["ДВЕРЬ", "СЕЙФ", "ЗАСОВ", "ЦЕПЬ"])
+    assert stream.closed
+
+
+def test_streamed_completion_stop_on_block_and_errors():
+    first, second = COMPLETION.split("Эксперт 2")
+    streamed = StreamedCompletion(fake_client(FakeStream([first, second])), OVERLAP_BLOCK_FIELDS,
+                                  stop_on_block=True)
+    assert streamed.final_block(5) == ("КЛЮЧ", "МУЗЫКА", ["НОТА", "ГАММА", "АККОРД", "ТАКТ"])
+    assert streamed.text == first
+
+    streamed = StreamedCompletion(fake_client(FakeStream(["Эксперт 1: подумаем."])), OVERLAP_BLOCK_FIELDS)
+    with pytest.raises(ValueError):
+        streamed.final_block(5)
+    streamed = StreamedCompletion(fake_client(error=ConnectionError("down")), OVERLAP_BLOCK_FIELDS)
+    with pytest.raises(ConnectionError):
+        streamed.first_block(5)
+
+
+class StubStream:
+    def __init__(self, step, provisional, first, final):
+        self.step = step
+        self.provisional = provisional
+        self.first = first
+        self.final = final
+        self.cancelled = False
+
+    def first_block(self):
+        if isinstance(self.first, Exception):
+            raise self.first
+        return self.first
+
+    def final_block(self):
+        return self.final
+
+    def cancel(self):
+        self.cancelled = True
+
+
+def run_stub_steps(answers, on_error_result=True):
+    """
+    answers: step -> (first block, final block). Returns the started streams, the committed
+    results and the failed steps.
+    """
+    started, committed, failed = [], [], []
+
+    def start_stream(step, provisional):
+        started.append(StubStream(step, provisional, *answers[step]))
+        return started[-1]
+
+    def on_error(step, e):
+        failed.append(step)
+        return on_error_result
+
+    run_steps_speculatively(list(answers), start_stream, lambda step, block, speculative: block,
+                            lambda step, result: committed.append((step, result)), on_error)
+    return started, committed, failed
+
+
+def test_next_step_starts_on_the_first_block():
+    started, committed, _ = run_stub_steps({1: ("A", "A"), 2: ("B", "B"), 3: ("C", "C")})
+    assert [(s.step, s.provisional) for s in started] == [(1, None), (2, "A"), (3, "B")]
+    assert not any(s.cancelled for s in started)
+    assert committed == [(1, "A"), (2, "B"), (3, "C")]
+
+
+def test_changed_final_block_restarts_the_next_step():
+    started, committed, _ = run_stub_steps({1: ("DRAFT", "A"), 2: ("B", "B")})
+    assert [(s.step, s.provisional, s.cancelled) for s in started] == [(1, None, False), (2, "DRAFT", True),
+                                                                       (2, None, False)]
+    assert committed == [(1, "A"), (2, "B")]
+
+
+def test_failed_step_stops_or_continues_as_on_error_says():
+    answers = {1: ("A", "A"), 2: (ValueError("no block"), None), 3: ("C", "C")}
+    started, committed, failed = run_stub_steps(answers, on_error_result=False)
+    assert [s.step for s in started] == [1, 2]
+    assert committed == [(1, "A")] and failed == [2]
+
+    started, committed, failed = run_stub_steps(answers, on_error_result=True)
+    assert [(s.step, s.provisional) for s in started] == [(1, None), (2, "A"), (3, None)]
+    assert committed == [(1, "A"), (3, "C")] and failed == [2]
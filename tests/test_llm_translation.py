@@ -0,0 +1,83 @@
+from collections import OrderedDict
+
+import llm_translation
+from lexicon import Lexicon, SOURCE_DATASET
+from llm_translation import TranslationMemo
+
+FISH = {'FISH': ['BASS', 'PIKE', 'SOLE', 'CARP']}
+GAMES = OrderedDict([
+    ('1', {'FISH': ['BASS', 'PIKE', 'SOLE', 'CARP'], 'INSTRUMENTS': ['BASS', 'DRUM', 'HARP', 'TUBA']}),
+    ('2', {'FISH': ['BASS', 'PIKE', 'SOLE', 'CARP'], 'WEAPONS': ['PIKE', 'BOW', 'SWORD', 'AXE']}),
+])
+RUSSIAN = {
+    'FISH': 'РЫБЫ', 'INSTRUMENTS': 'ИНСТРУМЕНТЫ', 'WEAPONS': 'ОРУЖИЕ',
+    'BASS': 'ОКУНЬ', 'PIKE': 'ЩУКА', 'SOLE': 'КАМБАЛА', 'CARP': 'КАРП', 'DRUM': 'БАРАБАН', 'HARP': 'АРФА',
+    'TUBA': 'ТУБА', 'BOW': 'ЛУК', 'SWORD': 'МЕЧ', 'AXE': 'ТОПОР',
+}
+
+
+def lexicon():
+    return Lexicon.build({word: SOURCE_DATASET for word in list(RUSSIAN.values()) + ['БАС']})
+
+
+def test_items_have_stable_ids(tmp_path):
+    memo = TranslationMemo(str(tmp_path / "memo.json"))
+    items = llm_translation.unresolved_items('7', GAMES['1'], memo)
+    assert items[:2] == [('7:1', 'FISH', None), ('7:1:1', 'FISH', 'BASS')]
+    assert ('7:2:4', 'INSTRUMENTS', 'TUBA') in items
+    assert len(items) == 10
+    memo.add_category('FISH', 'РЫБЫ')
+    assert ('7:1', 'FISH', None) not in llm_translation.unresolved_items('7', GAMES['1'], memo)
+
+
+def test_words_are_reused_only_within_their_category(tmp_path):
+    path = str(tmp_path / "memo.json")
+    memo = TranslationMemo(path)
+    memo.add_word('FISH', 'BASS', 'ОКУНЬ')
+    memo.save()
+    memo = TranslationMemo(path)
+    assert memo.word('FISH', 'BASS') == 'ОКУНЬ'
+    assert memo.word('INSTRUMENTS', 'BASS') is None
+    # The other meaning is asked again, with the known translation as a hint
+    items = [('1:2:1', 'INSTRUMENTS', 'BASS')]
+    assert "«ОКУНЬ»" in llm_translation.build_pack_prompt(items, memo)
+
+
+def test_apply_translations_rejects_invalid_words(tmp_path):
+    memo = TranslationMemo(str(tmp_path / "memo.json"))
+    items = llm_translation.unresolved_items('1', FISH, memo)
+    translations = {'1:1': 'РЫБЫ', '1:1:1': 'ОКУНЬ', '1:1:2': 'ЩУКА', '1:1:3': 'МОРСКОЙ ЯЗЫК'}
+    assert llm_translation.apply_translations(items, translations, memo, lexicon()) == 1
+    assert memo.category('FISH') == 'РЫБЫ'
+    assert memo.word('FISH', 'PIKE') == 'ЩУКА'
+    # A rejected word and a missing one stay unresolved
+    assert [item[2] for item in llm_translation.unresolved_items('1', FISH, memo)] == ['SOLE', 'CARP']
+
+
+def fake_translate(names):
+    def translate_pack(items, memo=None):
+        return {item_id: names.get(category) if word is None
+                else 'БАС' if (category, word) == ('INSTRUMENTS', 'BASS') else RUSSIAN[word]
+                for item_id, category, word in items}, 0
+    return translate_pack
+
+
+def test_translate_games(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_translation, 'get_lexicon', lexicon)
+    monkeypatch.setattr(llm_translation, 'translate_pack', fake_translate(RUSSIAN))
+    memo = TranslationMemo(str(tmp_path / "memo.json"))
+    translated = llm_translation.translate_games(GAMES, memo, pack_size=1)
+    assert translated['1'] == {'РЫБЫ': ['ОКУНЬ', 'ЩУКА', 'КАМБАЛА', 'КАРП'],
+                               'ИНСТРУМЕНТЫ': ['БАС', 'БАРАБАН', 'АРФА', 'ТУБА']}
+    assert list(translated['2']) == ['РЫБЫ', 'ОРУЖИЕ']
+
+
+def test_games_with_duplicate_names_are_retried_then_skipped(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_translation, 'get_lexicon', lexicon)
+    names = dict(RUSSIAN, INSTRUMENTS='РЫБЫ')
+    monkeypatch.setattr(llm_translation, 'translate_pack', fake_translate(names))
+    memo = TranslationMemo(str(tmp_path / "memo.json"))
+    assert llm_translation.duplicate_names(GAMES['1'], memo) == []
+    translated = llm_translation.translate_games(GAMES, memo)
+    assert list(translated) == ['2']
+    assert llm_translation.duplicate_names(GAMES['1'], memo) == ['INSTRUMENTS']
@@ -0,0 +1,107 @@
+import random
+
+import pytest
+
+import dataset_io
+from overlap_solver import OverlapIndex, count_solutions, draw_words, red_herrings, solve
+
+# ЧЕЛОВЕК has more -ТЕЛЬ words than the -ТЕЛЬ category lists (as after form_index.distinct_stems()),
+# and ДОМ shares ВЫКЛЮЧАТЕЛЬ with it and ДВЕРЬ with ВХОДНАЯ
+DATA = {
+    'meaning': {'associations': {
+        'ЧЕЛОВЕК': {'СОЗДАТЕЛЬ', 'РОДИТЕЛЬ', 'ЧИТАТЕЛЬ', 'ПИСАТЕЛЬ', 'ВРАЧ', 'ПОВАР', 'ПИЛОТ', 'ТКАЧ'},
+        'ДОМ': {'КРЫША', 'СТЕНА', 'ОКНО', 'ДВЕРЬ', 'ВЫКЛЮЧАТЕЛЬ', 'ПОДОКОННИК', 'ПОДВАЛ'},
+    }},
+    'form': {
+        'suffixes': {
+            'ЗАКАНЧИВАЮТСЯ НА -ТЕЛЬ': {'ВЫКЛЮЧАТЕЛЬ', 'ДВИГАТЕЛЬ', 'ИЗМЕРИТЕЛЬ', 'УКАЗАТЕЛЬ', 'СОЗДАТЕЛЬ'},
+        },
+        'collocations': {
+            'ВХОДНАЯ': {'ДВЕРЬ', 'ГРУППА', 'ПЛАТА', 'ТОЧКА', 'СТРАНИЦА'},
+        },
+    },
+}
+
+
+def fits_of(name):
+    # What a player sees fit a category, independent of OverlapIndex
+    words = {w for subtypes in DATA.values() for categories in subtypes.values() for w in categories.get(name, ())}
+    if name == 'ЗАКАНЧИВАЮТСЯ НА -ТЕЛЬ':
+        words |= {w for subtypes in DATA.values() for categories in subtypes.values()
+                  for members in categories.values() for w in members if w.endswith('ТЕЛЬ')}
+    return words
+
+
+def as_bits(index, words):
+    ids = {word: i for i, word in enumerate(index.words)}
+    bits = 0
+    for word in words:
+        if word in ids:
+            bits |= 1 << ids[word]
+    return bits
+
+
+@pytest.fixture
+def index(monkeypatch):
+    monkeypatch.setattr(dataset_io, 'HYPERNYM_CLOSURE', None)
+    return OverlapIndex(DATA)
+
+
+def test_fits_include_rule_matches_left_out_of_a_form_category(index):
+    ids = {name: i for i, (_, _, name) in enumerate(index.categories)}
+    suffix = ids['ЗАКАНЧИВАЮТСЯ НА -ТЕЛЬ']
+    assert index.fits[suffix] == as_bits(index, fits_of('ЗАКАНЧИВАЮТСЯ НА -ТЕЛЬ'))
+    assert index.fits[suffix] != index.bits[suffix]
+
+
+def test_two_way_herrings_and_swaps_are_ambiguous():
+    fits = [0b0000_0000_0001_1111, 0b0000_0000_1111_0001, 0b0000_1111_0000_0000, 0b1111_0000_0000_0000]
+    # Word 0 of group 0 fits group 1 and word 4 of group 1 fits group 0: they can swap
+    drawn = [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11], [12, 13, 14, 15]]
+    assert red_herrings(drawn, fits) is None
+    assert count_solutions(drawn, fits) == 2
+    # One direction only is fine
+    fits[0] = 0b0000_0000_0000_1111
+    assert red_herrings(drawn, fits) == 1
+    assert count_solutions(drawn, fits) == 1
+
+
+def test_more_than_one_decoy_per_group_pair_is_rejected():
+    fits = [0b0000_0000_0000_1111, 0b0000_0000_1111_0011, 0b0000_1111_0000_0000, 0b1111_0000_0000_0000]
+    drawn = [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11], [12, 13, 14, 15]]
+    assert red_herrings(drawn, fits) is None
+
+
+def test_cycle_of_herrings_is_not_unique():
+    # 0 -> 1 -> 2 -> 0: rotating the three herrings gives another solution
+    fits = [0b0000_0001_0000_1111, 0b0000_0000_1111_0001, 0b0000_1111_0001_0000, 0b1111_0000_0000_0000]
+    drawn = [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11], [12, 13, 14, 15]]
+    assert red_herrings(drawn, fits) == 3
+    assert count_solutions(drawn, fits) == 2
+
+
+def test_draws_are_uniquely_solvable(index):
+    ids = {name: i for i, (_, _, name) in enumerate(index.categories)}
+    path = [ids['ЧЕЛОВЕК'], ids['ЗАКАНЧИВАЮТСЯ НА -ТЕЛЬ'], ids['ДОМ'], ids['ВХОДНАЯ']]
+    groups = [index.bits[c] for c in path]
+    fits = [index.fits[c] for c in path]
+    rng = random.Random(0)
+    for _ in range(200):
+        drawn = draw_words(groups, fits, index, rng)
+        assert drawn is not None
+        assert len({w for words in drawn for w in words}) == 16
+        assert red_herrings(drawn, fits) is not None
+        assert count_solutions(drawn, fits) == 1
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_solved_puzzles_have_one_solution(index, seed):
+    puzzle = solve(index, time_budget=0.2, rng=random.Random(seed))
+    assert len(puzzle) == 4
+    word_ids = {word: i for i, word in enumerate(index.words)}
+    drawn = [[word_ids[word] for word in words] for _, words in puzzle]
+    fits = [as_bits(index, fits_of(name)) for name, _ in puzzle]
+    assert count_solutions(drawn, fits) == 1
+    # At most one -ТЕЛЬ decoy outside the -ТЕЛЬ group
+    decoys = [w for name, words in puzzle if name != 'ЗАКАНЧИВАЮТСЯ НА -ТЕЛЬ' for w in words if w.endswith('ТЕЛЬ')]
+    assert len(decoys) <= 2
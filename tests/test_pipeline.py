@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from pipeline import PipelineRunner, Stage
+
+GAME = {f"К{g}": [f"С{g}{w}" for w in range(4)] for g in range(4)}
+
+
+def counter():
+    lock = threading.Lock()
+    calls = []
+
+    def next_call():
+        with lock:
+            calls.append(1)
+            return len(calls)
+    return calls, next_call
+
+
+def run_in_thread(runner, num_runs):
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(stats=runner.run(num_runs)), daemon=True)
+    thread.start()
+    return thread, result
+
+
+def test_every_puzzle_reaches_the_sink():
+    done = []
+
+    def mark(item):
+        item.ranked = f"run {item.run_number}"
+        return item
+
+    stages = [Stage("a", lambda item: item, workers=3, queue_size=2), Stage("b", mark, workers=2)]
+    threads_before = set(threading.enumerate())
+    stats = PipelineRunner(lambda: dict(GAME), stages, done.append, generator_workers=2).run(20)
+
+    assert stats.generated == stats.completed == 20
+    assert sorted(item.run_number for item in done) == list(range(1, 21))
+    assert all(item.ranked == f"run {item.run_number}" for item in done)
+    # Every generator and stage worker was shut down
+    assert set(threading.enumerate()) == threads_before
+
+
+def test_worker_survives_a_raising_generator():
+    calls, next_call = counter()
+
+    def generate():
+        if next_call() % 2:
+            raise RuntimeError("generator failed")
+        return dict(GAME)
+
+    done = []
+    stats = PipelineRunner(generate, [Stage("a", lambda item: item)], done.append).run(6)
+    assert len(calls) == 6
+    assert stats.completed == 3 and stats.dropped == {"generate": 3}
+    assert sorted(item.run_number for item in done) == [2, 4, 6]
+
+
+def test_failed_stages_drop_the_puzzle():
+    def stage(item):
+        if item.run_number == 1:
+            raise ValueError("bad puzzle")
+        return None if item.run_number == 2 else item
+
+    games = iter([dict(GAME), dict(GAME), dict(GAME), {"К0": GAME["К0"]}])
+    stats = PipelineRunner(lambda: next(games), [Stage("check", stage)]).run(4)
+    assert stats.completed == 1
+    assert stats.dropped == {"check": 2, "generate": 1}
+
+
+def test_slow_stage_blocks_the_generator():
+    calls, next_call = counter()
+    release = threading.Event()
+
+    def generate():
+        next_call()
+        return dict(GAME)
+
+    def slow(item):
+        release.wait(5)
+        return item
+
+    runner = PipelineRunner(generate, [Stage("slow", slow, workers=1, queue_size=1)])
+    thread, result = run_in_thread(runner, 10)
+    time.sleep(0.2)
+    # One puzzle in the stage, one in its queue and one waiting to be put
+    assert len(calls) <= 3
+    release.set()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert result["stats"].completed == 10
+
+
+@pytest.mark.parametrize("generator_workers", [1, 3])
+def test_no_runs(generator_workers):
+    stats = PipelineRunner(lambda: dict(GAME), [Stage("a", lambda item: item)],
+                           generator_workers=generator_workers).run(0)
+    assert stats.generated == stats.completed == 0
@@ -0,0 +1,27 @@
+import puzzle_server
+
+PUZZLE = [{"name": f"К{g}", "words": [f"С{g}{w}" for w in range(4)]} for g in range(4)]
+
+
+def test_cold_request_gives_up_after_cold_attempts():
+    calls = []
+
+    def failing():
+        calls.append(1)
+        return None
+
+    service = puzzle_server.PuzzleService({'io': failing}, cold_attempts=3)
+    assert service.get('io') is None
+    assert len(calls) == 3
+    metrics = service.metrics()["types"]["io"]
+    assert metrics["unavailable"] == 1
+    assert metrics["rejected"] == 3
+    assert metrics["served"] == 0
+
+
+def test_cold_request_retries_until_a_valid_puzzle():
+    answers = iter([None, PUZZLE[:3], PUZZLE])
+    service = puzzle_server.PuzzleService({'io': lambda: next(answers)}, cold_attempts=3)
+    assert service.get('io') == PUZZLE
+    metrics = service.metrics()["types"]["io"]
+    assert (metrics["served"], metrics["served_cold"], metrics["unavailable"]) == (1, 1, 0)
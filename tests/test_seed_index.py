@@ -0,0 +1,39 @@
+import random
+from collections import Counter
+
+import pytest
+
+from seed_index import AliasSampler, SeedIndex
+
+
+@pytest.mark.parametrize("weights", [[1.0], [1.0, 1.0], [1.0, 2.0, 3.0, 4.0], [5.0, 0.5, 0.5, 2.0, 7.0, 1.0]])
+def test_alias_sampler_matches_the_weights(weights):
+    rng = random.Random(0)
+    sampler = AliasSampler(weights)
+    draws = 200000
+    counts = Counter(sampler.draw(rng) for _ in range(draws))
+    total = sum(weights)
+    for i, weight in enumerate(weights):
+        assert counts[i] / draws == pytest.approx(weight / total, abs=0.01)
+
+
+def test_alias_sampler_never_draws_zero_weights():
+    rng = random.Random(1)
+    sampler = AliasSampler([0.0, 3.0, 0.0, 1.0, 0.0])
+    assert {sampler.draw(rng) for _ in range(20000)} == {1, 3}
+
+
+def test_seed_index_sample_is_distinct():
+    index = SeedIndex(["КЛЮЧ", "ЛУК", "КОСА"], [["ЗАМОК"], ["ОРУЖИЕ"], ["ПРИЧЁСКА"]], [5, 1, 1])
+    sampled = index.sample(10, random.Random(2))
+    assert sorted(word for word, _ in sampled) == ["КЛЮЧ", "КОСА", "ЛУК"]
+
+
+def test_seed_index_round_trip_checks_the_fingerprint(tmp_path):
+    index = SeedIndex(["КЛЮЧ", "ЛУК"], [["ЗАМОК", "РОДНИК"], ["ОРУЖИЕ"]], [2, 1])
+    path = tmp_path / "seed_index.json"
+    fingerprint = [("ambiguous.csv", 100, 200)]
+    index.save(path, fingerprint)
+    loaded = SeedIndex.load(path, fingerprint)
+    assert (loaded.words, loaded.senses, loaded.scores) == (index.words, index.senses, index.scores)
+    assert SeedIndex.load(path, [("ambiguous.csv", 101, 200)]) is None
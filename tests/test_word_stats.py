@@ -0,0 +1,64 @@
+import os
+
+import resources
+import word_stats
+from word_stats import RANK_SOURCE_DATASETS, RANK_SOURCE_NAVEC, WordStats, prune_datasets
+
+DATA_BY_CATEGORY = {
+    'main': {
+        'sub': {
+            'ЖИВОТНЫЕ': {'КОШКА', 'СОБАКА', 'МЫШЬ', 'КРЫСА', 'ЁЖИК'},
+            'МЕБЕЛЬ': {'СТОЛ', 'СТУЛ', 'ШКАФ', 'ДИВАН'},
+        },
+    },
+}
+DATA_BY_WORD = {'main': {'sub': {word: {category} for category, words in DATA_BY_CATEGORY['main']['sub'].items()
+                                 for word in words}}}
+# Frequency-ordered like navec's vocabulary; ёжик and диван are missing from it
+VOCABULARY = ['кошка', 'стол', 'собака', 'стул', 'мышь', 'шкаф', 'крыса']
+
+
+def test_keep_by_rank_and_oov():
+    stats = WordStats.build(DATA_BY_WORD, set(VOCABULARY), VOCABULARY)
+    assert stats.rank_source == RANK_SOURCE_NAVEC
+    assert stats.rank('СТОЛ') == 1 and stats.rank('ДИВАН') == len(VOCABULARY)
+    assert stats.is_oov('ДИВАН') and not stats.is_oov('КОШКА')
+
+    keep = stats.keep(max_rank=3)
+    assert keep('СТУЛ') and not keep('МЫШЬ')
+    assert keep('НЕИЗВЕСТНОЕ')  # words the stats do not know are kept
+    keep = stats.keep(exclude_oov=True)
+    assert keep('КРЫСА') and not keep('ЁЖИК')
+    assert stats.keep()('ДИВАН')
+
+
+def test_ranks_from_datasets_without_navec():
+    stats = WordStats.build(DATA_BY_WORD)
+    assert stats.rank_source == RANK_SOURCE_DATASETS
+    assert sorted(stats.rank(word) for word in stats.words) == list(range(len(stats)))
+    assert not any(stats.oov)
+
+
+def test_prune_drops_categories_below_four_words():
+    stats = WordStats.build(DATA_BY_WORD, set(VOCABULARY), VOCABULARY)
+    by_category, by_word = prune_datasets(DATA_BY_CATEGORY, stats.keep(exclude_oov=True))
+    # ЖИВОТНЫЕ loses ЁЖИК and keeps 4 words, МЕБЕЛЬ loses ДИВАН and is dropped
+    assert by_category == {'main': {'sub': {'ЖИВОТНЫЕ': {'КОШКА', 'СОБАКА', 'МЫШЬ', 'КРЫСА'}}}}
+    assert set(by_word['main']['sub']) == {'КОШКА', 'СОБАКА', 'МЫШЬ', 'КРЫСА'}
+    assert by_word['main']['sub']['КОШКА'] == {'ЖИВОТНЫЕ'}
+
+
+def test_saved_stats_are_recomputed_when_navec_is_installed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir('datasets')
+    with open(os.path.join('datasets', 'words.csv'), 'w') as f:
+        f.write("category,words\n")
+    stats = word_stats.get_word_stats(DATA_BY_WORD)
+    assert stats.rank_source == RANK_SOURCE_DATASETS and not any(stats.oov)
+    assert word_stats.get_word_stats(DATA_BY_WORD).words == stats.words
+
+    with open(resources.COMPACT_NAVEC_PATH, 'wb') as f:
+        f.write(b"model")
+    monkeypatch.setattr(resources, 'get_navec', lambda: set(VOCABULARY))
+    stats = word_stats.get_word_stats(DATA_BY_WORD)
+    assert stats.is_oov('ДИВАН') and stats.is_oov('ЁЖИК')